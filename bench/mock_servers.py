@@ -0,0 +1,493 @@
+"""
+Serveurs HTTP locaux imitant les API Notion et OpenAI pour les benchmarks
+- Notion : query paginée (filtres, filter_properties), schéma, pages, blocs imbriqués, PATCH
+- OpenAI : chat completions (réponse simple ou JSON groupé {"T1": ..}), champ usage ;
+  API Files/Batches (dépôt JSONL, job terminé au deuxième suivi, fichier de sortie)
+Latence et erreurs (429 avec Retry-After, 500) injectables
+
+Lancement autonome :
+    python bench/mock_servers.py --tasks 10000 --latency-ms 80
+Affiche sur la première ligne {"notion": url, "openai": url}, puis sert jusqu'à Ctrl+C
+"""
+import argparse
+import email.parser
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+DATABASE_ID = "b0000000-0000-4000-8000-00000000bec4"
+
+# Propriété -> (type, id) du schéma de la base Tâches synthétique
+SCHEMA = {
+    "Nom": ("title", "title"),
+    "Description": ("rich_text", "desc"),
+    "Statut": ("select", "stat"),
+    "Projet/Tlt": ("relation", "proj"),
+    "⏱️ Temps estimé IA (min)": ("number", "test"),
+    "⏱️ Temps réel agrégé (min)": ("number", "trel"),
+    "🔄 Hash contenu": ("rich_text", "hash"),
+    "📊 Écart (%)": ("number", "ecar"),
+    "Échéance": ("date", "eche")
+}
+STATUSES = ["À faire", "En cours", "Terminé", "Terminé", "Backlog", "Infos"]
+WORDS = (
+    "analyse maquette api export rapport client réunion migration tests revue documentation "
+    "intégration formulaire tableau budget planning recette déploiement correction design contenu"
+).split()
+EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def page_id(i: int) -> str:
+    return f"{i:08x}-0000-4000-8000-{i:012x}"
+
+
+def toggle_id(i: int) -> str:
+    return f"{i:08x}-0000-4000-9000-{i:012x}"
+
+
+def iso(moment: datetime) -> str:
+    """Date Notion : last_edited_time est arrondi à la minute"""
+    return moment.strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+
+class Faults:
+    """Latence et erreurs injectées dans les réponses d'un serveur"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0,
+                 throttle_rate: float = 0, error_rate: float = 0, retry_after: float = 0.5):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def injected(self) -> Optional[Tuple[int, Dict[str, str]]]:
+        """(code, en-têtes) d'une erreur à renvoyer, ou None"""
+        roll = random.random()
+        if roll < self.throttle_rate:
+            return 429, {"Retry-After": str(self.retry_after)}
+        if roll < self.throttle_rate + self.error_rate:
+            return 500, {}
+        return None
+
+
+class Workspace:
+    """Base Tâches synthétique : valeurs simples par page, JSON Notion construit à la demande"""
+
+    def __init__(self, tasks: int, estimated_ratio: float = 0.0, seed: int = 42):
+        rng = random.Random(seed)
+        # Tirage séparé : les autres valeurs restent celles des benchmarks précédents
+        due_rng = random.Random(seed + 1)
+        self.lock = threading.Lock()
+        self.ids: List[str] = []
+        self.values: Dict[str, Dict[str, Any]] = {}
+        self.edited: Dict[str, str] = {}
+        projects = max(1, tasks // 50)
+        for i in range(tasks):
+            pid = page_id(i)
+            self.ids.append(pid)
+            done = rng.random() < 0.3
+            self.values[pid] = {
+                "Nom": f"Tâche {i} " + " ".join(rng.choices(WORDS, k=3)),
+                "Description": " ".join(rng.choices(WORDS, k=rng.randint(0, 12))),
+                "Statut": "Terminé" if done else rng.choice(STATUSES),
+                "Projet/Tlt": [f"projet{rng.randrange(projects):06d}"],
+                "⏱️ Temps estimé IA (min)": rng.choice([30, 60, 90]) if rng.random() < estimated_ratio else None,
+                "⏱️ Temps réel agrégé (min)": rng.randint(15, 480) if done else None,
+                "🔄 Hash contenu": "",
+                "📊 Écart (%)": None,
+                "Échéance": (EPOCH + timedelta(days=due_rng.randint(0, 90))).strftime("%Y-%m-%d")
+                if due_rng.random() < 0.4 else None
+            }
+            self.edited[pid] = iso(EPOCH + timedelta(seconds=i))
+        self.index = {pid: i for i, pid in enumerate(self.ids)}
+
+    # --- Propriétés ---
+
+    @staticmethod
+    def encode(prop_type: str, value: Any) -> Dict:
+        if prop_type in ("title", "rich_text"):
+            return {"type": prop_type, prop_type: [{"plain_text": value}] if value else []}
+        if prop_type == "select":
+            return {"type": prop_type, prop_type: {"name": value} if value else None}
+        if prop_type == "relation":
+            return {"type": prop_type, prop_type: [{"id": v} for v in value or []]}
+        if prop_type == "date":
+            return {"type": prop_type, prop_type: {"start": value} if value else None}
+        return {"type": prop_type, prop_type: value}
+
+    @staticmethod
+    def decode(prop: Dict) -> Any:
+        prop_type = next(key for key in prop if key != "type")
+        raw = prop[prop_type]
+        if prop_type in ("title", "rich_text"):
+            return "".join(part.get("text", {}).get("content", "") for part in raw or [])
+        if prop_type in ("select", "date"):
+            return (raw or {}).get("name" if prop_type == "select" else "start")
+        return raw
+
+    def page(self, pid: str, only: Optional[set] = None) -> Dict:
+        values = self.values[pid]
+        return {
+            "object": "page",
+            "id": pid,
+            "last_edited_time": self.edited[pid],
+            "properties": {
+                name: {"id": prop_id, **self.encode(prop_type, values[name])}
+                for name, (prop_type, prop_id) in SCHEMA.items()
+                if only is None or prop_id in only
+            }
+        }
+
+    def update(self, pid: str, properties: Dict):
+        with self.lock:
+            for name, prop in properties.items():
+                self.values[pid][name] = self.decode(prop)
+            self.edited[pid] = iso(datetime.now(timezone.utc))
+
+    # --- Filtres (sous-ensemble produit par QueryBuilder) ---
+
+    def matches(self, pid: str, condition: Optional[Dict]) -> bool:
+        if not condition:
+            return True
+        if "and" in condition:
+            return all(self.matches(pid, part) for part in condition["and"])
+        if "or" in condition:
+            return any(self.matches(pid, part) for part in condition["or"])
+        if condition.get("timestamp") == "last_edited_time":
+            return self.edited[pid] >= condition["last_edited_time"]["on_or_after"]
+
+        value = self.values[pid].get(condition["property"])
+        prop_type = next(key for key in condition if key != "property")
+        (operator, operand), = condition[prop_type].items()
+        if operator == "is_empty":
+            return value in (None, "", [])
+        if operator == "is_not_empty":
+            return value not in (None, "", [])
+        if operator == "equals":
+            return value == operand
+        if operator == "does_not_equal":
+            return value != operand
+        if operator in ("contains", "does_not_contain"):
+            found = operand in (value or [] if isinstance(value, list) else value or "")
+            return found if operator == "contains" else not found
+        if value is None:
+            return False
+        return {
+            "greater_than": value > operand,
+            "greater_than_or_equal_to": value >= operand,
+            "less_than": value < operand,
+            "less_than_or_equal_to": value <= operand
+        }.get(operator, True)
+
+    # --- Contenu des pages ---
+
+    def blocks(self, block_id: str) -> List[Dict]:
+        """Enfants d'une page (paragraphes, listes, un toggle imbriqué une page sur cinq) ou d'un toggle"""
+        if block_id[19:23] == "9000":
+            rng = random.Random(block_id)
+            return [self.paragraph(rng, f"{block_id}-{n}") for n in range(3)]
+
+        i = self.index.get(block_id)
+        if i is None:
+            return []
+        rng = random.Random(i)
+        children = [self.paragraph(rng, f"{block_id}-{n}") for n in range(rng.randint(2, 8))]
+        if i % 5 == 0:
+            children.append({
+                "object": "block", "id": toggle_id(i), "type": "toggle", "has_children": True,
+                "last_edited_time": iso(EPOCH), "toggle": {"rich_text": [{"plain_text": "Détails"}]}
+            })
+        return children
+
+    @staticmethod
+    def paragraph(rng: random.Random, block_id: str) -> Dict:
+        block_type = rng.choice(["paragraph", "paragraph", "bulleted_list_item", "to_do"])
+        return {
+            "object": "block", "id": block_id, "type": block_type, "has_children": False,
+            "last_edited_time": iso(EPOCH), block_type: {"rich_text": [{"plain_text": " ".join(rng.choices(WORDS, k=rng.randint(4, 30)))}]}
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    faults = Faults()
+    stats: Dict[str, int] = {}
+    stats_lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        content_type = self.headers.get("Content-Type") or ""
+        if content_type.startswith("multipart/form-data"):
+            # Dépôt de fichier : {champ: contenu} (texte)
+            message = email.parser.BytesParser().parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode() + raw
+            )
+            return {
+                part.get_param("name", header="content-disposition"): part.get_payload(decode=True).decode("utf-8")
+                for part in message.get_payload()
+            }
+        return json.loads(raw or b"{}")
+
+    def dispatch(self, method: str):
+        url = urlsplit(self.path)
+        body = self.read_json() if method in ("POST", "PATCH") else {}
+        if url.path == "/_stats":
+            with self.stats_lock:
+                return self.send_json(200, dict(self.stats))
+        with self.stats_lock:
+            self.stats[method] = self.stats.get(method, 0) + 1
+        self.faults.delay()
+        fault = self.faults.injected()
+        if fault:
+            status, headers = fault
+            with self.stats_lock:
+                self.stats[str(status)] = self.stats.get(str(status), 0) + 1
+            return self.send_json(status, {"object": "error", "status": status}, headers)
+        self.route(method, url.path, parse_qs(url.query), body)
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PATCH(self):
+        self.dispatch("PATCH")
+
+
+class NotionHandler(Handler):
+    workspace: Workspace = None
+
+    def route(self, method: str, path: str, query: Dict, body: Dict):
+        ws = self.workspace
+        parts = path.strip("/").split("/")
+        if parts[:1] == ["v1"]:
+            parts = parts[1:]
+
+        if method == "POST" and len(parts) == 3 and parts[0] == "databases" and parts[2] == "query":
+            only = {unquote(prop_id) for prop_id in query.get("filter_properties", [])} or None
+            start = int(body.get("start_cursor") or 0)
+            size = min(int(body.get("page_size") or 100), 100)
+            results, position = [], start
+            with ws.lock:
+                while position < len(ws.ids) and len(results) < size:
+                    pid = ws.ids[position]
+                    if ws.matches(pid, body.get("filter")):
+                        results.append(ws.page(pid, only))
+                    position += 1
+            more = position < len(ws.ids)
+            return self.send_json(200, {
+                "object": "list", "results": results, "has_more": more,
+                "next_cursor": str(position) if more else None
+            })
+
+        if method == "GET" and len(parts) == 2 and parts[0] == "databases":
+            return self.send_json(200, {
+                "object": "database", "id": parts[1],
+                "properties": {
+                    name: {"id": prop_id, "name": name, "type": prop_type}
+                    for name, (prop_type, prop_id) in SCHEMA.items()
+                }
+            })
+
+        if len(parts) == 2 and parts[0] == "pages" and parts[1] in ws.values:
+            if method == "PATCH":
+                ws.update(parts[1], body.get("properties", {}))
+            with ws.lock:
+                return self.send_json(200, ws.page(parts[1]))
+
+        if method == "GET" and len(parts) == 3 and parts[0] == "blocks" and parts[2] == "children":
+            children = ws.blocks(parts[1])
+            start = int((query.get("start_cursor") or ["0"])[0])
+            size = min(int((query.get("page_size") or ["100"])[0]), 100)
+            more = start + size < len(children)
+            return self.send_json(200, {
+                "object": "list", "results": children[start:start + size], "has_more": more,
+                "next_cursor": str(start + size) if more else None
+            })
+
+        self.send_json(404, {"object": "error", "status": 404, "message": f"{method} {path}"})
+
+
+def completion(body: Dict) -> Dict:
+    """Réponse chat completions déterministe pour un corps de requête"""
+    prompt = "\n".join(message.get("content", "") for message in body.get("messages", []))
+    rng = random.Random(prompt)
+    keys = re.findall(r"^### (T\d+)$", prompt, re.M)
+    if keys:
+        answer = json.dumps({key: rng.choice([30, 45, 60, 90, 120, 240]) for key in keys})
+    else:
+        answer = str(rng.choice([30, 45, 60, 90, 120, 240]))
+    return {
+        "object": "chat.completion",
+        "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}}],
+        "usage": {"prompt_tokens": len(prompt) // 4 + 1, "completion_tokens": len(answer) // 4 + 1}
+    }
+
+
+class OpenAIHandler(Handler):
+    # file_id -> contenu, batch_id -> objet batch (partagés par les requêtes du serveur)
+    files: Dict[str, str] = None
+    batches: Dict[str, Dict] = None
+    ids = itertools.count(1)
+
+    def route(self, method: str, path: str, query: Dict, body: Dict):
+        parts = path.strip("/").split("/")
+        if parts[:1] == ["v1"]:
+            parts = parts[1:]
+
+        if method == "POST" and parts == ["chat", "completions"]:
+            return self.send_json(200, completion(body))
+
+        if method == "POST" and parts == ["files"]:
+            file_id = f"file-{next(self.ids)}"
+            self.files[file_id] = body.get("file", "")
+            return self.send_json(200, {"id": file_id, "object": "file", "purpose": body.get("purpose")})
+
+        if method == "GET" and len(parts) == 3 and parts[0] == "files" and parts[2] == "content":
+            if parts[1] not in self.files:
+                return self.send_json(404, {"error": {"message": f"fichier {parts[1]} inconnu"}})
+            content = self.files[parts[1]].encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/jsonl")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            return self.wfile.write(content)
+
+        if method == "POST" and parts == ["batches"]:
+            if body.get("input_file_id") not in self.files:
+                return self.send_json(400, {"error": {"message": "input_file_id inconnu"}})
+            batch_id = f"batch-{next(self.ids)}"
+            lines = [line for line in self.files[body["input_file_id"]].splitlines() if line.strip()]
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "status": "validating",
+                "input_file_id": body["input_file_id"], "output_file_id": None,
+                "request_counts": {"total": len(lines), "completed": 0, "failed": 0}
+            }
+            return self.send_json(200, self.batches[batch_id])
+
+        if method == "GET" and len(parts) == 2 and parts[0] == "batches" and parts[1] in self.batches:
+            batch = self.batches[parts[1]]
+            # Chaque suivi fait avancer le job : validating -> in_progress -> completed
+            if batch["status"] == "validating":
+                batch["status"] = "in_progress"
+            elif batch["status"] == "in_progress":
+                output = []
+                for line in self.files[batch["input_file_id"]].splitlines():
+                    if line.strip():
+                        request = json.loads(line)
+                        output.append(json.dumps({
+                            "id": f"req-{next(self.ids)}", "custom_id": request["custom_id"],
+                            "response": {"status_code": 200, "body": completion(request["body"])}, "error": None
+                        }))
+                batch["output_file_id"] = f"file-{next(self.ids)}"
+                self.files[batch["output_file_id"]] = "\n".join(output) + "\n"
+                batch["request_counts"]["completed"] = len(output)
+                batch["status"] = "completed"
+            return self.send_json(200, batch)
+
+        self.send_json(404, {"error": {"message": f"{method} {path}"}})
+
+
+def serve(handler: type, port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_servers(
+    tasks: int,
+    estimated_ratio: float = 0.0,
+    notion_faults: Optional[Faults] = None,
+    openai_faults: Optional[Faults] = None,
+    notion_port: int = 0,
+    openai_port: int = 0
+) -> Tuple[Dict[str, str], Workspace]:
+    """
+    Démarre les deux serveurs dans le processus courant
+    Returns: (URL de base des serveurs, base Tâches servie, à inspecter ou modifier directement)
+    """
+    workspace = Workspace(tasks, estimated_ratio)
+    notion_handler = type("BenchNotion", (NotionHandler,), {
+        "workspace": workspace,
+        "faults": notion_faults or Faults(),
+        "stats": {}
+    })
+    openai_handler = type("BenchOpenAI", (OpenAIHandler,), {
+        "faults": openai_faults or Faults(),
+        "stats": {},
+        "files": {},
+        "batches": {}
+    })
+    notion = serve(notion_handler, notion_port)
+    openai = serve(openai_handler, openai_port)
+    return {
+        "notion": f"http://127.0.0.1:{notion.server_port}/v1",
+        "openai": f"http://127.0.0.1:{openai.server_port}/v1",
+        "database_id": DATABASE_ID
+    }, workspace
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveurs Notion/OpenAI simulés pour les benchmarks")
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--estimated-ratio", type=float, default=0.0,
+                        help="Part des tâches ayant déjà une estimation")
+    parser.add_argument("--notion-port", type=int, default=0)
+    parser.add_argument("--openai-port", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latence Notion")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0, help="Part de réponses Notion 429")
+    parser.add_argument("--error-rate", type=float, default=0, help="Part de réponses Notion 500")
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--gpt-latency-ms", type=float, default=0)
+    parser.add_argument("--gpt-throttle-rate", type=float, default=0)
+    parser.add_argument("--gpt-error-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    urls, _ = start_servers(
+        args.tasks,
+        args.estimated_ratio,
+        Faults(args.latency_ms, args.jitter_ms, args.throttle_rate, args.error_rate, args.retry_after),
+        Faults(args.gpt_latency_ms, args.gpt_latency_ms / 4, args.gpt_throttle_rate, args.gpt_error_rate,
+               args.retry_after),
+        args.notion_port,
+        args.openai_port
+    )
+    print(json.dumps(urls), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
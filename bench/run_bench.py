@@ -0,0 +1,176 @@
+"""
+Benchmark hors ligne de run_estimations contre des serveurs Notion/OpenAI simulés
+
+    python bench/run_bench.py                       # 1k, 10k et 50k tâches
+    python bench/run_bench.py --sizes 1000 --latency-ms 80 --throttle-rate 0.02
+
+Pour chaque taille : serveurs simulés lancés dans un processus séparé, puis deux passes
+de main.run_estimations dans un processus neuf (mesure du pic mémoire) :
+- "cold" : aucune estimation, caches vides
+- "warm" : même espace de travail juste après (tout est à jour, rien à réécrire ;
+  les pages écrites par la passe cold ont changé et leur contenu est relu)
+- "idle" : encore une fois, sans aucune modification (contenu reconstruit depuis le cache de blocs)
+Le rapport (temps, requêtes, retries, pic RSS) est affiché et écrit en JSON
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), "src")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pic de mémoire résidente du processus (None si indisponible, ex: Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : kilo-octets ; macOS : octets
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_worker(result_path: str):
+    """Processus mesuré : importe main (configuré par l'environnement) et lance une passe"""
+    sys.path.insert(0, SRC_DIR)
+    import main
+
+    start = time.perf_counter()
+    estimated = main.run_estimations(incremental=os.getenv("BENCH_INCREMENTAL") == "1")
+    wall = time.perf_counter() - start
+
+    report = main.metrics.to_dict()
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "wall_seconds": round(wall, 3),
+            "estimated": estimated or 0,
+            "peak_rss_mb": peak_rss_mb(),
+            "notion": main.get_notion().stats,
+            "counters": report["counters"],
+            "tokens": report["tokens"],
+            "endpoints": {
+                service: {name: {"count": e["latency"]["count"], "avg_seconds": e["latency"]["avg_seconds"],
+                                 "p95_seconds": e["latency"]["p95_seconds"], "status": e["status"]}
+                          for name, e in endpoints.items()}
+                for service, endpoints in report["endpoints"].items()
+            }
+        }, f, indent=2, ensure_ascii=False)
+
+
+def start_servers(args, tasks: int) -> Tuple[subprocess.Popen, Dict[str, str]]:
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, "mock_servers.py"),
+        "--tasks", str(tasks),
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.latency_ms / 4),
+        "--throttle-rate", str(args.throttle_rate),
+        "--error-rate", str(args.error_rate),
+        "--retry-after", str(args.retry_after),
+        "--gpt-latency-ms", str(args.gpt_latency_ms)
+    ]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    urls = json.loads(server.stdout.readline())
+    return server, urls
+
+
+def run_pass(args, urls: Dict[str, str], workdir: str, label: str) -> Dict:
+    result_path = os.path.join(workdir, f"{label}.json")
+    env = dict(
+        os.environ,
+        NOTION_TOKEN="bench",
+        GPT_API_KEY="bench",
+        DATABASE_TACHES=urls["database_id"],
+        NOTION_BASE_URL=urls["notion"],
+        GPT_BASE_URL=urls["openai"],
+        NOTION_RPS=str(args.notion_rps),
+        GPT_RPM=str(args.gpt_rpm),
+        GPT_TPM=str(args.gpt_tpm),
+        MARTINE_CACHE_DIR=os.path.join(workdir, "cache"),
+        METRICS_PROM_PATH=os.path.join(workdir, "logs", "martine.prom"),
+        BENCH_INCREMENTAL="1" if args.incremental else "0",
+        # Comme une entrée de manifeste : le .env du poste ne remplace pas la configuration simulée
+        # (il viserait les vrais Notion et OpenAI)
+        MARTINE_MANIFEST_ENTRY="bench",
+        PYTHONIOENCODING="utf-8"
+    )
+    with open(os.path.join(workdir, f"{label}.log"), "w", encoding="utf-8") as log:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", result_path],
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    if completed.returncode != 0 or not os.path.exists(result_path):
+        raise RuntimeError(f"Passe {label} en échec (voir {os.path.join(workdir, label + '.log')})")
+    with open(result_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_table(rows: List[Dict]):
+    header = f"{'tâches':>8} {'passe':>5} {'temps (s)':>10} {'estimées':>9} {'req Notion':>11} " \
+             f"{'retries':>8} {'req GPT':>8} {'pic RSS (Mo)':>13}"
+    print("\n" + header)
+    print("-" * len(header))
+    for row in rows:
+        result = row["result"]
+        gpt_requests = result["counters"].get("openai", {}).get("requests", 0)
+        print(f"{row['tasks']:>8} {row['pass']:>5} {result['wall_seconds']:>10.2f} {result['estimated']:>9} "
+              f"{result['notion']['requests']:>11} {result['notion']['retries']:>8} {gpt_requests:>8.0f} "
+              f"{result['peak_rss_mb'] if result['peak_rss_mb'] is not None else '-':>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Martine IA contre des API simulées")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Tailles de base (séparées par des virgules)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Latence simulée de Notion")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Part de 429 renvoyés par Notion")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Part de 500 renvoyés par Notion")
+    parser.add_argument("--retry-after", type=float, default=0.2)
+    parser.add_argument("--gpt-latency-ms", type=float, default=200, help="Latence simulée d'OpenAI")
+    parser.add_argument("--notion-rps", type=float, default=1000,
+                        help="Débit Notion côté client (3 = production ; élevé = coût propre du client)")
+    parser.add_argument("--gpt-rpm", type=int, default=100000)
+    parser.add_argument("--gpt-tpm", type=int, default=100000000)
+    parser.add_argument("--incremental", action="store_true", help="Passes en mode incrémental")
+    parser.add_argument("--output", default=None, help="Rapport JSON (défaut : bench_results_<date>.json)")
+    parser.add_argument("--keep", action="store_true", help="Garder les dossiers de travail (logs, caches)")
+    parser.add_argument("--worker", metavar="RESULT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        return
+
+    rows = []
+    for tasks in (int(size) for size in args.sizes.split(",")):
+        print(f"🏁 {tasks} tâches...")
+        server, urls = start_servers(args, tasks)
+        workdir = tempfile.mkdtemp(prefix=f"martine_bench_{tasks}_")
+        try:
+            for label in ("cold", "warm", "idle"):
+                result = run_pass(args, urls, workdir, label)
+                rows.append({"tasks": tasks, "pass": label, "result": result})
+                print(f"   {label}: {result['wall_seconds']:.2f}s, {result['estimated']} estimations")
+        finally:
+            server.terminate()
+            server.wait()
+            if args.keep:
+                print(f"   📂 {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(rows)
+    output = args.output or f"bench_results_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"settings": {k: v for k, v in vars(args).items() if k != "worker"}, "runs": rows},
+                  f, indent=2, ensure_ascii=False)
+    print(f"\n📝 Rapport sauvegardé: {output}")
+
+
+if __name__ == "__main__":
+    main()
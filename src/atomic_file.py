@@ -0,0 +1,15 @@
+"""
+Écriture atomique des fichiers d'état (caches, files d'attente, métriques)
+Le contenu est écrit dans un fichier temporaire puis renommé : un lecteur, ou le run suivant
+après un crash, ne voit jamais un fichier à moitié écrit.
+"""
+import os
+
+
+def write_atomic(path: str, text: str):
+    """Remplace le contenu de path par text (dossiers créés au besoin)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
@@ -0,0 +1,87 @@
+"""
+Cache disque du contenu des pages, bloc par bloc
+Pour chaque page ou bloc parent : la liste de ses enfants déjà rendus (texte canonique, type, has_children),
+valable tant que le last_edited_time de la page n'a pas changé (Notion ne date pas un bloc parent quand
+un de ses enfants change, mais date toujours la page). Une page modifiée est relue entièrement.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Précision du last_edited_time de Notion : une modification faite dans la même minute que la lecture
+# ne change pas la date. Une entrée n'est fiable que si elle a été lue après la fin de cette minute.
+EDIT_TIME_PRECISION = 60
+
+
+class BlockCache:
+    """
+    max_age_seconds: au-delà, une entrée est relue même si la page n'a pas changé
+    (filet de sécurité : blocs synchronisés ou liés, modifiés ailleurs)
+    """
+
+    def __init__(self, path: str, max_age_seconds: float = 86400):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            # WAL : les écritures (une par bloc relu) ne forcent pas un fsync chacune
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(block_children)")}
+            if columns and "read_at" not in columns:
+                # Cache d'une version sans instant de lecture : ses entrées ne peuvent pas être vérifiées
+                self._conn.execute("DROP TABLE block_children")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS block_children (
+                    parent_id TEXT PRIMARY KEY,
+                    last_edited_time TEXT NOT NULL,
+                    children TEXT NOT NULL,
+                    read_at REAL NOT NULL
+                );
+            """)
+            # Entrées trop anciennes pour être réutilisées : blocs supprimés ou pages disparues
+            self._conn.execute(
+                "DELETE FROM block_children WHERE read_at < ?", (time.time() - self.max_age_seconds,)
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, parent_id: str, last_edited_time: str) -> Optional[List[Dict]]:
+        """
+        Enfants rendus du parent, None si absents, expirés, si la page a changé
+        ou s'ils ont été lus dans la minute de sa dernière modification
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT children, read_at FROM block_children "
+                "WHERE parent_id = ? AND last_edited_time = ? "
+                "AND read_at >= CAST(strftime('%s', last_edited_time) AS REAL) + ?",
+                (parent_id, last_edited_time, EDIT_TIME_PRECISION)
+            ).fetchone()
+            if row and time.time() - row[1] <= self.max_age_seconds:
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+            return None
+
+    def put(self, parent_id: str, last_edited_time: str, children: List[Dict], read_at: Optional[float] = None):
+        """
+        last_edited_time: de la page à laquelle appartiennent les blocs
+        read_at: début de la lecture des enfants (défaut : maintenant)
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO block_children (parent_id, last_edited_time, children, read_at) "
+                "VALUES (?, ?, ?, ?)",
+                (parent_id, last_edited_time, json.dumps(children, ensure_ascii=False),
+                 time.time() if read_at is None else read_at)
+            )
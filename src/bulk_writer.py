@@ -0,0 +1,150 @@
+"""
+Écriture groupée des propriétés Notion
+Compare aux valeurs déjà lues, fusionne les mises à jour d'une même page et envoie les PATCH en parallèle
+"""
+import math
+import queue
+import threading
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+from notion_client import PROPERTY_ENCODERS
+
+
+def same_value(current: Any, value: Any) -> bool:
+    """Vrai si écrire `value` ne changerait rien à `current` (valeurs simples, pas les propriétés brutes)"""
+    if isinstance(current, bool) or isinstance(value, bool):
+        return bool(current) == bool(value)
+    if isinstance(current, (int, float)) and isinstance(value, (int, float)):
+        return math.isclose(current, value, rel_tol=1e-9, abs_tol=1e-12)
+    if isinstance(current, str) or isinstance(value, str):
+        # Notion ne distingue pas un texte vide d'un texte absent
+        return (current or "") == (value or "")
+    return current == value
+
+
+class BulkWriter:
+    """
+    File d'écriture des pages d'une database
+    - les propriétés dont la valeur n'a pas changé ne sont pas réécrites
+    - plusieurs mises à jour d'une page en attente partent dans un seul PATCH
+    - chaque page est toujours écrite par le même worker (ordre des écritures conservé)
+    """
+
+    def __init__(
+        self,
+        update_page: Callable[[str, Dict], bool],
+        schema: Dict,
+        max_workers: int = 4,
+        queue_size: int = 50
+    ):
+        self.update_page = update_page
+        self.types = {name: prop.get("type") for name, prop in schema.items()}
+        self.stats = {"written": 0, "skipped": 0, "failed": 0, "coalesced": 0}
+        self._lock = threading.Lock()
+        # page -> {"values": {...}, "callbacks": [...]} pour les pages pas encore envoyées
+        self._pending: Dict[str, Dict] = {}
+        # Valeurs écrites pendant ce run (évite de réécrire la même valeur deux fois)
+        self._written: Dict[str, Dict] = {}
+        self._queues = [queue.Queue(maxsize=max(1, queue_size // max_workers)) for _ in range(max_workers)]
+        self._workers = [
+            threading.Thread(target=self._work, args=(q,), daemon=True) for q in self._queues
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def encode(self, values: Dict[str, Any]) -> Dict:
+        """Valeurs simples -> payload `properties` selon le type de chaque propriété"""
+        properties = {}
+        for name, value in values.items():
+            encoder = PROPERTY_ENCODERS.get(self.types.get(name))
+            if encoder is None:
+                raise ValueError(f"Propriété non modifiable : {name} ({self.types.get(name)})")
+            properties[name] = encoder(value)
+        return properties
+
+    def put(
+        self,
+        page_id: str,
+        values: Dict[str, Any],
+        current: Optional[Dict[str, Any]] = None,
+        on_done: Optional[Callable[[str, bool], None]] = None
+    ):
+        """
+        Programme l'écriture de `values` ({propriété: valeur simple}) sur une page
+        current: valeurs déjà lues dans Notion ; les propriétés identiques sont ignorées
+        on_done: appelé avec (page_id, succès) une fois la page écrite ou jugée à jour
+        """
+        for name in values:
+            if PROPERTY_ENCODERS.get(self.types.get(name)) is None:
+                raise ValueError(f"Propriété non modifiable : {name} ({self.types.get(name)})")
+
+        with self._lock:
+            known = dict(current or {})
+            known.update(self._written.get(page_id, {}))
+            entry = self._pending.get(page_id)
+            # Une valeur déjà en attente est toujours remplacée (même par la valeur actuelle)
+            changes = {
+                name: value for name, value in values.items()
+                if (entry is not None and name in entry["values"])
+                or name not in known or not same_value(known[name], value)
+            }
+
+            if entry is not None:
+                # La page attend déjà son tour : un seul PATCH pour les deux mises à jour
+                entry["values"].update(changes)
+                if on_done:
+                    entry["callbacks"].append(on_done)
+                self.stats["coalesced"] += 1
+                return
+
+            if not changes:
+                self.stats["skipped"] += 1
+            else:
+                self._pending[page_id] = {"values": changes, "callbacks": [on_done] if on_done else []}
+
+        if not changes:
+            if on_done:
+                on_done(page_id, True)
+            return
+
+        # Hors du verrou : la file bornée ralentit le producteur si Notion ne suit pas
+        self._queues[zlib.crc32(page_id.encode("utf-8")) % len(self._queues)].put(page_id)
+
+    def _work(self, pages: queue.Queue):
+        while True:
+            page_id = pages.get()
+            if page_id is None:
+                return
+            with self._lock:
+                entry = self._pending.pop(page_id)
+
+            try:
+                success = self.update_page(page_id, self.encode(entry["values"]))
+            except Exception as e:
+                print(f"❌ Erreur écriture page {page_id}: {e}")
+                success = False
+
+            with self._lock:
+                if success:
+                    self.stats["written"] += 1
+                    self._written.setdefault(page_id, {}).update(entry["values"])
+                else:
+                    self.stats["failed"] += 1
+
+            for callback in entry["callbacks"]:
+                callback(page_id, success)
+
+    def close(self) -> Dict[str, int]:
+        """Attend la fin des écritures en attente et retourne les compteurs"""
+        for pages in self._queues:
+            pages.put(None)
+        for worker in self._workers:
+            worker.join()
+        return dict(self.stats)
+
+    def __enter__(self) -> "BulkWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
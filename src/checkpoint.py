@@ -0,0 +1,70 @@
+"""
+Point de reprise d'un run d'estimation
+Journal JSONL en ajout seul : estimations obtenues (à écrire) puis écrites dans Notion
+"""
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+
+class RunCheckpoint:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.pending: Dict[str, Dict] = {}
+        self.done: Dict[str, str] = {}
+        self._file = None
+        if os.path.exists(path):
+            self._replay()
+    
+    def _replay(self):
+        """Reconstruit l'état à partir du journal (une ligne tronquée par un crash est ignorée)"""
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("op") == "pending":
+                    self.pending[event["id"]] = {"minutes": event["minutes"], "hash": event.get("hash")}
+                elif event.get("op") == "done":
+                    entry = self.pending.pop(event["id"], None)
+                    self.done[event["id"]] = (entry or {}).get("hash") or ""
+    
+    def _append(self, event: Dict):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self._file.flush()
+    
+    def add_pending(self, task_id: str, minutes: float, content_hash: Optional[str]):
+        """Estimation obtenue, à écrire dans Notion"""
+        with self._lock:
+            self.pending[task_id] = {"minutes": minutes, "hash": content_hash}
+            self._append({"op": "pending", "id": task_id, "minutes": minutes, "hash": content_hash})
+    
+    def mark_done(self, task_id: str):
+        """Estimation écrite dans Notion"""
+        with self._lock:
+            entry = self.pending.pop(task_id, None)
+            self.done[task_id] = (entry or {}).get("hash") or ""
+            self._append({"op": "done", "id": task_id})
+    
+    def is_recorded(self, task_id: str, content_hash: str) -> bool:
+        """Estimation déjà obtenue pour le même contenu : écrite, ou en attente d'écriture"""
+        with self._lock:
+            entry = self.pending.get(task_id)
+            return self.done.get(task_id) == content_hash or (entry is not None and entry["hash"] == content_hash)
+    
+    def clear(self):
+        """Run terminé : plus rien à reprendre"""
+        with self._lock:
+            self.pending.clear()
+            self.done.clear()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,89 @@
+"""
+Cache disque des réponses GPT
+Clé = empreinte du modèle, de la température et du prompt complet ; TTL + éviction LRU
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Optional
+
+
+class EstimationCache:
+    def __init__(self, path: str, ttl_seconds: float = 30 * 86400, max_entries: int = 20000):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access);
+            """)
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+    
+    @staticmethod
+    def make_key(model: str, temperature: float, messages: List[Dict], **options) -> str:
+        """Empreinte stable du modèle, de la température, des options et du prompt rendu"""
+        raw = json.dumps(
+            {"model": model, "temperature": temperature, "messages": messages, "options": options},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str, record_miss: bool = True) -> Optional[str]:
+        """
+        Réponse en cache (None si absente ou expirée)
+        record_miss: False pour une simple vérification, qui ne correspond pas à un appel nécessaire
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.ttl_seconds:
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return row[0]
+            if row:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            if record_miss:
+                self.misses += 1
+            return None
+    
+    def put(self, key: str, response: str):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            # Éviction LRU au-delà de la taille max
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+    
+    def purge_expired(self):
+        """Supprime les réponses expirées (celles qui ne sont plus relues ne le seraient jamais par get)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
@@ -0,0 +1,326 @@
+"""
+Estimation différée via l'API Batch d'OpenAI (gros imports de tâches)
+Les prompts que estimate_task_time enverrait sont rendus dans un fichier JSONL, soumis en un job batch
+(moitié prix, traité sous 24h) ; l'identifiant du job est conservé sur disque et les runs suivants
+relèvent les résultats terminés pour les écrire dans Notion.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+
+from atomic_file import write_atomic
+from gpt_estimator import HISTORY_SIZE
+from metrics import RunMetrics
+from rate_limiter import backoff_delay
+
+# Statuts d'un job encore en cours de traitement
+PENDING_STATUSES = ("validating", "in_progress", "finalizing", "cancelling")
+# Endpoint appelé pour chaque ligne du fichier batch
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+class OpenAIBatchTransport:
+    """
+    Accès HTTP aux API Files et Batches d'OpenAI
+    Tout objet exposant upload / create / retrieve / download peut le remplacer
+    (base_url suffit pour viser un serveur local de test)
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://api.openai.com/v1",
+        max_retries: int = 5,
+        metrics: Optional[RunMetrics] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.metrics = metrics or RunMetrics()
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {api_key}"})
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Requête avec retries sur erreur réseau, 429 et 5xx ; lève RuntimeError sinon"""
+        url = f"{self.base_url}{path}"
+        attempt = 0
+        while True:
+            self.metrics.increment("openai_batch", "requests")
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=120, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.metrics.observe_request("openai_batch", method, url, None, time.perf_counter() - start)
+                if attempt >= self.max_retries:
+                    raise RuntimeError(f"API Batch injoignable : {e}")
+                attempt += 1
+                time.sleep(backoff_delay(attempt))
+                continue
+
+            self.metrics.observe_request("openai_batch", method, url, response.status_code, time.perf_counter() - start)
+            if response.status_code in (429, 500, 502, 503, 504) and attempt < self.max_retries:
+                attempt += 1
+                self.metrics.increment("openai_batch", "retries")
+                time.sleep(backoff_delay(attempt, response.headers.get("Retry-After")))
+                continue
+            if response.status_code != 200:
+                raise RuntimeError(f"API Batch ({response.status_code}) : {response.text[:200]}")
+            return response
+
+    def upload(self, filename: str, data: bytes) -> str:
+        """Dépose le fichier JSONL des requêtes, retourne son file_id"""
+        response = self._request(
+            "POST", "/files",
+            data={"purpose": "batch"},
+            files={"file": (filename, data, "application/jsonl")}
+        )
+        return response.json()["id"]
+
+    def create(self, input_file_id: str, completion_window: str = "24h",
+               metadata: Optional[Dict[str, str]] = None) -> Dict:
+        """Crée le job batch, retourne l'objet batch"""
+        return self._request("POST", "/batches", json={
+            "input_file_id": input_file_id,
+            "endpoint": BATCH_ENDPOINT,
+            "completion_window": completion_window,
+            "metadata": metadata or {}
+        }).json()
+
+    def retrieve(self, batch_id: str) -> Dict:
+        return self._request("GET", f"/batches/{batch_id}").json()
+
+    def download(self, file_id: str) -> str:
+        """Contenu d'un fichier de sortie (JSONL)"""
+        return self._request("GET", f"/files/{file_id}/content").text
+
+
+class BatchJobStore:
+    """
+    Jobs soumis et pas encore appliqués, sur disque entre deux runs
+    batch_id -> {"submitted_at", "checked_at", "requests": {custom_id: {"task_id", "hash", "stored_hash", "cache_key"}}}
+    stored_hash : hash enregistré dans Notion au moment de la soumission (estimation que le résultat remplace)
+    Si une tâche figure dans plusieurs jobs (contenu modifié entre-temps), seul le plus récent fait foi.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.jobs: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.jobs = json.load(f)
+            except (OSError, ValueError):
+                self.jobs = {}
+        self._reindex()
+
+    def _reindex(self):
+        # task_id -> (batch_id, hash) du job le plus récent
+        self.latest: Dict[str, Tuple[str, Optional[str]]] = {}
+        for batch_id, job in sorted(self.jobs.items(), key=lambda item: item[1]["submitted_at"]):
+            for entry in job["requests"].values():
+                self.latest[entry["task_id"]] = (batch_id, entry["hash"])
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+    def add(self, batch_id: str, requests_by_id: Dict[str, Dict]):
+        with self._lock:
+            self.jobs[batch_id] = {"submitted_at": time.time(), "checked_at": 0, "requests": requests_by_id}
+            self._reindex()
+        self.save()
+
+    def remove(self, batch_id: str):
+        with self._lock:
+            self.jobs.pop(batch_id, None)
+            self._reindex()
+        self.save()
+
+    def touch(self, batch_id: str):
+        """Mémorise la dernière vérification du job"""
+        with self._lock:
+            if batch_id in self.jobs:
+                self.jobs[batch_id]["checked_at"] = time.time()
+        self.save()
+
+    def is_pending(self, task_id: str, content_hash: Optional[str]) -> bool:
+        """Tâche déjà soumise pour ce contenu : inutile de l'estimer à nouveau"""
+        latest = self.latest.get(task_id)
+        return latest is not None and latest[1] == content_hash
+
+    def is_latest(self, task_id: str, batch_id: str) -> bool:
+        latest = self.latest.get(task_id)
+        return latest is not None and latest[0] == batch_id
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.jobs, ensure_ascii=False)
+        write_atomic(self.path, data)
+
+
+class BatchEstimator:
+    """
+    Soumission et relève des jobs batch d'estimation
+    gpt: GPTEstimator (rendu des prompts, modèle, cache des réponses)
+    transport: OpenAIBatchTransport ou équivalent
+    poll_interval: délai minimal (s) entre deux vérifications d'un même job
+    """
+
+    def __init__(
+        self,
+        gpt,
+        transport,
+        store: BatchJobStore,
+        completion_window: str = "24h",
+        poll_interval: float = 60
+    ):
+        self.gpt = gpt
+        self.transport = transport
+        self.store = store
+        self.completion_window = completion_window
+        self.poll_interval = poll_interval
+
+    def submit(
+        self,
+        tasks: Iterable[Dict],
+        project_name: str,
+        similarity_index
+    ) -> Tuple[Optional[str], List[Tuple[Dict, float]]]:
+        """
+        Rend le prompt de chaque tâche et soumet ceux qui ne sont pas déjà en cache en un seul job
+        Returns: (batch_id ou None si rien à soumettre, [(tâche, minutes)] répondues par le cache)
+        """
+        project_context = f"Projet: {project_name}"
+        lines, requests_by_id, cached = [], {}, []
+
+        for task in tasks:
+            history = similarity_index.top_k([task], HISTORY_SIZE)[0]
+            messages = self.gpt.task_messages(
+                task.get("nom", "Tâche sans nom"),
+                task.get("description", ""),
+                project_context,
+                history,
+                task.get("content", "")
+            )
+            body = self.gpt.request_body(messages)
+            cache_key = self.gpt.cache_key(messages, max_tokens=body["max_tokens"], temperature=body["temperature"])
+            if self.gpt.cache:
+                # Absente du cache : la tâche part dans le job, ce n'est pas un appel manqué
+                answer = self.gpt.cache.get(cache_key, record_miss=False)
+                minutes = self.gpt._parse_minutes(answer) if answer is not None else None
+                if minutes:
+                    self.gpt.metrics.increment("openai", "cache_hits")
+                    cached.append((task, minutes))
+                    continue
+
+            # custom_id unique dans le fichier : une même tâche n'y figure qu'une fois
+            if task["id"] in requests_by_id:
+                continue
+            requests_by_id[task["id"]] = {
+                "task_id": task["id"], "hash": task.get("hash"), "stored_hash": task.get("hash_stocke"),
+                "cache_key": cache_key
+            }
+            lines.append(json.dumps(
+                {"custom_id": task["id"], "method": "POST", "url": BATCH_ENDPOINT, "body": body},
+                ensure_ascii=False
+            ))
+
+        if not lines:
+            return None, cached
+
+        # Copie locale du fichier soumis (consultable en cas de job en échec)
+        jsonl = "\n".join(lines) + "\n"
+        filename = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        input_path = os.path.join(os.path.dirname(self.store.path) or ".", "gpt_batches", filename)
+        os.makedirs(os.path.dirname(input_path), exist_ok=True)
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.write(jsonl)
+
+        file_id = self.transport.upload(filename, jsonl.encode("utf-8"))
+        batch = self.transport.create(
+            file_id, self.completion_window, metadata={"source": "martine", "tasks": str(len(lines))}
+        )
+        self.store.add(batch["id"], requests_by_id)
+        self.gpt.metrics.increment("openai_batch", "submitted_requests", len(lines))
+        return batch["id"], cached
+
+    def poll(
+        self,
+        force: bool = False,
+        is_current: Optional[Callable[[str, Optional[str], Optional[str]], bool]] = None
+    ) -> Iterator[Tuple[str, Optional[str], float]]:
+        """
+        Vérifie les jobs en attente et produit (task_id, hash, minutes) pour chaque résultat obtenu
+        Un job terminé (ou expiré, annulé : résultats partiels) est retiré une fois ses résultats produits ;
+        ses tâches sans réponse seront estimées à nouveau au prochain run.
+        is_current: (task_id, hash, stored_hash) -> bool ; les résultats périmés depuis la soumission
+        (contenu modifié, estimation plus récente écrite entre-temps) ne sont pas produits
+        """
+        for batch_id, job in list(self.store.jobs.items()):
+            if not force and time.time() - job["checked_at"] < self.poll_interval:
+                continue
+            try:
+                batch = self.transport.retrieve(batch_id)
+            except RuntimeError as e:
+                print(f"⚠️ Batch {batch_id} : {e}")
+                continue
+
+            counts = batch.get("request_counts") or {}
+            status = batch.get("status")
+            if status in PENDING_STATUSES:
+                print(f"⏳ Batch {batch_id} : {status} ({counts.get('completed', 0)}/{counts.get('total', len(job['requests']))})")
+                self.store.touch(batch_id)
+                continue
+
+            print(f"📦 Batch {batch_id} : {status} ({counts.get('completed', 0)} réponses, "
+                  f"{counts.get('failed', 0)} échecs)")
+            if batch.get("output_file_id"):
+                try:
+                    output = self.transport.download(batch["output_file_id"])
+                except RuntimeError as e:
+                    # Fichier indisponible pour l'instant : nouvelle tentative au prochain run
+                    print(f"⚠️ Batch {batch_id} : {e}")
+                    continue
+                yield from self._results(batch_id, job, output, is_current)
+            self.store.remove(batch_id)
+
+    def _results(
+        self,
+        batch_id: str,
+        job: Dict,
+        output: str,
+        is_current: Optional[Callable[[str, Optional[str], Optional[str]], bool]] = None
+    ) -> Iterator[Tuple[str, Optional[str], float]]:
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            entry = job["requests"].get(result.get("custom_id"))
+            response = result.get("response") or {}
+            if entry is None or response.get("status_code") != 200:
+                self.gpt.metrics.increment("openai_batch", "failed_requests")
+                continue
+
+            body = response.get("body") or {}
+            self.gpt.metrics.add_tokens(body.get("model") or self.gpt.model, body.get("usage"))
+            text = body["choices"][0]["message"]["content"].strip()
+            minutes = self.gpt._parse_minutes(text)
+            if minutes is None:
+                continue
+            # Un run interactif avec le même prompt réutilisera la réponse
+            if self.gpt.cache:
+                self.gpt.cache.put(entry["cache_key"], text)
+            # Tâche resoumise depuis (contenu modifié) : la réponse du job le plus récent fait foi
+            if not self.store.is_latest(entry["task_id"], batch_id):
+                continue
+            if is_current and not is_current(entry["task_id"], entry["hash"], entry.get("stored_hash")):
+                self.gpt.metrics.increment("openai_batch", "stale_results")
+                continue
+            yield entry["task_id"], entry["hash"], minutes
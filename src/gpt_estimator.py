@@ -5,33 +5,220 @@ Utilise l'historique + description pour prédire les durées
 import requests
 import json
 import re
-from typing import Dict, List, Optional
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from rate_limiter import TokenBucket, backoff_delay
+from estimation_cache import EstimationCache
+from similarity import SimilarityIndex
+from metrics import RunMetrics
+from prompt_builder import PromptBudget, compact_content, count_tokens
+
+# Nombre de tâches historiques montrées au modèle
+HISTORY_SIZE = 10
 
 class GPTEstimator:
-    def __init__(self, api_key: str, model: str = "gpt-4o"):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gpt-4o",
+        max_concurrency: int = 1,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_retries: int = 5,
+        pack_size: int = 1,
+        cache: Optional[EstimationCache] = None,
+        metrics: Optional[RunMetrics] = None,
+        base_url: str = "https://api.openai.com/v1",
+        max_prompt_tokens: int = 3000
+    ):
         self.api_key = api_key
         self.model = model
-        self.base_url = "https://api.openai.com/v1/chat/completions"
+        self.base_url = f"{base_url.rstrip('/')}/chat/completions"
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        # Nombre de tâches estimées par appel (1 = une tâche par prompt)
+        self.pack_size = pack_size
+        # Cache disque des réponses (évite de repayer un prompt identique)
+        self.cache = cache
+        
+        # Session persistante : évite une poignée de main TLS par estimation
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        })
+        
+        # Budgets par minute (None = pas de limite côté client)
+        self.request_limiter = (
+            TokenBucket(rate=requests_per_minute / 60, capacity=requests_per_minute)
+            if requests_per_minute else None
+        )
+        self.token_limiter = (
+            TokenBucket(rate=tokens_per_minute / 60, capacity=tokens_per_minute)
+            if tokens_per_minute else None
+        )
+        self._print_lock = threading.Lock()
+        # Latences, retries et tokens consommés (champ `usage` des réponses)
+        self.metrics = metrics or RunMetrics()
+        # Taille bornée des prompts : historique et contenu des pages compactés pour tenir dedans
+        self.budget = PromptBudget(max_prompt_tokens)
     
-    def estimate_task_time(
-        self, 
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Estimation locale du nombre de tokens (budget TPM)"""
+        return count_tokens(text) + 1
+    
+    def _chat(
+        self,
+        messages: List[Dict],
+        max_tokens: int = 50,
+        temperature: float = 0.3,
+        json_mode: bool = False,
+        parse: Optional[Callable[[str], Any]] = None
+    ) -> Any:
+        """
+        Appelle l'API chat completions en respectant les budgets RPM/TPM
+        Réessaie sur 429 / 5xx (Retry-After ou backoff exponentiel avec jitter)
+        parse: transforme le texte de la réponse (None = réponse invalide, non mise en cache)
+        Returns: réponse (parsée si parse est fourni) ou None si erreur
+        """
+        parse = parse or (lambda text: text)
+        
+        cache_key = None
+        if self.cache:
+            cache_key = self.cache_key(messages, max_tokens, temperature, json_mode)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                parsed = parse(cached)
+                if parsed is not None:
+                    self.metrics.increment("openai", "cache_hits")
+                    return parsed
+        
+        text = self._call_api(messages, max_tokens, temperature, json_mode)
+        if text is None:
+            return None
+        
+        parsed = parse(text)
+        if parsed is not None and cache_key:
+            self.cache.put(cache_key, text)
+        return parsed
+    
+    def cache_key(
+        self,
+        messages: List[Dict],
+        max_tokens: int = 50,
+        temperature: float = 0.3,
+        json_mode: bool = False
+    ) -> str:
+        """Clé du cache de réponses pour ces messages et ces options"""
+        return EstimationCache.make_key(
+            self.model, temperature, messages, max_tokens=max_tokens, json_mode=json_mode
+        )
+    
+    def task_cache_key(self, task: Dict, project_context: str, historical_tasks: List[Dict]) -> str:
+        """Clé du prompt que estimate_task_time enverrait pour cette tâche seule"""
+        return self.cache_key(self.task_messages(
+            task.get("nom", "Tâche sans nom"),
+            task.get("description", ""),
+            project_context,
+            historical_tasks,
+            task.get("content", "")
+        ))
+    
+    def request_body(
+        self,
+        messages: List[Dict],
+        max_tokens: int = 50,
+        temperature: float = 0.3,
+        json_mode: bool = False
+    ) -> Dict:
+        """Corps d'une requête chat completions (appel direct ou ligne d'un fichier batch)"""
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+    
+    def _call_api(
+        self,
+        messages: List[Dict],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool
+    ) -> Optional[str]:
+        """Requête HTTP brute vers chat completions (avec limites et retries)"""
+        payload = self.request_body(messages, max_tokens, temperature, json_mode)
+        tokens = sum(self._estimate_tokens(m["content"]) for m in messages) + max_tokens
+        attempt = 0
+        
+        while True:
+            waited = 0.0
+            if self.request_limiter:
+                waited += self.request_limiter.acquire()
+            if self.token_limiter:
+                waited += self.token_limiter.acquire(tokens)
+            if waited > 0:
+                self.metrics.increment("openai", "throttle_waits")
+                self.metrics.increment("openai", "throttle_seconds", waited)
+            self.metrics.increment("openai", "requests")
+            
+            start = time.perf_counter()
+            try:
+                response = self.session.post(self.base_url, json=payload, timeout=30)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.metrics.observe_request("openai", "POST", self.base_url, None, time.perf_counter() - start)
+                if attempt >= self.max_retries:
+                    print(f"❌ Erreur estimation: {e}")
+                    return None
+                attempt += 1
+                self.metrics.increment("openai", "retries")
+                time.sleep(backoff_delay(attempt))
+                continue
+            
+            self.metrics.observe_request(
+                "openai", "POST", self.base_url, response.status_code, time.perf_counter() - start
+            )
+            if response.status_code in (429, 500, 502, 503, 504) and attempt < self.max_retries:
+                attempt += 1
+                self.metrics.increment("openai", "retries")
+                delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+                if response.status_code == 429:
+                    for limiter in (self.request_limiter, self.token_limiter):
+                        if limiter:
+                            limiter.penalize(delay)
+                time.sleep(delay)
+                continue
+            
+            if response.status_code != 200:
+                print(f"❌ Erreur GPT API ({response.status_code}): {response.text}")
+                return None
+            
+            result = response.json()
+            self.metrics.add_tokens(result.get("model") or self.model, result.get("usage"))
+            return result["choices"][0]["message"]["content"].strip()
+    
+    def task_messages(
+        self,
         task_name: str,
         task_description: str,
         project_context: str,
         historical_tasks: List[Dict],
         task_content: str = ""
-    ) -> Optional[float]:
-        """
-        Estime le temps nécessaire pour une tâche
-        Returns: temps en minutes (float) ou None si erreur
-        """
-        
-        # Construire le contexte historique
-        history_str = self._format_history(historical_tasks)
-        
-        # Prompt pour GPT
+    ) -> List[Dict]:
+        """Messages envoyés pour estimer une tâche (system + user, dans le budget de tokens)"""
         system_prompt = "Tu es un assistant de gestion de projet expert en estimation de temps."
-        user_prompt = f"""CONTEXTE DU PROJET:
+        task_description = self.budget.description(task_description)
+        
+        def build(history_str: str, content: str) -> str:
+            return f"""CONTEXTE DU PROJET:
 {project_context}
 
 HISTORIQUE DES TÂCHES SIMILAIRES:
@@ -42,7 +229,7 @@ Nom: {task_name}
 Description: {task_description}
 
 CONTENU DÉTAILLÉ DE LA TÂCHE (Page Notion):
-{task_content if task_content else "Aucun contenu détaillé disponible."}
+{content if content else "Aucun contenu détaillé disponible."}
 
 INSTRUCTIONS:
 1. Analyse l'historique des tâches similaires
@@ -52,98 +239,287 @@ INSTRUCTIONS:
 5. Ne réponds QUE le nombre, rien d'autre. Pas de texte avant ni après.
 
 ESTIMATION EN MINUTES:"""
-
+        
+        # Budget : partie fixe du prompt, puis historique et contenu de la page
+        history_budget, (content_budget,) = self.budget.allocate(
+            count_tokens(system_prompt) + count_tokens(build("", "")),
+            self.budget.history_demand(historical_tasks, HISTORY_SIZE),
+            [count_tokens(task_content)]
+        )
+        user_prompt = build(
+            self.budget.format_history(historical_tasks, history_budget, HISTORY_SIZE),
+            compact_content(task_content, content_budget)
+        )
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    def estimate_task_time(
+        self, 
+        task_name: str,
+        task_description: str,
+        project_context: str,
+        historical_tasks: List[Dict],
+        task_content: str = ""
+    ) -> Optional[float]:
+        """
+        Estime le temps nécessaire pour une tâche
+        Returns: temps en minutes (float) ou None si erreur
+        """
         try:
-            response = requests.post(
-                self.base_url,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.api_key}"
-                },
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 50
-                },
-                timeout=30
+            messages = self.task_messages(
+                task_name, task_description, project_context, historical_tasks, task_content
             )
-            
-            if response.status_code != 200:
-                print(f"❌ Erreur GPT API ({response.status_code}): {response.text}")
-                return None
-            
-            result = response.json()
-            text = result["choices"][0]["message"]["content"].strip()
-            
-            # Extraire le nombre
-            match = re.search(r'\d+', text)
-            if match:
-                minutes = float(match.group())
-                return minutes
-            else:
-                print(f"⚠️ Réponse GPT non parsable: {text}")
-                return None
-                
+            return self._chat(messages, parse=self._parse_minutes)
         except Exception as e:
             print(f"❌ Erreur estimation: {e}")
             return None
     
-    def _format_history(self, tasks: List[Dict]) -> str:
-        """Formate l'historique pour le prompt"""
-        if not tasks:
-            return "Aucune tâche similaire trouvée dans l'historique."
-        
-        lines = []
-        for task in tasks[:10]:  # Limiter à 10 tâches max
-            nom = task.get("nom", "Sans nom")
-            temps = task.get("temps_reel", 0)
-            desc = task.get("description", "")[:100]  # Tronquer
-            lines.append(f"- {nom}: {temps} min ('{desc}')")
-        
-        return "\n".join(lines)
+    @staticmethod
+    def _parse_minutes(text: str) -> Optional[float]:
+        """Extrait le nombre de minutes d'une réponse GPT"""
+        match = re.search(r'\d+', text)
+        if match and float(match.group()) > 0:
+            return float(match.group())
+        print(f"⚠️ Réponse GPT non parsable: {text}")
+        return None
+    
+    def estimate_tasks_packed(
+        self,
+        tasks: List[Dict],
+        project_context: str,
+        historical_tasks: List[Dict],
+        task_histories: Optional[List[List[Dict]]] = None
+    ) -> Dict[str, float]:
+        """
+        Estime plusieurs tâches partageant le même contexte en un seul appel
+        La réponse attendue est un objet JSON {"T1": minutes, "T2": minutes, ...}
+        Chaque réponse est aussi mise en cache sous la clé de la tâche seule (task_cache_key, avec son
+        historique task_histories) : un run qui groupe autrement les tâches ne repaie pas celles déjà estimées
+        Returns: Dict[task_id -> minutes] (les tâches absentes ou non parsables sont omises)
+        """
+        estimates = {}
+        task_keys = {}
+        if self.cache:
+            remaining = []
+            for task, history in zip(tasks, task_histories or [historical_tasks] * len(tasks)):
+                task_key = self.task_cache_key(task, project_context, history)
+                cached = self.cache.get(task_key, record_miss=False)
+                minutes = self._parse_minutes(cached) if cached is not None else None
+                if minutes:
+                    self.metrics.increment("openai", "cache_hits")
+                    estimates[task.get("id")] = minutes
+                else:
+                    task_keys[task.get("id")] = task_key
+                    remaining.append(task)
+            tasks = remaining
+            if not tasks:
+                return estimates
+        
+        keys = {f"T{i}": task for i, task in enumerate(tasks, 1)}
+        system_prompt = "Tu es un assistant de gestion de projet expert en estimation de temps."
+        
+        def build(history_str: str, contents: List[str]) -> str:
+            task_blocks = []
+            for (key, task), content in zip(keys.items(), contents):
+                task_blocks.append(f"""### {key}
+Nom: {task.get("nom", "Tâche sans nom")}
+Description: {self.budget.description(task.get("description", ""))}
+Contenu détaillé (Page Notion):
+{content or "Aucun contenu détaillé disponible."}""")
+            tasks_str = "\n\n".join(task_blocks)
+            
+            return f"""CONTEXTE DU PROJET:
+{project_context}
+
+HISTORIQUE DES TÂCHES SIMILAIRES:
+{history_str}
+
+TÂCHES À ESTIMER:
+{tasks_str}
+
+INSTRUCTIONS:
+1. Analyse l'historique des tâches similaires
+2. Prends en compte la complexité décrite dans la description ET le contenu détaillé de chaque tâche
+3. Estime chaque tâche indépendamment, de manière RÉALISTE (les humains sous-estiment souvent)
+4. Réponds UNIQUEMENT avec un objet JSON associant chaque identifiant à un nombre entier de minutes
+   Exemple: {{"T1": 120, "T2": 45}}"""
+        
+        # Budget partagé : le contenu des pages courtes laisse plus de place aux longues
+        raw_contents = [task.get("content") or "" for task in keys.values()]
+        history_budget, content_budgets = self.budget.allocate(
+            count_tokens(system_prompt) + count_tokens(build("", [""] * len(keys))),
+            self.budget.history_demand(historical_tasks, HISTORY_SIZE),
+            [count_tokens(content) for content in raw_contents]
+        )
+        user_prompt = build(
+            self.budget.format_history(historical_tasks, history_budget, HISTORY_SIZE),
+            [compact_content(content, budget) for content, budget in zip(raw_contents, content_budgets)]
+        )
+
+        def parse(text: str) -> Optional[Dict]:
+            try:
+                answer = json.loads(text)
+            except ValueError:
+                print(f"⚠️ Réponse GPT groupée non parsable: {text[:200]}")
+                return None
+            return answer if isinstance(answer, dict) else None
+        
+        answer = self._chat(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=15 * len(keys) + 20,
+            json_mode=True,
+            parse=parse
+        )
+        if answer is None:
+            return estimates
+        
+        for key, task in keys.items():
+            match = re.search(r'\d+', str(answer.get(key, "")))
+            if match and float(match.group()) > 0:
+                estimates[task.get("id")] = float(match.group())
+                if task.get("id") in task_keys:
+                    self.cache.put(task_keys[task.get("id")], match.group())
+        return estimates
+    
+    def iter_estimates(
+        self,
+        tasks: Iterable[Dict],
+        all_tasks_history: List[Dict],
+        project_name: str = "Projet EISF",
+        similarity_index: Optional[SimilarityIndex] = None,
+        total: Optional[int] = None
+    ) -> Iterator[Tuple[Dict, Optional[float]]]:
+        """
+        Estime un flux de tâches et produit (tâche, minutes ou None) dès qu'un appel se termine
+        Les tâches sont consommées au fil de l'eau : au plus 2 x max_concurrency appels en vol.
+        L'historique de chaque tâche = ses HISTORY_SIZE voisines les plus proches (similarity_index,
+        construit à partir de all_tasks_history s'il n'est pas fourni).
+        Avec pack_size > 1, les tâches d'un même projet sont estimées par paquets ;
+        celles manquantes dans la réponse groupée sont réestimées seules.
+        """
+        project_context = f"Projet: {project_name}"
+        workers = max(1, self.max_concurrency)
+        
+        if similarity_index is None:
+            similarity_index = SimilarityIndex()
+            similarity_index.update([t for t in all_tasks_history if t.get("temps_reel", 0) > 0])
+        
+        def estimate(task: Dict, history: List[Dict]) -> Optional[float]:
+            return self.estimate_task_time(
+                task_name=task.get("nom", "Tâche sans nom"),
+                task_description=task.get("description", ""),
+                project_context=project_context,
+                historical_tasks=history,
+                task_content=task.get("content", "")
+            )
+        
+        def estimate_unit(unit: List[Dict]) -> List[Optional[float]]:
+            neighbours = similarity_index.top_k(unit, HISTORY_SIZE)
+            if len(unit) == 1:
+                return [estimate(unit[0], neighbours[0])]
+            # Historique commun : les voisines de chaque tâche, à tour de rôle, sans doublon
+            history, seen = [], set()
+            for rank in range(HISTORY_SIZE):
+                for similar in neighbours:
+                    if rank < len(similar) and similar[rank]["id"] not in seen:
+                        seen.add(similar[rank]["id"])
+                        history.append(similar[rank])
+            try:
+                packed = self.estimate_tasks_packed(
+                    unit, project_context, history[:HISTORY_SIZE], task_histories=neighbours
+                )
+            except Exception as e:
+                # Un paquet en erreur n'arrête pas le run : ses tâches sont estimées une par une
+                print(f"❌ Erreur estimation groupée ({len(unit)} tâches): {e}")
+                self.metrics.increment("openai", "pack_failures")
+                packed = {}
+            # Repli tâche par tâche pour les réponses manquantes
+            return [
+                packed.get(task.get("id")) or estimate(task, similar)
+                for task, similar in zip(unit, neighbours)
+            ]
+        
+        finished = queue.Queue()
+        in_flight = threading.Semaphore(2 * workers)
+        end = object()
+        
+        def feed():
+            # Unités de travail : une tâche, ou un paquet de tâches au même contexte (projet)
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    def submit(unit: List[Dict]):
+                        in_flight.acquire()
+                        future = pool.submit(estimate_unit, unit)
+                        future.add_done_callback(lambda f: (in_flight.release(), finished.put((unit, f))))
+                    
+                    packs = {}
+                    for task in tasks:
+                        if self.pack_size <= 1:
+                            submit([task])
+                            continue
+                        pack = packs.setdefault(tuple(task.get("projet") or []), [])
+                        pack.append(task)
+                        if len(pack) >= self.pack_size:
+                            submit(packs.pop(tuple(task.get("projet") or [])))
+                    for pack in packs.values():
+                        submit(pack)
+            except Exception as e:
+                finished.put((None, e))
+            finally:
+                finished.put((end, None))
+        
+        print(f"🤖 Estimation GPT ({workers} requêtes en parallèle"
+              f"{f', paquets de {self.pack_size} tâches' if self.pack_size > 1 else ''})")
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        
+        done = 0
+        progress = lambda: f"{done}/{total}" if total else f"{done}"
+        while True:
+            unit, outcome = finished.get()
+            if unit is end:
+                break
+            if unit is None:
+                raise outcome
+            for task, estimated_time in zip(unit, outcome.result()):
+                done += 1
+                # Une ligne complète par tâche terminée : lisible malgré l'ordre d'arrivée
+                nom = task.get("nom", "Tâche sans nom")
+                with self._print_lock:
+                    if estimated_time:
+                        print(f"  ✅ [{progress()}] {nom}: {estimated_time} min")
+                    else:
+                        print(f"  ⚠️ [{progress()}] {nom}: échec estimation")
+                yield task, estimated_time
+        feeder.join()
     
     def batch_estimate(
         self,
         tasks_to_estimate: List[Dict],
         all_tasks_history: List[Dict],
-        project_name: str = "Projet EISF"
+        project_name: str = "Projet EISF",
+        similarity_index: Optional[SimilarityIndex] = None
     ) -> Dict[str, float]:
         """
-        Estime plusieurs tâches en batch
+        Estime plusieurs tâches en batch (voir iter_estimates)
         Returns: Dict[task_id -> estimated_minutes]
         """
-        estimates = {}
+        results = {}
+        for task, estimated_time in self.iter_estimates(
+            tasks_to_estimate, all_tasks_history, project_name,
+            similarity_index=similarity_index, total=len(tasks_to_estimate)
+        ):
+            results[task.get("id")] = estimated_time
         
-        for i, task in enumerate(tasks_to_estimate, 1):
-            task_id = task.get("id")
-            task_name = task.get("nom", "Tâche sans nom")
-            task_desc = task.get("description", "")
-            task_content = task.get("content", "")
-            
-            print(f"🤖 Estimation {i}/{len(tasks_to_estimate)}: {task_name}")
-            
-            # Filtrer l'historique (tâches similaires du même projet)
-            similar_tasks = [
-                t for t in all_tasks_history
-                if t.get("projet") == task.get("projet") and t.get("temps_reel", 0) > 0
-            ]
-            
-            estimated_time = self.estimate_task_time(
-                task_name=task_name,
-                task_description=task_desc,
-                project_context=f"Projet: {project_name}",
-                historical_tasks=similar_tasks,
-                task_content=task_content
-            )
-            
-            if estimated_time:
-                estimates[task_id] = estimated_time
-                print(f"  ✅ {estimated_time} min estimées")
-            else:
-                print(f"  ⚠️ Échec estimation")
+        # Ordre des tâches en entrée, indépendamment de l'ordre de fin des appels
+        estimates = {}
+        for task in tasks_to_estimate:
+            if results.get(task.get("id")):
+                estimates[task.get("id")] = results[task.get("id")]
         
         return estimates
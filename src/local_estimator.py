@@ -0,0 +1,118 @@
+"""
+Estimation locale (sans appel GPT) par plus proches voisins
+Moyenne pondérée en espace logarithmique des temps réels des tâches historiques les plus proches,
+avec un score de confiance : seules les tâches peu sûres sont envoyées à GPT
+"""
+import json
+import os
+import random
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from atomic_file import write_atomic
+from similarity import SimilarityIndex
+
+
+class LocalEstimator:
+    """
+    k plus proches voisins sur l'index de similarité de l'historique
+    confiance = similarité moyenne des voisines x accord de leurs temps réels (1 si identiques)
+    """
+
+    def __init__(self, index: SimilarityIndex, k: int = 5, threshold: float = 0.75, min_neighbours: int = 3):
+        self.index = index
+        self.k = k
+        self.threshold = threshold
+        self.min_neighbours = min_neighbours
+
+    def predict(self, tasks: List[Dict]) -> List[Tuple[Optional[float], float]]:
+        """(minutes ou None, confiance entre 0 et 1) pour chaque tâche"""
+        predictions = []
+        for scored in self.index.top_k_scored(tasks, self.k):
+            pairs = [
+                (min(score, 1.0), task.get("temps_reel") or 0)
+                for task, score in scored
+                if score > 0 and (task.get("temps_reel") or 0) > 0
+            ]
+            if len(pairs) < self.min_neighbours:
+                predictions.append((None, 0.0))
+                continue
+
+            similarities = np.array([s for s, _ in pairs])
+            logs = np.log([t for _, t in pairs])
+            # Les plus proches comptent davantage
+            weights = similarities ** 2
+            mean = float(np.average(logs, weights=weights))
+            spread = float(np.sqrt(np.average((logs - mean) ** 2, weights=weights)))
+
+            minutes = max(5.0, round(np.exp(mean) / 5) * 5)
+            confidence = float(np.average(similarities, weights=weights)) * float(np.exp(-spread))
+            predictions.append((minutes, confidence))
+        return predictions
+
+    def is_confident(self, confidence: float) -> bool:
+        return confidence >= self.threshold
+
+    def backtest(self, sample_size: int = 500) -> Dict:
+        """
+        Précision sur l'historique lui-même (chaque tâche prédite sans elle-même)
+        sample_size: nombre max de tâches testées (échantillon fixe d'un run à l'autre)
+        Returns: nombre de tâches, part couverte avec confiance suffisante, écart médian/moyen vs réel
+        """
+        history = [t for t in self.index.tasks if (t.get("temps_reel") or 0) > 0]
+        if len(history) > sample_size:
+            history = random.Random(0).sample(history, sample_size)
+        errors = [
+            abs(minutes - task["temps_reel"]) / task["temps_reel"]
+            for task, (minutes, confidence) in zip(history, self.predict(history))
+            if minutes is not None and self.is_confident(confidence)
+        ]
+        return {
+            "tasks": len(history),
+            "covered": len(errors),
+            **accuracy(errors)
+        }
+
+
+def accuracy(errors: List[float]) -> Dict:
+    """Écarts relatifs |estimé - réel| / réel -> écart médian et moyen (None si aucun)"""
+    if not errors:
+        return {"median_error": None, "mean_error": None}
+    return {"median_error": float(np.median(errors)), "mean_error": float(np.mean(errors))}
+
+
+class TierLedger:
+    """Mémorise, par tâche, la source de la dernière estimation écrite ("local" ou "gpt")"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def record(self, task_id: str, tier: str, minutes: float):
+        with self._lock:
+            self.entries[task_id] = {"tier": tier, "minutes": minutes}
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.entries, ensure_ascii=False)
+        write_atomic(self.path, data)
+
+    def accuracy_by_tier(self, history: List[Dict]) -> Dict[str, Dict]:
+        """Précision de chaque source sur les tâches terminées depuis (temps réel connu)"""
+        errors: Dict[str, List[float]] = {}
+        with self._lock:
+            for task in history:
+                entry = self.entries.get(task["id"])
+                real = task.get("temps_reel") or 0
+                if entry and real > 0:
+                    errors.setdefault(entry["tier"], []).append(abs(entry["minutes"] - real) / real)
+        return {tier: {"tasks": len(values), **accuracy(values)} for tier, values in errors.items()}
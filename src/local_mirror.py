@@ -0,0 +1,237 @@
+"""
+Miroir local SQLite de la base Tâches (et des saisies de temps agrégées)
+Permet une synchronisation incrémentale basée sur last_edited_time
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from task_records import TaskRecord
+from time_entries import TimeEntry
+
+# last_edited_time de Notion est à la minute : un hash lu pendant la minute de la dernière modification
+# peut précéder une autre modification faite dans cette même minute
+EDIT_TIME_PRECISION = 60
+
+
+class LocalMirror:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    page_id TEXT PRIMARY KEY,
+                    database_id TEXT NOT NULL,
+                    properties TEXT NOT NULL,
+                    content_hash TEXT,
+                    last_edited_time TEXT,
+                    read_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_tasks_db ON tasks(database_id);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    database_id TEXT PRIMARY KEY,
+                    watermark TEXT
+                );
+                -- Dernière relecture complète (pages supprimées ou archivées retirées)
+                CREATE TABLE IF NOT EXISTS full_syncs (
+                    database_id TEXT PRIMARY KEY,
+                    synced_at REAL NOT NULL
+                );
+                -- Une ligne par lien saisie -> tâche
+                CREATE TABLE IF NOT EXISTS time_entries (
+                    entry_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    database_id TEXT NOT NULL,
+                    minutes REAL NOT NULL,
+                    sweep_mark TEXT,
+                    PRIMARY KEY (entry_id, task_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_time_entries_task ON time_entries(task_id);
+                -- Dernier total de temps réel écrit dans Notion, par tâche
+                CREATE TABLE IF NOT EXISTS real_time_totals (
+                    task_id TEXT PRIMARY KEY,
+                    minutes REAL NOT NULL
+                );
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+            if "read_at" not in columns:
+                # Miroir d'une version précédente : hashs sans instant de lecture, relus une fois
+                self._conn.execute("ALTER TABLE tasks ADD COLUMN read_at REAL")
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+    
+    def get_watermark(self, database_id: str) -> Optional[str]:
+        """Dernier last_edited_time synchronisé (None si jamais synchronisé)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark FROM sync_state WHERE database_id = ?", (database_id,)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def set_watermark(self, database_id: str, watermark: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (database_id, watermark) VALUES (?, ?)",
+                (database_id, watermark)
+            )
+    
+    def reset_watermark(self, database_id: str):
+        """Oublie le watermark : la prochaine synchronisation relira toute la base"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sync_state WHERE database_id = ?", (database_id,))
+    
+    def get_full_sync(self, database_id: str) -> Optional[float]:
+        """Instant (epoch) de la dernière relecture complète, None si jamais"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_at FROM full_syncs WHERE database_id = ?", (database_id,)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def set_full_sync(self, database_id: str, synced_at: Optional[float] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO full_syncs (database_id, synced_at) VALUES (?, ?)",
+                (database_id, time.time() if synced_at is None else synced_at)
+            )
+    
+    def upsert_tasks(self, database_id: str, tasks: List[TaskRecord], replace_all: bool = False):
+        """
+        Enregistre les propriétés extraites des tâches modifiées
+        Le hash de contenu est remis à NULL si la page a changé, ou s'il a été calculé dans la minute
+        de sa dernière modification : le contenu devra être relu
+        replace_all: supprime les tâches absentes (synchronisation complète)
+        """
+        rows = [
+            (t.id, database_id, json.dumps(t.to_dict(), ensure_ascii=False), t.last_edited_time)
+            for t in tasks
+        ]
+        with self._lock, self._conn:
+            if replace_all:
+                kept = {row[0] for row in rows}
+                missing = [
+                    (page_id,) for (page_id,) in self._conn.execute(
+                        "SELECT page_id FROM tasks WHERE database_id = ?", (database_id,)
+                    )
+                    if page_id not in kept
+                ]
+                self._conn.executemany("DELETE FROM tasks WHERE page_id = ?", missing)
+            # Page non modifiée depuis une lecture postérieure à la minute de sa modification :
+            # son hash de contenu reste valable
+            kept = (
+                "tasks.last_edited_time IS excluded.last_edited_time "
+                "AND tasks.read_at >= CAST(strftime('%s', tasks.last_edited_time) AS REAL) + "
+                f"{EDIT_TIME_PRECISION}"
+            )
+            self._conn.executemany(
+                "INSERT INTO tasks (page_id, database_id, properties, content_hash, last_edited_time) "
+                "VALUES (?, ?, ?, NULL, ?) "
+                "ON CONFLICT(page_id) DO UPDATE SET "
+                "database_id = excluded.database_id, "
+                "properties = excluded.properties, "
+                f"content_hash = CASE WHEN {kept} THEN tasks.content_hash ELSE NULL END, "
+                f"read_at = CASE WHEN {kept} THEN tasks.read_at ELSE NULL END, "
+                "last_edited_time = excluded.last_edited_time",
+                rows
+            )
+    
+    def set_content_hash(self, page_id: str, content_hash: str, read_at: Optional[float] = None):
+        """read_at: début de la lecture du contenu haché (défaut : maintenant)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE tasks SET content_hash = ?, read_at = ? WHERE page_id = ?",
+                (content_hash, time.time() if read_at is None else read_at, page_id)
+            )
+    
+    def update_task(self, page_id: str, **fields):
+        """Met à jour des propriétés extraites après une écriture dans Notion"""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT properties FROM tasks WHERE page_id = ?", (page_id,)
+            ).fetchone()
+            if not row:
+                return
+            properties = json.loads(row[0])
+            properties.update(fields)
+            self._conn.execute(
+                "UPDATE tasks SET properties = ? WHERE page_id = ?",
+                (json.dumps(properties, ensure_ascii=False), page_id)
+            )
+    
+    def load_tasks(self, database_id: str) -> List[TaskRecord]:
+        """Toutes les tâches du miroir (propriétés extraites + content_hash)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT properties, content_hash FROM tasks WHERE database_id = ?", (database_id,)
+            ).fetchall()
+        tasks = []
+        for properties, content_hash in rows:
+            task = TaskRecord.from_dict(json.loads(properties))
+            task.content_hash = content_hash
+            tasks.append(task)
+        return tasks
+    
+    def upsert_time_entries(self, database_id: str, entries: List[TimeEntry], sweep_mark: Optional[str] = None):
+        """
+        Remplace les liens saisie -> tâches des saisies reçues
+        sweep_mark: marque des saisies vues pendant une relecture complète (voir sweep_time_entries)
+        """
+        if not entries:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM time_entries WHERE entry_id = ?", [(entry.id,) for entry in entries]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO time_entries (entry_id, task_id, database_id, minutes, sweep_mark) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (entry.id, task_id, database_id, entry.minutes, sweep_mark)
+                    for entry in entries for task_id in entry.task_ids
+                ]
+            )
+    
+    def sweep_time_entries(self, database_id: str, sweep_mark: str) -> int:
+        """Après une relecture complète : supprime les saisies non revues (supprimées dans Notion)"""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM time_entries WHERE database_id = ? AND sweep_mark IS NOT ?",
+                (database_id, sweep_mark)
+            ).rowcount
+    
+    def real_time_changes(self, database_id: str) -> List[Tuple[str, Optional[float], Optional[float]]]:
+        """
+        Tâches dont le total des saisies diffère du dernier total écrit (ou écriture jamais réussie)
+        Returns: [(task_id, nouveau total (arrondi à 0,01) ou None si plus aucune saisie, dernier total écrit ou None)]
+        """
+        # Total arrondi comme celui écrit dans Notion : comparable au dernier total mémorisé
+        with self._lock:
+            return self._conn.execute(
+                "SELECT e.task_id, ROUND(SUM(e.minutes), 2) AS total, w.minutes FROM time_entries e "
+                "LEFT JOIN real_time_totals w ON w.task_id = e.task_id "
+                "WHERE e.database_id = ? GROUP BY e.task_id "
+                "HAVING w.minutes IS NULL OR ABS(total - w.minutes) > 1e-6 "
+                "UNION ALL "
+                "SELECT w.task_id, NULL, w.minutes FROM real_time_totals w "
+                "WHERE NOT EXISTS (SELECT 1 FROM time_entries e WHERE e.task_id = w.task_id)",
+                (database_id,)
+            ).fetchall()
+    
+    def set_real_time_total(self, task_id: str, minutes: Optional[float]):
+        """Mémorise le total écrit dans Notion (None : la tâche n'a plus de saisie)"""
+        with self._lock, self._conn:
+            if minutes is None:
+                self._conn.execute("DELETE FROM real_time_totals WHERE task_id = ?", (task_id,))
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO real_time_totals (task_id, minutes) VALUES (?, ?)",
+                    (task_id, minutes)
+                )
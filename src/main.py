@@ -6,7 +6,12 @@ import os
 import sys
 import json
 import hashlib
-from datetime import datetime
+import signal
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from itertools import chain
 
 # Forcer l'encodage UTF-8 pour Windows (pour les émojis)
 if sys.platform == 'win32':
@@ -17,13 +22,25 @@ from dotenv import load_dotenv
 # Charger les variables d'environnement depuis .env
 # Cherche d'abord dans le dossier parent (racine du projet)
 env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
-load_dotenv(env_path, override=True)
+# Lancé par multi_run.py : l'environnement de l'entrée du manifeste prime sur le .env
+load_dotenv(env_path, override=os.getenv("MARTINE_MANIFEST_ENTRY") is None)
 
 # Ajouter le dossier courant au path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from notion_client import NotionClient
-from gpt_estimator import GPTEstimator
+from snapshot import NotionSnapshot
+from local_mirror import LocalMirror
+from schema_cache import SchemaCache
+from block_cache import BlockCache
+from checkpoint import RunCheckpoint
+from task_records import TaskProjector, find_due_date
+from bulk_writer import BulkWriter, same_value
+from metrics import RunMetrics
+from rate_limiter import TokenBucket
+from time_entries import TimeEntryProjector
+from scheduler import EstimationScheduler, RunBudget
+# GPTEstimator, SimilarityIndex et LocalEstimator (numpy) ne sont importés que s'il y a des tâches à estimer
 
 # Configuration depuis variables d'environnement (.env)
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
@@ -32,87 +49,496 @@ DB_TACHES = os.getenv("DATABASE_TACHES")
 DB_SAISIES = os.getenv("DATABASE_SAISIES_TEMPS")
 GPT_KEY = os.getenv("GPT_API_KEY")
 GPT_MODEL = os.getenv("GPT_MODEL", "gpt-4o")
+# Nom du projet donné à GPT comme contexte
+PROJECT_NAME = os.getenv("PROJECT_NAME", "EISF Alternance")
 
-# Vérifier que les variables essentielles sont définies
-if not NOTION_TOKEN:
-    raise ValueError("❌ NOTION_TOKEN manquant dans le fichier .env")
-if not GPT_KEY:
-    raise ValueError("❌ GPT_API_KEY manquant dans le fichier .env")
+# Saisies de temps : relation vers les tâches et durée (détectées dans le schéma si vides)
+SAISIES_TACHE_PROPERTY = os.getenv("SAISIES_TACHE_PROPERTY")
+SAISIES_DUREE_PROPERTY = os.getenv("SAISIES_DUREE_PROPERTY")
+# Minutes par unité de durée saisie (60 si les saisies sont en heures)
+# Vide : unité déduite du nom de la propriété de durée (« (h) », « heures » -> 60)
+SAISIES_DUREE_MINUTES = float(os.getenv("SAISIES_DUREE_MINUTES")) if os.getenv("SAISIES_DUREE_MINUTES") else None
 
-# Initialiser clients
-notion = NotionClient(NOTION_TOKEN)
-gpt = GPTEstimator(GPT_KEY, GPT_MODEL)
+# Estimations GPT concurrentes dans les budgets par minute du compte OpenAI
+GPT_CONCURRENCY = int(os.getenv("GPT_CONCURRENCY", "4"))
+GPT_RPM = int(os.getenv("GPT_RPM", "500"))
+GPT_TPM = int(os.getenv("GPT_TPM", "30000"))
+GPT_PACK_SIZE = int(os.getenv("GPT_PACK_SIZE", "5"))
+# Taille max d'un prompt d'estimation (tokens) : historique et contenu des pages compactés pour tenir dedans
+GPT_PROMPT_TOKENS = int(os.getenv("GPT_PROMPT_TOKENS", "3000"))
+# Mode batch (--batch) : délai minimal entre deux vérifications d'un job soumis
+GPT_BATCH_POLL_SECONDS = float(os.getenv("GPT_BATCH_POLL_SECONDS", "60"))
+
+# Points d'accès des API (remplaçables par des serveurs locaux, cf. bench/)
+NOTION_BASE_URL = os.getenv("NOTION_BASE_URL", "https://api.notion.com/v1")
+GPT_BASE_URL = os.getenv("GPT_BASE_URL", "https://api.openai.com/v1")
+# Débit moyen autorisé par Notion (requêtes/s)
+NOTION_RPS = float(os.getenv("NOTION_RPS", "3"))
+
+# Récupération parallèle du contenu des pages
+FETCH_WORKERS = int(os.getenv("NOTION_FETCH_WORKERS", "4"))
+PAGE_TIMEOUT = float(os.getenv("NOTION_PAGE_TIMEOUT", "60"))
+MAX_BLOCK_DEPTH = int(os.getenv("NOTION_MAX_DEPTH", "3"))
+MAX_BLOCKS = int(os.getenv("NOTION_MAX_BLOCKS", "1000"))
+# Blocs déjà lus réutilisés tant que leur parent n'a pas changé, au plus ce nombre d'heures (0 = sans cache)
+BLOCK_CACHE_HOURS = float(os.getenv("NOTION_BLOCK_CACHE_HOURS", "24"))
+
+# Estimation locale (k plus proches voisins) avant GPT : seules les tâches sous ce seuil de confiance
+# partent vers GPT (LOCAL_CONFIDENCE > 1 pour tout envoyer à GPT)
+LOCAL_CONFIDENCE = float(os.getenv("LOCAL_CONFIDENCE", "0.75"))
+LOCAL_NEIGHBOURS = int(os.getenv("LOCAL_NEIGHBOURS", "5"))
+
+# Ordre de traitement des tâches à estimer (critères : statut, echeance, nouvelle, reportee)
+PRIORITY_ORDER = [name.strip() for name in os.getenv("PRIORITY_ORDER", "statut,echeance,nouvelle,reportee").split(",") if name.strip()]
+PRIORITY_STATUSES = [name.strip() for name in os.getenv("PRIORITY_STATUSES", "En cours,À faire").split(",") if name.strip()]
+# Propriété date d'échéance des tâches (détectée dans le schéma si absente)
+ECHEANCE_PROPERTY = os.getenv("ECHEANCE_PROPERTY")
+# Budgets d'un run (0 = pas de limite) : une fois épuisés, les tâches restantes sont reportées au run suivant
+BUDGET_MINUTES = float(os.getenv("BUDGET_MINUTES", "0"))
+BUDGET_TOKENS = int(os.getenv("BUDGET_TOKENS", "0"))
+BUDGET_NOTION_REQUESTS = int(os.getenv("BUDGET_NOTION_REQUESTS", "0"))
+
+# Taille des files entre étapes du pipeline (lecture -> estimation -> écriture)
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "50"))
+WRITE_WORKERS = int(os.getenv("NOTION_WRITE_WORKERS", "4"))
+
+# Caches locaux (miroir SQLite pour la synchro incrémentale, réponses GPT)
+CACHE_DIR = os.getenv("MARTINE_CACHE_DIR", "cache")
+GPT_CACHE_TTL_DAYS = float(os.getenv("GPT_CACHE_TTL_DAYS", "30"))
+GPT_CACHE_MAX_ENTRIES = int(os.getenv("GPT_CACHE_MAX_ENTRIES", "20000"))
+# Schémas des databases réutilisés d'un run à l'autre pendant ce délai (s)
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "3600"))
+
+# Mode surveillance : intervalle de scrutation (s), allongé jusqu'au max tant que rien ne change
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "30"))
+WATCH_MAX_INTERVAL = float(os.getenv("WATCH_MAX_INTERVAL", "600"))
+WATCH_RECONCILE_HOURS = float(os.getenv("WATCH_RECONCILE_HOURS", "6"))
+# Mode incrémental : relecture complète au-delà de ce délai (pages supprimées ou archivées, absentes
+# des requêtes incrémentales ; 0 = jamais)
+FULL_SYNC_HOURS = float(os.getenv("FULL_SYNC_HOURS", "24"))
+
+# Logs des estimations et rapports de métriques
+LOGS_DIR = os.getenv("MARTINE_LOGS_DIR", "logs")
+# Fichier texte Prometheus (collecteur textfile de node_exporter), réécrit à chaque run
+METRICS_PROM_PATH = os.getenv("METRICS_PROM_PATH", os.path.join(LOGS_DIR, "martine.prom"))
+
+# Statuts jamais estimés
+EXCLUDED_STATUS = ["Infos", "Backlog", "Plateforme"]
+
+# Instrumentation partagée par les clients et les phases du run
+metrics = RunMetrics()
+
+# Clients et états du run, créés au premier besoin : un run sans rien à faire ne paie que ce qu'il utilise
+notion = None
+gpt = None
+snapshot = None
+similarity = None
+local_estimator = None
+batch_estimator = None
+
+def get_notion() -> NotionClient:
+    global notion
+    if notion is None:
+        if not NOTION_TOKEN:
+            raise ValueError("❌ NOTION_TOKEN manquant dans le fichier .env")
+        notion = NotionClient(
+            NOTION_TOKEN,
+            rate_limiter=TokenBucket(rate=NOTION_RPS, capacity=max(10, NOTION_RPS * 3)),
+            max_depth=MAX_BLOCK_DEPTH,
+            max_blocks=MAX_BLOCKS,
+            metrics=metrics,
+            base_url=NOTION_BASE_URL,
+            block_cache=BlockCache(
+                os.path.join(CACHE_DIR, "blocks.sqlite"), max_age_seconds=BLOCK_CACHE_HOURS * 3600
+            ) if BLOCK_CACHE_HOURS > 0 else None
+        )
+    return notion
+
+def get_gpt():
+    global gpt
+    if gpt is None:
+        if not GPT_KEY:
+            raise ValueError("❌ GPT_API_KEY manquant dans le fichier .env")
+        from gpt_estimator import GPTEstimator
+        from estimation_cache import EstimationCache
+        cache = EstimationCache(
+            os.path.join(CACHE_DIR, "estimations.sqlite"),
+            ttl_seconds=GPT_CACHE_TTL_DAYS * 86400,
+            max_entries=GPT_CACHE_MAX_ENTRIES
+        )
+        # Réponses expirées jamais relues : supprimées à l'ouverture plutôt que gardées jusqu'à l'éviction LRU
+        cache.purge_expired()
+        gpt = GPTEstimator(
+            GPT_KEY, GPT_MODEL,
+            max_concurrency=GPT_CONCURRENCY,
+            requests_per_minute=GPT_RPM,
+            tokens_per_minute=GPT_TPM,
+            pack_size=GPT_PACK_SIZE,
+            cache=cache,
+            metrics=metrics,
+            base_url=GPT_BASE_URL,
+            max_prompt_tokens=GPT_PROMPT_TOKENS
+        )
+    return gpt
+
+def get_batch_estimator():
+    """Jobs batch OpenAI : soumission des gros imports, relève des résultats aux runs suivants"""
+    global batch_estimator
+    if batch_estimator is None:
+        from gpt_batch import BatchEstimator, BatchJobStore, OpenAIBatchTransport
+        batch_estimator = BatchEstimator(
+            get_gpt(),
+            OpenAIBatchTransport(GPT_KEY, base_url=GPT_BASE_URL, metrics=metrics),
+            BatchJobStore(os.path.join(CACHE_DIR, "gpt_batches.json")),
+            poll_interval=GPT_BATCH_POLL_SECONDS
+        )
+    return batch_estimator
+
+def batch_jobs_pending():
+    """Un job batch attend ses résultats (sans charger GPT ni numpy s'il n'y en a pas)"""
+    if batch_estimator is None and not os.path.exists(os.path.join(CACHE_DIR, "gpt_batches.json")):
+        return False
+    return len(get_batch_estimator().store) > 0
+
+def get_snapshot() -> NotionSnapshot:
+    """Snapshot partagé par toutes les phases : DB_TACHES n'est paginée qu'une fois par run"""
+    global snapshot
+    if snapshot is None:
+        snapshot = NotionSnapshot(get_notion())
+    return snapshot
+
+def get_similarity():
+    """Index de similarité de l'historique, complété à chaque chargement"""
+    global similarity
+    if similarity is None:
+        from similarity import SimilarityIndex
+        similarity = SimilarityIndex()
+    return similarity
+
+def get_local_estimator():
+    global local_estimator
+    if local_estimator is None:
+        from local_estimator import LocalEstimator
+        local_estimator = LocalEstimator(get_similarity(), k=LOCAL_NEIGHBOURS, threshold=LOCAL_CONFIDENCE)
+    return local_estimator
+
+# Miroir local, ouvert uniquement en mode incrémental
+mirror = None
+
+def get_mirror() -> LocalMirror:
+    global mirror
+    if mirror is None:
+        mirror = LocalMirror(os.path.join(CACHE_DIR, "martine.sqlite"))
+    return mirror
+
+# Schémas des databases : en mémoire pour le run, sur disque entre deux runs
+schemas = {}
+schema_cache = None
+
+def get_schema_cache() -> SchemaCache:
+    global schema_cache
+    if schema_cache is None:
+        schema_cache = SchemaCache(os.path.join(CACHE_DIR, "schemas.json"), ttl_seconds=SCHEMA_CACHE_TTL)
+    return schema_cache
+
+def get_schema(database_id):
+    if database_id not in schemas:
+        schemas[database_id] = get_schema_cache().get(database_id, get_notion().get_database)
+    return schemas[database_id]
+
+def forget_schema(database_id):
+    """Le schéma sera relu depuis Notion (mémoire et disque)"""
+    global task_projector
+    schemas.pop(database_id, None)
+    get_schema_cache().invalidate(database_id)
+    if database_id == DB_TACHES:
+        task_projector = None
+
+# Projection des pages Tâches en TaskRecord, compilée depuis le schéma
+task_projector = None
+
+def get_task_projector() -> TaskProjector:
+    global task_projector
+    if task_projector is None:
+        schema = get_schema(DB_TACHES)
+        task_projector = TaskProjector(schema, {"echeance": ECHEANCE_PROPERTY or find_due_date(schema)})
+        get_snapshot().set_projection(DB_TACHES, task_projector)
+    return task_projector
+
+# Colonnes ajoutées par Martine dans Tâches
+TASK_COLUMNS = {
+    "⏱️ Temps estimé IA (min)": {"number": {"format": "number"}},
+    "⏱️ Temps réel agrégé (min)": {"number": {"format": "number"}},
+    "📊 Écart (%)": {"number": {"format": "percent"}},
+    "🔄 Hash contenu": {"rich_text": {}}
+}
 
 def setup_columns():
-    """Ajoute les colonnes manquantes si nécessaire"""
+    """Ajoute les colonnes manquantes si nécessaire (en un seul PATCH ; schéma en cache si déjà vérifié)"""
+    global task_projector
     print("\n🔧 Vérification des colonnes...")
     
     # Colonnes à ajouter dans Tâches
-    taches_schema = notion.get_database_schema(DB_TACHES)
+    taches_schema = get_schema(DB_TACHES)
+    missing = {name: config for name, config in TASK_COLUMNS.items() if name not in taches_schema}
     
-    if "⏱️ Temps estimé IA (min)" not in taches_schema:
-        notion.add_property_to_database(
-            DB_TACHES,
-            "⏱️ Temps estimé IA (min)",
-            {"number": {"format": "number"}}
-        )
+    if missing:
+        database = get_notion().add_properties_to_database(DB_TACHES, missing)
+        if database and set(missing) <= set(database.get("properties", {})):
+            # La réponse contient le nouveau schéma : pas de relecture, la projection sera recompilée
+            get_schema_cache().put(DB_TACHES, database)
+            schemas[DB_TACHES] = database["properties"]
+            task_projector = None
+        else:
+            forget_schema(DB_TACHES)
     
-    if "⏱️ Temps réel agrégé (min)" not in taches_schema:
-        notion.add_property_to_database(
-            DB_TACHES,
-            "⏱️ Temps réel agrégé (min)",
-            {"number": {"format": "number"}}
-        )
+    print("✅ Colonnes prêtes")
+
+def aggregate_real_times():
+    """
+    Agrège les temps réels depuis les saisies temps, en flux et en incrémental :
+    seules les saisies modifiées depuis le dernier passage sont lues (totaux par tâche tenus
+    dans le miroir local), et seules les tâches dont le total a changé sont réécrites
+    Returns: {task_id: minutes} des totaux écrits dans Notion (None : plus aucune saisie)
+    """
+    if not DB_SAISIES:
+        print("\nℹ️ DATABASE_SAISIES_TEMPS non configurée : agrégation des temps réels ignorée")
+        return {}
     
-    if "📊 Écart (%)" not in taches_schema:
-        notion.add_property_to_database(
-            DB_TACHES,
-            "📊 Écart (%)",
-            {"number": {"format": "percent"}}
+    print("\n📊 Agrégation des temps réels...")
+    schema = get_schema(DB_SAISIES)
+    try:
+        projector = TimeEntryProjector(
+            schema, DB_TACHES, SAISIES_TACHE_PROPERTY, SAISIES_DUREE_PROPERTY, SAISIES_DUREE_MINUTES
         )
+    except ValueError as e:
+        print(f"⚠️ {e}")
+        return {}
     
-    if "🔄 Hash contenu" not in taches_schema:
-        notion.add_property_to_database(
-            DB_TACHES,
-            "🔄 Hash contenu",
-            {"rich_text": {}}
-        )
+    local = get_mirror()
+    watermark = incremental_watermark(DB_SAISIES)
+    query = get_notion().new_query(schema).select(*projector.property_names)
+    if watermark:
+        query.edited_since(watermark)
+    # Relecture complète : les saisies non revues (supprimées dans Notion) seront retirées
+    sweep_mark = None if watermark else datetime.now(timezone.utc).isoformat()
     
-    print("✅ Colonnes prêtes")
+    errors_before = get_notion().stats["query_errors"]
+    batch = []
+    read = 0
+    latest = watermark or ""
+    # Flux : chaque saisie est projetée dès réception et enregistrée par lots
+    for entry in get_notion().iter_query_database(
+        DB_SAISIES, query.filter, transform=projector, filter_properties=query.property_ids
+    ):
+        batch.append(entry)
+        read += 1
+        latest = max(latest, entry.last_edited_time or "")
+        if len(batch) >= 500:
+            local.upsert_time_entries(DB_SAISIES, batch, sweep_mark)
+            batch = []
+    local.upsert_time_entries(DB_SAISIES, batch, sweep_mark)
+    
+    # Lecture interrompue : les saisies lues sont gardées, mais ni watermark ni nettoyage
+    if get_notion().stats["query_errors"] == errors_before:
+        if sweep_mark:
+            local.sweep_time_entries(DB_SAISIES, sweep_mark)
+            local.set_full_sync(DB_SAISIES)
+        if latest:
+            local.set_watermark(DB_SAISIES, latest)
+    
+    if watermark:
+        print(f"🔁 {read} saisies modifiées depuis {watermark}")
+    else:
+        print(f"🔁 Agrégation complète : {read} saisies lues")
+    
+    changes = local.real_time_changes(DB_SAISIES)
+    if not changes:
+        print("✅ Temps réels à jour")
+        return {}
+    
+    current = {}
+    if not watermark:
+        # Premier passage : les temps déjà présents dans Notion évitent de réécrire des valeurs identiques
+        current = {t.id: t.temps_reel for t in load_tasks(lambda t: (t.temps_reel or 0) > 0)}
+    
+    totals = {}
+    
+    def written(total):
+        def done(page_id, success):
+            if not success:
+                # Le total restera différent dans le miroir : nouvel essai au prochain passage
+                return
+            local.set_real_time_total(page_id, total)
+            local.update_task(page_id, temps_reel=total)
+            totals[page_id] = total
+        return done
+    
+    confirmed = 0
+    with new_writer() as writer:
+        for task_id, total, last_written in changes:
+            previous = current.get(task_id, last_written)
+            if same_value(previous, total):
+                # Déjà à jour dans Notion : mémorisé dans le miroir, sans écriture ni compte dans les totaux
+                local.set_real_time_total(task_id, total)
+                local.update_task(task_id, temps_reel=total)
+                confirmed += 1
+                continue
+            writer.put(
+                task_id,
+                {"⏱️ Temps réel agrégé (min)": total},
+                current={"⏱️ Temps réel agrégé (min)": previous},
+                on_done=written(total)
+            )
+    
+    print_write_stats(dict(writer.stats, skipped=writer.stats["skipped"] + confirmed), "temps réels mis à jour")
+    return totals
 
-def aggregate_real_times():
-    """Agrège les temps réels depuis les saisies temps"""
-    print("\nℹ️ Agrégation des temps réels DÉSACTIVÉE (car bases différentes)")
-    return {}
+def task_query(*fields):
+    """Requête sur DB_TACHES ne renvoyant que les propriétés des champs TaskRecord donnés"""
+    query = get_notion().new_query(get_schema(DB_TACHES))
+    names = get_task_projector().names
+    return query.select(*(names[field] for field in fields or names))
 
-def get_tasks_to_estimate():
-    """Récupère les tâches sans estimation IA ou dont le contenu a changé"""
+def iter_run_tasks():
+    """
+    Tâches de DB_TACHES utiles à au moins une phase, en flux (propriétés des TaskRecord seulement) :
+    statut non exclu (candidates à l'estimation) ou temps réel renseigné (historique, écarts)
+    Une seule requête pour toutes les phases : filtrée côté Notion, paginée une fois par run puis servie
+    par le snapshot (les pages que nous modifions sont relues individuellement) ; chaque phase trie ensuite
+    """
+    query = task_query()
+    query.any_of(
+        query.branch().where("Statut", "not_in", EXCLUDED_STATUS),
+        query.branch().where("⏱️ Temps réel agrégé (min)", "is_not_empty")
+    )
+    return get_snapshot().iter_database(DB_TACHES, query.filter, query.property_ids)
+
+def incremental_watermark(database_id):
+    """
+    Watermark de la synchro incrémentale d'une database
+    None (relecture complète) si la dernière relecture complète date de plus de FULL_SYNC_HOURS :
+    seule une relecture complète retire du miroir les pages supprimées ou archivées
+    """
+    local = get_mirror()
+    watermark = local.get_watermark(database_id)
+    if watermark and FULL_SYNC_HOURS:
+        last_full = local.get_full_sync(database_id)
+        if last_full is None or time.time() - last_full >= FULL_SYNC_HOURS * 3600:
+            print("🔄 Relecture complète périodique (pages supprimées ou archivées)")
+            return None
+    return watermark
+
+def sync_tasks(incremental=False):
+    """
+    Synchronise DB_TACHES
+    - mode complet : les tâches utiles au run (snapshot du run, statuts exclus filtrés par select_candidates)
+    - mode incrémental : seules les pages modifiées depuis le dernier passage, fusionnées dans le miroir local
+    Returns: (tâches (itérable), ids à (re)vérifier ou None si toutes)
+    """
+    if not incremental:
+        # Flux : les pages JSON brutes ne sont pas gardées, seulement les TaskRecord (triés ensuite par priorité)
+        return iter_run_tasks(), None
+    
+    local = get_mirror()
+    watermark = incremental_watermark(DB_TACHES)
+    # Le miroir garde toutes les tâches (historique compris) : pas de filtre sur le statut
+    query = task_query()
+    if watermark:
+        query.edited_since(watermark)
+    
+    errors_before = get_notion().stats["query_errors"]
+    changed = get_snapshot().query_database(DB_TACHES, query.filter, query.property_ids)
+    # Lecture interrompue : les pages lues sont gardées, mais ni suppression des absentes ni watermark
+    # (les pages non lues seraient perdues pour les synchros suivantes)
+    complete = get_notion().stats["query_errors"] == errors_before
+    local.upsert_tasks(DB_TACHES, changed, replace_all=watermark is None and complete)
+    if watermark is None and complete:
+        local.set_full_sync(DB_TACHES)
+    if changed and complete:
+        local.set_watermark(DB_TACHES, max(t.last_edited_time or "" for t in changed))
+    if not complete:
+        print("⚠️ Synchro incomplète (erreur Notion) : les pages manquantes seront relues au prochain run")
+    
+    if watermark:
+        print(f"🔁 Synchro incrémentale : {len(changed)} pages modifiées depuis {watermark}")
+    else:
+        print(f"🔁 Synchro complète : {len(changed)} pages copiées dans le miroir local")
+    
+    tasks = local.load_tasks(DB_TACHES)
+    # À revérifier : contenu jamais haché (page modifiée), pas d'estimation, ou hash différent
+    pending = {
+        t.id for t in tasks
+        if t.content_hash is None or not t.temps_estime or t.content_hash != t.hash_stocke
+    }
+    return tasks, pending
+
+def load_tasks(predicate, incremental=False):
+    """
+    Tâches vérifiant predicate(TaskRecord) : lues dans le snapshot du run en mode complet,
+    dans le miroir local (sans appel réseau) en mode incrémental
+    """
+    tasks = get_mirror().load_tasks(DB_TACHES) if incremental else iter_run_tasks()
+    return [t for t in tasks if predicate(t)]
+
+def select_candidates(incremental=False):
+    """Tâches à vérifier (statut non exclu ; en incrémental, seulement celles modifiées ou en attente), en flux"""
     print("\n🔍 Recherche des tâches à estimer...")
     
-    taches = notion.query_database(DB_TACHES)
-    to_estimate = []
-    re_estimate_count = 0
+    taches, pending = sync_tasks(incremental)
     
-    for tache in taches:
-        statut = notion.get_property_value(tache, "Statut")
-        temps_estime = notion.get_property_value(tache, "⏱️ Temps estimé IA (min)")
-        hash_stocke = notion.get_property_value(tache, "🔄 Hash contenu") or ""
-        
-        # Filtres utilisateur :
-        # - Exclure : "Infos", "Backlog", "Plateforme"
-        excluded_status = ["Infos", "Backlog", "Plateforme"]
-        
-        if statut in excluded_status:
+    # Filtres utilisateur :
+    # - Exclure : "Infos", "Backlog", "Plateforme"
+    return (
+        tache for tache in taches
+        if tache.statut not in EXCLUDED_STATUS and (pending is None or tache.id in pending)
+    )
+
+def iter_tasks_to_estimate(candidates, incremental=False, counts=None, skip=None):
+    """
+    Lit le contenu des candidates en parallèle, calcule le hash et produit au fil de l'eau
+    les tâches sans estimation IA ou dont le contenu a changé
+    counts: dict optionnel alimenté avec "estimate" et "re_estimate"
+    skip: fonction (task_id, hash) -> bool pour ignorer des tâches déjà traitées
+    """
+    counts = counts if counts is not None else {}
+    counts.setdefault("estimate", 0)
+    counts.setdefault("re_estimate", 0)
+    
+    # Les candidates ne sont parcourues qu'une fois : on garde celles en cours de lecture
+    in_flight = deque()
+    
+    def candidate_ids():
+        for tache in candidates:
+            # Instant de début de lecture : date le hash du contenu dans le miroir
+            in_flight.append((tache, time.time()))
+            # last_edited_time : le contenu d'une page inchangée est reconstruit depuis le cache de blocs
+            yield tache.id, tache.last_edited_time
+    
+    # Récupérer le contenu des pages en parallèle (ordre conservé, au fil de l'eau)
+    contents = get_notion().iter_pages_content(
+        candidate_ids(),
+        max_workers=FETCH_WORKERS,
+        timeout=PAGE_TIMEOUT
+    )
+    
+    for _, content in contents:
+        tache, read_at = in_flight.popleft()
+        nom = tache.nom
+        if content is None:
+            # Sans contenu fiable le hash serait faux : on réessaiera au prochain lancement
+            print(f"   ⚠️ {nom[:50]} ignorée (contenu indisponible)")
             continue
         
-        # Récupérer le contenu pour calculer le hash
-        nom = notion.get_property_value(tache, 'Nom')
-        description = notion.get_property_value(tache, "Description") or ""
-        content = notion.get_page_content(tache["id"])
+        temps_estime = tache.temps_estime
+        hash_stocke = tache.hash_stocke
+        description = tache.description
         
         # Calculer le hash du contenu actuel
         content_to_hash = f"{nom}|{description}|{content}"
         hash_actuel = hashlib.md5(content_to_hash.encode('utf-8')).hexdigest()
+        if incremental:
+            get_mirror().set_content_hash(tache.id, hash_actuel, read_at)
         
         # Déterminer si on doit estimer
         should_estimate = False
@@ -124,139 +550,398 @@ def get_tasks_to_estimate():
         elif hash_actuel != hash_stocke:
             should_estimate = True
             reason = "contenu modifié"
-            re_estimate_count += 1
+        
+        if should_estimate and skip and skip(tache.id, hash_actuel):
+            continue
         
         if should_estimate:
+            counts["estimate"] += 1
+            if reason == "contenu modifié":
+                counts["re_estimate"] += 1
             print(f"   📄 {nom[:50]} ({reason})")
-            to_estimate.append({
-                "id": tache["id"],
+            yield {
+                "id": tache.id,
                 "nom": nom,
                 "description": description,
-                "projet": notion.get_property_value(tache, "Projet/Tlt") or [],
+                "projet": tache.projet,
                 "content": content,
-                "hash": hash_actuel
-            })
+                "hash": hash_actuel,
+                "hash_stocke": hash_stocke,
+                # Valeurs lues dans Notion : une estimation identique n'est pas réécrite
+                "current": {
+                    "⏱️ Temps estimé IA (min)": temps_estime,
+                    "🔄 Hash contenu": hash_stocke
+                }
+            }
+
+def get_tasks_to_estimate(incremental=False):
+    """Récupère les tâches sans estimation IA ou dont le contenu a changé"""
+    counts = {}
+    to_estimate = list(iter_tasks_to_estimate(select_candidates(incremental), incremental, counts))
     
-    if re_estimate_count > 0:
-        print(f"📝 {len(to_estimate)} tâches à estimer ({re_estimate_count} ré-estimations)")
+    if counts["re_estimate"] > 0:
+        print(f"📝 {len(to_estimate)} tâches à estimer ({counts['re_estimate']} ré-estimations)")
     else:
         print(f"📝 {len(to_estimate)} tâches à estimer")
     return to_estimate
 
-def get_historical_tasks():
+def get_historical_tasks(incremental=False):
     """Récupère l'historique des tâches terminées avec temps réel"""
     print("\n📚 Chargement de l'historique...")
     
-    taches = notion.query_database(DB_TACHES)
+    taches = load_tasks(lambda t: (t.temps_reel or 0) > 0, incremental)
     
     history = []
     for tache in taches:
-        temps_reel = notion.get_property_value(tache, "⏱️ Temps réel agrégé (min)")
-        statut = notion.get_property_value(tache, "Statut")
+        temps_reel = tache.temps_reel
         
         if temps_reel and temps_reel > 0:
             history.append({
-                "id": tache["id"],
-                "nom": notion.get_property_value(tache, "Nom"),
-                "description": notion.get_property_value(tache, "Description") or "",
+                "id": tache.id,
+                "nom": tache.nom,
+                "description": tache.description,
                 "temps_reel": temps_reel,
-                "projet": notion.get_property_value(tache, "Projet/Tlt") or [],
-                "statut": statut
+                "projet": tache.projet,
+                "statut": tache.statut
             })
     
     print(f"📊 {len(history)} tâches historiques chargées")
     return history
 
-def run_estimations():
-    """Lance les estimations IA"""
-    print("\n🤖 Lancement des estimations GPT...")
+def new_writer():
+    """File d'écriture groupée vers DB_TACHES (valeurs inchangées ignorées, PATCH fusionnés par page)"""
+    return BulkWriter(
+        get_snapshot().update_page,
+        get_schema(DB_TACHES),
+        max_workers=WRITE_WORKERS,
+        queue_size=PIPELINE_QUEUE_SIZE
+    )
+
+def print_write_stats(stats, label):
+    """Résumé d'une phase d'écriture"""
+    print(f"✅ {stats['written']} {label}, {stats['skipped']} déjà à jour"
+          + (f", {stats['failed']} échecs" if stats["failed"] else ""))
+
+def new_budget():
+    """Budgets du run (temps, tokens GPT, requêtes Notion), mesurés à partir de maintenant"""
+    return RunBudget(
+        metrics,
+        max_seconds=BUDGET_MINUTES * 60,
+        max_tokens=BUDGET_TOKENS,
+        max_notion_requests=BUDGET_NOTION_REQUESTS
+    )
+
+def write_estimate(writer, task_id, estimated_minutes, content_hash, incremental=False,
+                   current=None, on_done=None):
+    """Programme l'écriture d'une estimation (et du hash du contenu estimé) dans Notion"""
+    values = {"⏱️ Temps estimé IA (min)": estimated_minutes}
+    
+    # Ajouter le hash si disponible
+    if content_hash:
+        values["🔄 Hash contenu"] = content_hash
+    
+    def done(page_id, success):
+        if success and incremental:
+            get_mirror().update_task(page_id, temps_estime=estimated_minutes, hash_stocke=content_hash or "")
+        if on_done:
+            on_done(page_id, success)
     
-    tasks_to_estimate = get_tasks_to_estimate()
-    if not tasks_to_estimate:
-        print("✅ Toutes les tâches sont déjà estimées")
-        return
+    writer.put(task_id, values, current, done)
+
+def print_tier_accuracy(ledger, historical_tasks):
+    """Précision de chaque niveau d'estimation par rapport aux temps réels connus"""
+    def fmt(stats):
+        return f"écart médian {stats['median_error']:.0%}" if stats["median_error"] is not None else "pas de mesure"
+    
+    backtest = get_local_estimator().backtest()
+    print(f"📏 Modèle local : confiant sur {backtest['covered']}/{backtest['tasks']} tâches historiques testées, "
+          f"{fmt(backtest)}")
+    if backtest["median_error"] is not None:
+        metrics.set_gauge("estimator", "local_backtest_median_error", backtest["median_error"])
+    if backtest["tasks"]:
+        metrics.set_gauge("estimator", "local_backtest_coverage", backtest["covered"] / backtest["tasks"])
     
-    historical_tasks = get_historical_tasks()
+    for tier, stats in sorted(ledger.accuracy_by_tier(historical_tasks).items()):
+        print(f"📏 Estimations {tier} terminées depuis : {stats['tasks']} tâches, {fmt(stats)}")
+        if stats["median_error"] is not None:
+            metrics.set_gauge("estimator", f"{tier}_median_error", stats["median_error"])
+
+def run_estimations(incremental=False, batch=False, budget=None):
+    """
+    Lance les estimations IA en pipeline :
+    lecture du contenu + hash -> estimation locale si confiante, sinon GPT -> écriture Notion,
+    chaque étape au fil de l'eau.
+    Un point de reprise permet de relancer un run interrompu sans rien perdre.
+    batch: les tâches à envoyer à GPT sont soumises en un job batch OpenAI (gros imports) ;
+    les résultats des jobs terminés sont appliqués à chaque run, batch ou non
+    budget: RunBudget du run (défaut : budgets configurés, mesurés à partir de maintenant) ; les tâches
+    sont traitées par priorité et celles restant quand un budget est épuisé passent au run suivant
+    Returns: nombre d'estimations obtenues
+    """
+    print("\n🤖 Lancement des estimations GPT...")
     
-    # Batch estimation
-    estimates = gpt.batch_estimate(
-        tasks_to_estimate=tasks_to_estimate,
-        all_tasks_history=historical_tasks,
-        project_name="EISF Alternance"
+    checkpoint = RunCheckpoint(os.path.join(CACHE_DIR, "checkpoint.jsonl"))
+    scheduler = EstimationScheduler(
+        os.path.join(CACHE_DIR, "estimation_queue.json"),
+        order=PRIORITY_ORDER,
+        status_priority=PRIORITY_STATUSES,
+        budget=budget or new_budget()
     )
+    ledger = None
+    estimates = {}
+    # task_id -> hash du contenu estimé pendant ce run
+    recorded = {}
+    tiers = {"local": 0, "gpt": 0, "batch": 0}
+    tiers_lock = threading.Lock()
+    submitted = 0
     
-    # Mettre à jour Notion avec estimations ET hash
-    print("\n💾 Mise à jour Notion...")
-    updated = 0
+    def mark_written(task_id, success):
+        if success:
+            checkpoint.mark_done(task_id)
+    
+    def get_ledger():
+        nonlocal ledger
+        if ledger is None:
+            from local_estimator import TierLedger
+            ledger = TierLedger(os.path.join(CACHE_DIR, "estimate_tiers.json"))
+        return ledger
     
-    # Créer un mapping task_id -> hash
-    task_hashes = {task["id"]: task["hash"] for task in tasks_to_estimate}
+    def record(task, estimated_minutes, tier):
+        with tiers_lock:
+            estimates[task["id"]] = estimated_minutes
+            recorded[task["id"]] = task["hash"]
+            tiers[tier] += 1
+        metrics.increment("estimator", tier)
+        get_ledger().record(task["id"], tier, estimated_minutes)
+        checkpoint.add_pending(task["id"], estimated_minutes, task["hash"])
+        write_estimate(writer, task["id"], estimated_minutes, task["hash"], incremental,
+                       current=task["current"], on_done=mark_written)
     
-    for task_id, estimated_minutes in estimates.items():
-        # Préparer les propriétés à mettre à jour
-        properties = {
-            "⏱️ Temps estimé IA (min)": {"number": estimated_minutes}
-        }
+    # Étape écriture : les estimations partent vers Notion au fur et à mesure
+    writer = new_writer()
+    try:
+        # Reprise : écrire d'abord les estimations obtenues mais jamais enregistrées
+        if checkpoint.pending:
+            print(f"♻️ Reprise du run interrompu : {len(checkpoint.pending)} estimations à enregistrer")
+            for task_id, entry in list(checkpoint.pending.items()):
+                estimates[task_id] = entry["minutes"]
+                write_estimate(writer, task_id, entry["minutes"], entry["hash"], incremental,
+                               on_done=mark_written)
         
-        # Ajouter le hash si disponible
-        if task_id in task_hashes:
-            properties["🔄 Hash contenu"] = {
-                "rich_text": [{"text": {"content": task_hashes[task_id]}}]
-            }
+        # Jobs batch soumis lors d'un run précédent : résultats terminés écrits en bloc
+        pending_batches = None
+        if batch_jobs_pending():
+            known = None
+            
+            def is_current(task_id, content_hash, stored_hash):
+                """
+                Résultat batch toujours valable : contenu inchangé depuis la soumission (hash du miroir)
+                et aucune autre estimation écrite entre-temps (hash enregistré dans Notion)
+                """
+                nonlocal known
+                if known is None:
+                    tasks = get_mirror().load_tasks(DB_TACHES) if incremental else iter_run_tasks()
+                    known = {t.id: t for t in tasks}
+                task = known.get(task_id)
+                if task is None:
+                    return True
+                if task.content_hash is not None and task.content_hash != content_hash:
+                    return False
+                return (task.hash_stocke or "") in (stored_hash or "", content_hash or "")
+            
+            for task_id, content_hash, minutes in get_batch_estimator().poll(is_current=is_current):
+                record({"id": task_id, "hash": content_hash, "current": None}, minutes, "batch")
+            if tiers["batch"]:
+                print(f"📦 {tiers['batch']} estimations batch à enregistrer")
+            pending_batches = get_batch_estimator().store
         
-        success = notion.update_page(task_id, properties)
-        if success:
-            updated += 1
+        def skip(task_id, content_hash):
+            """
+            Déjà obtenue pour le même contenu : pendant ce run (résultats batch relevés, pas encore visibles
+            dans Notion), écrite lors du run interrompu, en cours d'écriture ou en attente dans un job batch
+            """
+            with tiers_lock:
+                if task_id in recorded and recorded[task_id] == content_hash:
+                    return True
+            return checkpoint.is_recorded(task_id, content_hash) or (
+                pending_batches is not None and pending_batches.is_pending(task_id, content_hash)
+            )
+        
+        def needs_estimate(task):
+            """
+            Reportée si un budget s'épuise avant sa distribution : sans estimation, ou au contenu modifié
+            (hash déjà connu du miroir), et pas déjà obtenue pendant ce run ni en attente d'un job batch
+            """
+            if task.id in estimates or (pending_batches is not None and task.id in pending_batches.latest):
+                return False
+            return not task.temps_estime or (task.content_hash is not None and task.content_hash != task.hash_stocke)
+        
+        # Ordre de priorité, distribution arrêtée quand un budget du run est épuisé
+        candidates = scheduler.schedule(select_candidates(incremental), deferrable=needs_estimate)
+        counts = {"estimate": 0, "re_estimate": 0}
+        
+        # Aucune candidate (mode incrémental sans modification) : inutile de charger l'historique
+        first = next(candidates, None)
+        if first is not None:
+            with metrics.phase("load_history"):
+                historical_tasks = get_historical_tasks(incremental)
+                get_similarity().update(historical_tasks)
+                print_tier_accuracy(get_ledger(), historical_tasks)
+            
+            print("\n💾 Mise à jour Notion au fil des estimations...")
+            
+            def local_tier(tasks):
+                """Répond tout de suite aux tâches proches d'un historique cohérent, transmet les autres à GPT"""
+                for task in tasks:
+                    (minutes, confidence), = get_local_estimator().predict([task])
+                    if minutes and get_local_estimator().is_confident(confidence):
+                        print(f"  ⚡ {task['nom'][:50]}: {minutes:.0f} min (local, confiance {confidence:.2f})")
+                        record(task, minutes, "local")
+                    else:
+                        yield task
+            
+            # Étapes lecture/hash et estimation : un générateur consommé par l'estimateur
+            discovered = iter_tasks_to_estimate(
+                chain([first], candidates), incremental, counts, skip=skip
+            )
+            if batch:
+                # Prompts rendus dans un fichier JSONL soumis en un job : rien n'attend la réponse
+                batch_id, cached = get_batch_estimator().submit(
+                    local_tier(discovered), PROJECT_NAME, get_similarity()
+                )
+                for task, estimated_minutes in cached:
+                    record(task, estimated_minutes, "gpt")
+                if batch_id:
+                    submitted = len(get_batch_estimator().store.jobs[batch_id]["requests"])
+                    print(f"📦 {submitted} tâches soumises en batch ({batch_id}) : "
+                          f"résultats appliqués aux prochains runs")
+            else:
+                for task, estimated_minutes in get_gpt().iter_estimates(
+                    local_tier(discovered),
+                    historical_tasks,
+                    project_name=PROJECT_NAME,
+                    similarity_index=get_similarity()
+                ):
+                    if estimated_minutes:
+                        record(task, estimated_minutes, "gpt")
+    finally:
+        write_stats = writer.close()
+        if ledger:
+            ledger.save()
+    
+    metrics.set_gauge("scheduler", "deferred_tasks", len(scheduler.leftover))
+    if scheduler.stopped:
+        print(f"⏸️ Budget {scheduler.stopped} épuisé : {len(scheduler.leftover)} tâches reportées au prochain run")
+    
+    if counts["estimate"] == 0 and not estimates:
+        waiting = len(pending_batches.latest) if pending_batches is not None else 0
+        if not scheduler.stopped:
+            print("✅ Toutes les tâches sont déjà estimées"
+                  + (f" ({waiting} en attente d'un job batch)" if waiting else ""))
+        checkpoint.clear()
+        return 0
+    
+    print(f"📝 {counts['estimate']} tâches à estimer ({counts['re_estimate']} ré-estimations)")
+    print(f"🎯 {tiers['local']} estimations locales, {tiers['gpt']} via GPT"
+          + (f", {tiers['batch']} via batch" if tiers["batch"] else "")
+          + (f", {submitted} en attente de batch" if submitted else ""))
+    print_write_stats(write_stats, "estimations enregistrées")
     
-    print(f"✅ {updated}/{len(estimates)} estimations enregistrées")
+    # Tout est écrit : plus rien à reprendre (les échecs d'écriture restent dans le point de reprise)
+    if not checkpoint.pending:
+        checkpoint.clear()
     
     # Sauvegarder log
-    log_path = f"logs/estimations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    os.makedirs("logs", exist_ok=True)
+    log_path = os.path.join(LOGS_DIR, f"estimations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(LOGS_DIR, exist_ok=True)
     with open(log_path, "w", encoding="utf-8") as f:
         json.dump(estimates, f, indent=2, ensure_ascii=False)
     print(f"📝 Log sauvegardé: {log_path}")
+    return len(estimates)
 
-def calculate_deviations():
-    """Calcule les écarts estimé vs réel"""
+def calculate_deviations(incremental=False):
+    """Calcule les écarts estimé vs réel (seuls les écarts modifiés sont réécrits)"""
     print("\n📊 Calcul des écarts...")
     
-    taches = notion.query_database(DB_TACHES)
+    taches = load_tasks(lambda t: (t.temps_estime or 0) > 0 and t.temps_reel is not None, incremental)
     
-    updated = 0
-    for tache in taches:
-        estime = notion.get_property_value(tache, "⏱️ Temps estimé IA (min)")
-        reel = notion.get_property_value(tache, "⏱️ Temps réel agrégé (min)")
-        
-        if estime and reel and estime > 0:
-            ecart_pourcent = ((reel - estime) / estime)
+    def update_mirror(page_id, ecart_pourcent):
+        def done(_, success):
+            if success and incremental:
+                get_mirror().update_task(page_id, ecart=ecart_pourcent)
+        return done
+    
+    with new_writer() as writer:
+        for tache in taches:
+            estime = tache.temps_estime
+            reel = tache.temps_reel
             
-            success = notion.update_page(tache["id"], {
-                "📊 Écart (%)": {"number": ecart_pourcent}
-            })
-            if success:
-                updated += 1
+            if estime and reel and estime > 0:
+                ecart_pourcent = ((reel - estime) / estime)
+                
+                writer.put(
+                    tache.id,
+                    {"📊 Écart (%)": ecart_pourcent},
+                    current={"📊 Écart (%)": tache.ecart},
+                    on_done=update_mirror(tache.id, ecart_pourcent)
+                )
     
-    print(f"✅ {updated} écarts calculés")
+    print_write_stats(writer.stats, "écarts enregistrés")
 
-def main():
-    """Fonction principale"""
+def print_api_stats():
+    """Affiche les compteurs d'appels Notion (proximité du rate limit) et du cache GPT"""
+    stats = get_notion().stats
+    print(f"\n📡 API Notion : {stats['requests']} requêtes, {stats['retries']} retries, "
+          f"{stats['throttle_waits']} attentes rate limit ({stats['throttle_seconds']:.1f}s)")
+    cache = get_notion().block_cache
+    if cache and cache.hits + cache.misses:
+        print(f"🧱 Cache de blocs : {cache.hits} listes de blocs réutilisées, {cache.misses} relues")
+    if gpt is not None and gpt.cache:
+        print(f"💾 Cache GPT : {gpt.cache.hits} réponses réutilisées, {gpt.cache.misses} appels nécessaires")
+    for model, usage in metrics.tokens.items():
+        print(f"🔢 Tokens {model} : {usage['prompt_tokens']} prompt + {usage['completion_tokens']} réponse "
+              f"({usage['calls']} appels)")
+
+def write_metrics(report=True):
+    """Exporte les métriques : fichier Prometheus (toujours) et rapport JSON daté dans LOGS_DIR"""
+    metrics.write_prometheus(METRICS_PROM_PATH)
+    if report:
+        report_path = os.path.join(LOGS_DIR, f"metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        metrics.write_json(report_path)
+        print(f"📈 Métriques sauvegardées: {report_path}")
+
+def main(incremental=False, batch=False):
+    """
+    Fonction principale
+    batch: estimations GPT soumises en job batch OpenAI (voir run_estimations)
+    Returns: résumé du run {"ok", "error", "real_times", "estimated"} (fusionné par multi_run.py)
+    """
     print("=" * 60)
     print("🧠 MARTINE IA - Estimation automatique des temps")
     print("=" * 60)
     
+    result = {"ok": True, "error": None, "real_times": 0, "estimated": 0}
+    # Budgets mesurés depuis le début du run (synchro et agrégation comprises)
+    budget = new_budget()
     try:
+        get_snapshot().clear()
+        
         # 1. Setup colonnes
-        setup_columns() 
+        with metrics.phase("setup_columns"):
+            setup_columns() 
         
-        # 2. Agréger temps réels
-        # aggregate_real_times() # Desactivé car bases différentes
+        # 2. Agréger temps réels (saisies modifiées depuis le dernier passage)
+        with metrics.phase("aggregate_real_times"):
+            result["real_times"] = len(aggregate_real_times())
         
         # 3. Estimer via IA
-        run_estimations()
+        with metrics.phase("run_estimations"):
+            result["estimated"] = run_estimations(incremental, batch, budget) or 0
         
         # 4. Calculer écarts
-        # calculate_deviations() # Desactivé
+        # calculate_deviations(incremental) # Desactivé
+        
+        print_api_stats()
         
         print("\n" + "=" * 60)
         print("✅ TRAITEMENT TERMINÉ")
@@ -266,6 +951,91 @@ def main():
         print(f"\n❌ ERREUR CRITIQUE: {e}")
         import traceback
         traceback.print_exc()
+        result.update(ok=False, error=str(e))
+    finally:
+        # Requête refusée (propriété renommée ou supprimée ?) : schémas relus au prochain run
+        if notion is not None and notion.stats["query_errors"]:
+            get_schema_cache().invalidate()
+        write_metrics()
+    return result
+
+def reconcile():
+    """Réconciliation complète : schéma revérifié, miroir comparé à toute la base (pages supprimées, modifications manquées)"""
+    forget_schema(DB_TACHES)
+    setup_columns()
+    get_mirror().reset_watermark(DB_TACHES)
+    if DB_SAISIES:
+        forget_schema(DB_SAISIES)
+        get_mirror().reset_watermark(DB_SAISIES)
+
+def watch():
+    """
+    Mode surveillance : un seul processus garde clients, caches, miroir et index de similarité
+    en mémoire et estime les tâches nouvelles ou modifiées quelques secondes après leur édition
+    """
+    print("=" * 60)
+    print("🧠 MARTINE IA - Surveillance continue")
+    print("=" * 60)
+    
+    stop = threading.Event()
+    
+    def request_stop(signum, frame):
+        print("\n🛑 Arrêt demandé : fin du cycle en cours...")
+        stop.set()
+    
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    
+    with metrics.phase("setup_columns"):
+        setup_columns()
+    next_reconcile = time.monotonic() + WATCH_RECONCILE_HOURS * 3600
+    delay = WATCH_INTERVAL
+    
+    while not stop.is_set():
+        try:
+            if time.monotonic() >= next_reconcile:
+                print("\n🔄 Réconciliation complète avec Notion...")
+                next_reconcile = time.monotonic() + WATCH_RECONCILE_HOURS * 3600
+                with metrics.phase("reconcile"):
+                    reconcile()
+            # Seul le snapshot est vidé : schéma, miroir, cache GPT et similarité restent chauds
+            get_snapshot().clear()
+            with metrics.phase("watch_cycle"):
+                budget = new_budget()
+                aggregated = aggregate_real_times() if DB_SAISIES else {}
+                estimated = run_estimations(incremental=True, budget=budget)
+        except Exception as e:
+            print(f"\n❌ Erreur pendant le cycle: {e}")
+            aggregated, estimated = {}, 0
+        write_metrics(report=False)
+        
+        # Backoff adaptatif : on revient à l'intervalle court dès qu'il y a de l'activité
+        delay = WATCH_INTERVAL if estimated or aggregated else min(delay * 2, WATCH_MAX_INTERVAL)
+        print(f"\n⏳ [{datetime.now().strftime('%H:%M:%S')}] prochaine vérification dans {delay:.0f}s")
+        stop.wait(delay)
+    
+    print_api_stats()
+    write_metrics()
+    print("\n👋 Surveillance arrêtée")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Martine IA - Estimation automatique des temps")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Ne relit que les pages modifiées depuis le dernier passage (miroir SQLite local)"
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="Reste actif et estime les tâches modifiées au fil de l'eau (Ctrl+C pour arrêter)"
+    )
+    parser.add_argument(
+        "--batch", action="store_true",
+        help="Soumet les estimations GPT en job batch OpenAI (gros imports, résultats appliqués aux runs suivants)"
+    )
+    args = parser.parse_args()
+    if args.watch:
+        watch()
+    else:
+        main(incremental=args.incremental, batch=args.batch)
\ No newline at end of file
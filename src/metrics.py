@@ -0,0 +1,253 @@
+"""
+Instrumentation d'un run Martine
+Durée des phases, latence et codes HTTP par endpoint, retries/attentes, tokens consommés par modèle
+Export en rapport JSON et en fichier texte Prometheus (collecteur textfile de node_exporter)
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+from atomic_file import write_atomic
+
+# Bornes (s) des histogrammes de latence
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Identifiants Notion (avec ou sans tirets) remplacés dans les noms d'endpoint
+_ID_PATTERN = re.compile(r"[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}")
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """'PATCH https://api.notion.com/v1/pages/<id>?x=1' -> 'PATCH /v1/pages/{id}'"""
+    return f"{method.upper()} {_ID_PATTERN.sub('{id}', urlsplit(url).path)}"
+
+
+class Histogram:
+    """Histogramme à bornes fixes (compteurs non cumulés, le dernier compte les dépassements)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Borne supérieure du bucket contenant le quantile q (None si vide ou au-delà de la dernière borne)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.sum, 4),
+            "avg_seconds": round(self.sum / self.count, 4) if self.count else None,
+            "p50_seconds": self.quantile(0.5),
+            "p95_seconds": self.quantile(0.95),
+            "buckets": {
+                **{str(bound): n for bound, n in zip(self.buckets, self.counts)},
+                "+Inf": self.counts[-1]
+            }
+        }
+
+
+class RunMetrics:
+    """Registre thread-safe partagé par NotionClient, GPTEstimator et les phases de main()"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        # phase -> [secondes cumulées, nombre d'exécutions]
+        self.phases: Dict[str, list] = {}
+        # (service, endpoint) -> {"latency": Histogram, "status": {code: n}}
+        self.endpoints: Dict[Tuple[str, str], Dict] = {}
+        # (service, événement) -> valeur (retries, attentes rate limit, cache...)
+        self.counters: Dict[Tuple[str, str], float] = {}
+        # (service, nom) -> dernière valeur mesurée (précision, couverture...)
+        self.gauges: Dict[Tuple[str, str], float] = {}
+        # modèle -> {"calls", "prompt_tokens", "completion_tokens"}
+        self.tokens: Dict[str, Dict[str, int]] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Mesure la durée (murale) d'une phase ; les exécutions répétées s'additionnent"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                entry = self.phases.setdefault(name, [0.0, 0])
+                entry[0] += elapsed
+                entry[1] += 1
+
+    def observe_request(self, service: str, method: str, url: str, status: Optional[int], seconds: float):
+        """Enregistre une requête HTTP (status None = erreur réseau)"""
+        key = (service, endpoint_name(method, url))
+        code = str(status) if status is not None else "error"
+        with self._lock:
+            entry = self.endpoints.get(key)
+            if entry is None:
+                entry = self.endpoints[key] = {"latency": Histogram(), "status": {}}
+            entry["latency"].observe(seconds)
+            entry["status"][code] = entry["status"].get(code, 0) + 1
+
+    def increment(self, service: str, event: str, value: float = 1):
+        with self._lock:
+            self.counters[(service, event)] = self.counters.get((service, event), 0) + value
+
+    def counter(self, service: str, event: str) -> float:
+        with self._lock:
+            return self.counters.get((service, event), 0)
+
+    def total_tokens(self) -> int:
+        """Tokens consommés depuis le début du run, tous modèles confondus"""
+        with self._lock:
+            return sum(entry["prompt_tokens"] + entry["completion_tokens"] for entry in self.tokens.values())
+
+    def set_gauge(self, service: str, name: str, value: float):
+        with self._lock:
+            self.gauges[(service, name)] = value
+
+    def add_tokens(self, model: str, usage: Optional[Dict]):
+        """Ajoute le champ `usage` d'une réponse chat completions"""
+        usage = usage or {}
+        with self._lock:
+            entry = self.tokens.setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            entry["calls"] += 1
+            entry["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            entry["completion_tokens"] += usage.get("completion_tokens", 0)
+
+    def to_dict(self) -> Dict:
+        """Rapport complet (sérialisable en JSON)"""
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "duration_seconds": round(time.time() - self.started_at, 3),
+                "phases": {
+                    name: {"seconds": round(seconds, 3), "runs": runs}
+                    for name, (seconds, runs) in self.phases.items()
+                },
+                "endpoints": {
+                    service: {
+                        endpoint: {"latency": entry["latency"].to_dict(), "status": dict(entry["status"])}
+                        for (s, endpoint), entry in sorted(self.endpoints.items()) if s == service
+                    }
+                    for service in sorted({s for s, _ in self.endpoints})
+                },
+                "counters": {
+                    service: {
+                        event: value for (s, event), value in sorted(self.counters.items()) if s == service
+                    }
+                    for service in sorted({s for s, _ in self.counters})
+                },
+                "gauges": {
+                    service: {
+                        name: value for (s, name), value in sorted(self.gauges.items()) if s == service
+                    }
+                    for service in sorted({s for s, _ in self.gauges})
+                },
+                "tokens": {model: dict(entry) for model, entry in self.tokens.items()}
+            }
+
+    def to_prometheus(self) -> str:
+        """Exposition au format texte Prometheus"""
+        def labels(**values) -> str:
+            escaped = (
+                key + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+                for key, value in values.items()
+            )
+            return "{" + ",".join(escaped) + "}"
+
+        lines = [
+            "# HELP martine_phase_duration_seconds Durée cumulée de chaque phase du run",
+            "# TYPE martine_phase_duration_seconds gauge"
+        ]
+        with self._lock:
+            for name, (seconds, _) in self.phases.items():
+                lines.append(f"martine_phase_duration_seconds{labels(phase=name)} {seconds:.6f}")
+
+            lines += [
+                "# HELP martine_http_request_duration_seconds Latence des requêtes HTTP par endpoint",
+                "# TYPE martine_http_request_duration_seconds histogram"
+            ]
+            for (service, endpoint), entry in sorted(self.endpoints.items()):
+                hist = entry["latency"]
+                cumulative = 0
+                for bound, n in zip(hist.buckets, hist.counts):
+                    cumulative += n
+                    lines.append(
+                        "martine_http_request_duration_seconds_bucket"
+                        f"{labels(service=service, endpoint=endpoint, le=bound)} {cumulative}"
+                    )
+                lines.append(
+                    "martine_http_request_duration_seconds_bucket"
+                    f"{labels(service=service, endpoint=endpoint, le='+Inf')} {hist.count}"
+                )
+                lines.append(
+                    f"martine_http_request_duration_seconds_sum{labels(service=service, endpoint=endpoint)} {hist.sum:.6f}"
+                )
+                lines.append(
+                    f"martine_http_request_duration_seconds_count{labels(service=service, endpoint=endpoint)} {hist.count}"
+                )
+
+            lines += [
+                "# HELP martine_http_responses_total Réponses HTTP par endpoint et code",
+                "# TYPE martine_http_responses_total counter"
+            ]
+            for (service, endpoint), entry in sorted(self.endpoints.items()):
+                for code, n in sorted(entry["status"].items()):
+                    lines.append(
+                        f"martine_http_responses_total{labels(service=service, endpoint=endpoint, status=code)} {n}"
+                    )
+
+            lines += [
+                "# HELP martine_events_total Retries, attentes rate limit, accès cache...",
+                "# TYPE martine_events_total counter"
+            ]
+            for (service, event), value in sorted(self.counters.items()):
+                lines.append(f"martine_events_total{labels(service=service, event=event)} {value:g}")
+
+            lines += [
+                "# HELP martine_value Dernière valeur mesurée (précision des estimations, couverture...)",
+                "# TYPE martine_value gauge"
+            ]
+            for (service, name), value in sorted(self.gauges.items()):
+                lines.append(f"martine_value{labels(service=service, name=name)} {value:g}")
+
+            lines += [
+                "# HELP martine_llm_tokens_total Tokens consommés par modèle",
+                "# TYPE martine_llm_tokens_total counter"
+            ]
+            for model, entry in sorted(self.tokens.items()):
+                lines.append(f"martine_llm_tokens_total{labels(model=model, kind='prompt')} {entry['prompt_tokens']}")
+                lines.append(
+                    f"martine_llm_tokens_total{labels(model=model, kind='completion')} {entry['completion_tokens']}"
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+    def write_prometheus(self, path: str):
+        """Écriture atomique : le collecteur ne lit jamais un fichier à moitié écrit"""
+        write_atomic(path, self.to_prometheus())
@@ -0,0 +1,202 @@
+"""
+MARTINE IA - Plusieurs bases Tâches (équipes, espaces de travail) traitées en parallèle
+
+    python src/multi_run.py databases.json
+    python src/multi_run.py databases.json --processes 4 --incremental
+
+Le manifeste est une liste JSON d'entrées :
+    {
+        "name": "eisf",
+        "notion_token": "$NOTION_TOKEN_EISF",
+        "database_taches": "...",
+        "database_saisies_temps": "...",
+        "project_name": "EISF Alternance"
+    }
+Les valeurs "$VARIABLE" sont lues dans l'environnement (ou le .env) : pas de secret dans le manifeste.
+
+Chaque entrée tourne dans un processus neuf (clients, caches, miroir et limiteur de débit propres),
+avec son cache dans cache/<name> et ses logs dans logs/<name>. Le débit Notion est partagé entre
+les entrées d'un même token, les budgets OpenAI entre les processus. Les résultats sont fusionnés
+en un résumé (console + logs/multi_run_YYYYMMDD_HHMMSS.json).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime
+from functools import partial
+from typing import Dict, List
+
+# Forcer l'encodage UTF-8 pour Windows (pour les émojis)
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+from dotenv import load_dotenv
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(os.path.dirname(SRC_DIR), '.env'))
+
+# Champ du manifeste -> variable d'environnement lue par main.py
+ENTRY_ENV = {
+    "notion_token": "NOTION_TOKEN",
+    "database_taches": "DATABASE_TACHES",
+    "database_saisies_temps": "DATABASE_SAISIES_TEMPS",
+    "database_projets": "DATABASE_PROJETS",
+    "project_name": "PROJECT_NAME"
+}
+
+
+def load_manifest(path: str) -> List[Dict]:
+    """Lit et valide le manifeste ($VARIABLE remplacées par leur valeur)"""
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"❌ {path} : une liste d'entrées est attendue")
+
+    names = set()
+    for entry in entries:
+        for key, value in entry.items():
+            if isinstance(value, str) and value.startswith("$"):
+                entry[key] = os.getenv(value[1:], "")
+        name = entry.get("name")
+        if not name or name in names:
+            raise ValueError(f"❌ {path} : chaque entrée doit avoir un 'name' unique ({name!r})")
+        names.add(name)
+        for key in ("notion_token", "database_taches"):
+            if not entry.get(key):
+                raise ValueError(f"❌ {path} : '{key}' manquant pour l'entrée {name}")
+    return entries
+
+
+def entry_environment(entry: Dict, settings: Dict) -> Dict[str, str]:
+    """Variables d'environnement du processus d'une entrée"""
+    logs_dir = os.path.join(settings["logs_dir"], entry["name"])
+    env = {variable: str(entry.get(key) or "") for key, variable in ENTRY_ENV.items()}
+    if not env["PROJECT_NAME"]:
+        del env["PROJECT_NAME"]
+    env.update(
+        MARTINE_MANIFEST_ENTRY=entry["name"],
+        MARTINE_CACHE_DIR=os.path.join(settings["cache_dir"], entry["name"]),
+        MARTINE_LOGS_DIR=logs_dir,
+        METRICS_PROM_PATH=os.path.join(logs_dir, "martine.prom"),
+        NOTION_RPS=str(entry.get("notion_rps") or settings["notion_rps"][entry["notion_token"]]),
+        GPT_RPM=str(settings["gpt_rpm"]),
+        GPT_TPM=str(settings["gpt_tpm"])
+    )
+    return env
+
+
+def run_entry(entry: Dict, settings: Dict) -> Dict:
+    """Processus d'une entrée : main.py configuré par l'environnement, sortie console dans son log"""
+    env = entry_environment(entry, settings)
+    os.environ.update(env)
+    os.makedirs(env["MARTINE_LOGS_DIR"], exist_ok=True)
+    log_path = os.path.join(env["MARTINE_LOGS_DIR"], f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+
+    start = time.perf_counter()
+    report = None
+    with open(log_path, "w", encoding="utf-8") as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            sys.path.insert(0, SRC_DIR)
+            import main
+            result = main.main(incremental=settings["incremental"], batch=settings["batch"])
+            report = main.metrics.to_dict()
+        except Exception as e:
+            # Erreur hors de main() (import du module, dépendance manquante) : les erreurs de run
+            # et de configuration sont déjà rapportées par main() dans son résultat
+            print(f"❌ {e}")
+            result = {"ok": False, "error": str(e), "real_times": 0, "estimated": 0}
+
+    counters = report["counters"] if report else {}
+    return {
+        "name": entry["name"],
+        **result,
+        "wall_seconds": round(time.perf_counter() - start, 2),
+        "notion_requests": counters.get("notion", {}).get("requests", 0),
+        "notion_retries": counters.get("notion", {}).get("retries", 0),
+        "gpt_requests": counters.get("openai", {}).get("requests", 0),
+        "tokens": report["tokens"] if report else {},
+        "log": log_path
+    }
+
+
+def print_summary(results: List[Dict], wall_seconds: float):
+    header = f"{'base':<20} {'statut':>6} {'temps (s)':>10} {'réels':>6} {'estimées':>9} " \
+             f"{'req Notion':>11} {'retries':>8} {'req GPT':>8}"
+    print("\n" + header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['name'][:20]:<20} {'ok' if r['ok'] else 'ÉCHEC':>6} {r['wall_seconds']:>10.1f} "
+              f"{r['real_times']:>6} {r['estimated']:>9} {r['notion_requests']:>11.0f} "
+              f"{r['notion_retries']:>8.0f} {r['gpt_requests']:>8.0f}")
+    print("-" * len(header))
+
+    sequential = sum(r["wall_seconds"] for r in results)
+    print(f"⏱️ {wall_seconds:.1f}s au total (bases une par une : {sequential:.1f}s)")
+    print(f"📝 {sum(r['estimated'] for r in results)} estimations, "
+          f"{sum(r['real_times'] for r in results)} temps réels mis à jour")
+    for r in results:
+        if not r["ok"]:
+            print(f"❌ {r['name']} : {r['error']} (voir {r['log']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Martine IA - Plusieurs bases Tâches en parallèle")
+    parser.add_argument("manifest", help="Manifeste JSON des bases à traiter")
+    parser.add_argument("--processes", type=int, default=None, help="Bases traitées en même temps (défaut : toutes, max CPU x 2)")
+    parser.add_argument("--incremental", action="store_true", help="Synchronisation incrémentale pour chaque base")
+    parser.add_argument("--batch", action="store_true", help="Estimations GPT soumises en job batch OpenAI")
+    args = parser.parse_args()
+
+    entries = load_manifest(args.manifest)
+    processes = max(1, min(len(entries), args.processes or (os.cpu_count() or 1) * 2))
+
+    # Budgets : Notion limite par intégration (token), OpenAI par clé (partagée par tous les processus)
+    notion_rps = float(os.getenv("NOTION_RPS", "3"))
+    per_token: Dict[str, int] = {}
+    for entry in entries:
+        per_token[entry["notion_token"]] = per_token.get(entry["notion_token"], 0) + 1
+    settings = {
+        "incremental": args.incremental,
+        "batch": args.batch,
+        "cache_dir": os.getenv("MARTINE_CACHE_DIR", "cache"),
+        "logs_dir": os.getenv("MARTINE_LOGS_DIR", "logs"),
+        "notion_rps": {token: notion_rps / min(count, processes) for token, count in per_token.items()},
+        "gpt_rpm": max(1, int(os.getenv("GPT_RPM", "500")) // processes),
+        "gpt_tpm": max(1, int(os.getenv("GPT_TPM", "30000")) // processes)
+    }
+
+    print("=" * 60)
+    print(f"🧠 MARTINE IA - {len(entries)} bases, {processes} processus")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    results = []
+    # "spawn" : chaque entrée démarre dans un interpréteur neuf, y compris sous Linux
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes, maxtasksperchild=1) as pool:
+        for result in pool.imap_unordered(partial(run_entry, settings=settings), entries):
+            icon = "✅" if result["ok"] else "❌"
+            print(f"{icon} {result['name']} : {result['real_times']} temps réels, "
+                  f"{result['estimated']} estimations ({result['wall_seconds']:.1f}s)")
+            results.append(result)
+    wall_seconds = time.perf_counter() - start
+
+    results.sort(key=lambda r: r["name"])
+    print_summary(results, wall_seconds)
+
+    os.makedirs(settings["logs_dir"], exist_ok=True)
+    summary_path = os.path.join(settings["logs_dir"], f"multi_run_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump({"wall_seconds": round(wall_seconds, 2), "processes": processes, "runs": results},
+                  f, indent=2, ensure_ascii=False)
+    print(f"📝 Résumé sauvegardé: {summary_path}")
+
+    sys.exit(0 if all(r["ok"] for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
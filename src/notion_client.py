@@ -4,110 +4,440 @@ Gère toutes les interactions avec l'API Notion
 """
 import requests
 import os
-from typing import Dict, List, Optional
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from datetime import datetime
+from urllib.parse import quote, unquote
+from requests.adapters import HTTPAdapter
+
+from rate_limiter import TokenBucket, backoff_delay
+from metrics import RunMetrics
+from block_cache import BlockCache
+
+# Codes HTTP pour lesquels un nouvel essai a du sens
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Blocs texte et préfixe ajouté pour garder la structure
+TEXT_BLOCK_PREFIXES = {
+    "paragraph": "",
+    "heading_1": "# ",
+    "heading_2": "## ",
+    "heading_3": "### ",
+    "bulleted_list_item": "- ",
+    "numbered_list_item": "- ",
+    "to_do": "[ ] ",
+    "callout": "",
+    "quote": "",
+    "toggle": "▸ "
+}
+
+# Conteneurs sans texte dont les enfants restent au même niveau d'indentation
+TRANSPARENT_BLOCKS = {"column_list", "column", "table", "synced_block"}
+
+# Blocs avec enfants qu'on ne parcourt pas (ce sont d'autres pages)
+OPAQUE_BLOCKS = {"child_page", "child_database"}
+
+def _rollup_value(prop: Dict) -> any:
+    rollup = prop.get("rollup", {})
+    rollup_type = rollup.get("type")
+    if rollup_type == "number":
+        return rollup.get("number")
+    elif rollup_type == "array":
+        return rollup.get("array", [])
+    return None
+
+def _formula_value(prop: Dict) -> any:
+    formula = prop.get("formula", {})
+    formula_type = formula.get("type")
+    return formula.get(formula_type) if formula_type else None
+
+# Extraction de la valeur d'une propriété Notion, par type de propriété
+PROPERTY_EXTRACTORS = {
+    "title": lambda prop: prop["title"][0].get("plain_text", "") if prop.get("title") else "",
+    "rich_text": lambda prop: prop["rich_text"][0].get("plain_text", "") if prop.get("rich_text") else "",
+    "number": lambda prop: prop.get("number"),
+    "select": lambda prop: (prop.get("select") or {}).get("name"),
+    "status": lambda prop: (prop.get("status") or {}).get("name"),
+    "multi_select": lambda prop: [item.get("name") for item in prop.get("multi_select", [])],
+    "date": lambda prop: (prop.get("date") or {}).get("start"),
+    "relation": lambda prop: [rel.get("id") for rel in prop.get("relation", [])],
+    "checkbox": lambda prop: prop.get("checkbox"),
+    "formula": _formula_value,
+    "rollup": _rollup_value
+}
+
+# Valeur simple -> propriété Notion à écrire (inverse des extracteurs)
+PROPERTY_ENCODERS = {
+    "title": lambda value: {"title": [{"text": {"content": value}}] if value else []},
+    "rich_text": lambda value: {"rich_text": [{"text": {"content": value}}] if value else []},
+    "number": lambda value: {"number": value},
+    "select": lambda value: {"select": {"name": value} if value else None},
+    "status": lambda value: {"status": {"name": value} if value else None},
+    "multi_select": lambda value: {"multi_select": [{"name": name} for name in value or []]},
+    "date": lambda value: {"date": {"start": value} if value else None},
+    "relation": lambda value: {"relation": [{"id": page_id} for page_id in value or []]},
+    "checkbox": lambda value: {"checkbox": bool(value)}
+}
+
+# Opérateurs de comparaison -> condition Notion, par famille de types
+NUMBER_OPERATORS = {
+    "=": "equals", "!=": "does_not_equal",
+    ">": "greater_than", ">=": "greater_than_or_equal_to",
+    "<": "less_than", "<=": "less_than_or_equal_to"
+}
+TEXT_OPERATORS = {"=": "equals", "!=": "does_not_equal", "contains": "contains"}
+DATE_OPERATORS = {">=": "on_or_after", ">": "after", "<=": "on_or_before", "<": "before", "=": "equals"}
+
+class QueryBuilder:
+    """
+    Construit une requête de database Notion à partir de prédicats simples
+    Les conditions sont compilées selon le type de chaque propriété dans le schéma
+    (filtre côté serveur), et select() limite les colonnes renvoyées (filter_properties).
+    """
+    
+    def __init__(self, schema: Dict):
+        self.schema = schema
+        self._conditions: List[Dict] = []
+        self._properties: List[str] = []
+    
+    def _prop_type(self, prop_name: str) -> str:
+        prop = self.schema.get(prop_name)
+        if not prop:
+            raise ValueError(f"Propriété inconnue dans la database : '{prop_name}'")
+        return prop["type"]
+    
+    def where(self, prop_name: str, op: str, value: Any = None) -> "QueryBuilder":
+        """
+        Ajoute une condition (toutes les conditions sont combinées par ET)
+        op: =, !=, >, >=, <, <=, contains, in, not_in, is_empty, is_not_empty
+        """
+        prop_type = self._prop_type(prop_name)
+        
+        def condition(operator: str, operand: Any) -> Dict:
+            return {"property": prop_name, prop_type: {operator: operand}}
+        
+        if op in ("is_empty", "is_not_empty"):
+            self._conditions.append(condition(op, True))
+        elif op in ("in", "not_in"):
+            values = list(value)
+            if not values:
+                # "in" d'une liste vide ne peut rien renvoyer ; "not_in" vide ne filtre rien
+                if op == "in":
+                    raise ValueError(f"Liste vide pour '{prop_name}' in []")
+                return self
+            if prop_type in ("multi_select", "relation"):
+                operator = "contains" if op == "in" else "does_not_contain"
+            else:
+                operator = "equals" if op == "in" else "does_not_equal"
+            parts = [condition(operator, v) for v in values]
+            if len(parts) == 1:
+                self._conditions.append(parts[0])
+            else:
+                self._conditions.append({"or" if op == "in" else "and": parts})
+        else:
+            if prop_type in ("number", "formula", "rollup"):
+                operators = NUMBER_OPERATORS
+            elif prop_type in ("date", "created_time", "last_edited_time"):
+                operators = DATE_OPERATORS
+            elif prop_type in ("multi_select", "relation"):
+                operators = {"contains": "contains", "=": "contains"}
+            else:
+                operators = TEXT_OPERATORS
+            if op not in operators:
+                raise ValueError(f"Opérateur '{op}' non supporté pour '{prop_name}' ({prop_type})")
+            if prop_type == "formula":
+                self._conditions.append({"property": prop_name, "formula": {"number": {operators[op]: value}}})
+            elif prop_type == "rollup":
+                self._conditions.append({"property": prop_name, "rollup": {"number": {operators[op]: value}}})
+            else:
+                self._conditions.append(condition(operators[op], value))
+        return self
+    
+    def branch(self) -> "QueryBuilder":
+        """Requête vide sur le même schéma, pour construire une branche de any_of()"""
+        return QueryBuilder(self.schema)
+    
+    def any_of(self, *branches: "QueryBuilder") -> "QueryBuilder":
+        """
+        Ajoute une condition vraie si l'une des branches l'est (Notion limite l'imbrication à deux niveaux)
+        Une branche sans condition accepte toutes les pages : rien n'est ajouté
+        """
+        filters = [branch.filter for branch in branches]
+        if not filters or None in filters:
+            return self
+        self._conditions.append(filters[0] if len(filters) == 1 else {"or": filters})
+        return self
+    
+    def edited_since(self, timestamp: str) -> "QueryBuilder":
+        """Pages modifiées depuis timestamp (ISO 8601), bornes comprises"""
+        self._conditions.append(
+            {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": timestamp}}
+        )
+        return self
+    
+    def select(self, *prop_names: str) -> "QueryBuilder":
+        """Ne renvoie que ces propriétés (les autres ne transitent pas sur le réseau)"""
+        for prop_name in prop_names:
+            if prop_name in self.schema and prop_name not in self._properties:
+                self._properties.append(prop_name)
+        return self
+    
+    @property
+    def filter(self) -> Optional[Dict]:
+        if not self._conditions:
+            return None
+        if len(self._conditions) == 1:
+            return self._conditions[0]
+        return {"and": list(self._conditions)}
+    
+    @property
+    def property_ids(self) -> Optional[List[str]]:
+        if not self._properties:
+            return None
+        return [self.schema[name]["id"] for name in self._properties]
 
 class NotionClient:
-    def __init__(self, token: str):
+    def __init__(
+        self,
+        token: str,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_retries: int = 5,
+        timeout: float = 30,
+        pool_size: int = 10,
+        max_depth: int = 3,
+        max_blocks: int = 1000,
+        block_workers: int = 3,
+        metrics: Optional[RunMetrics] = None,
+        base_url: str = "https://api.notion.com/v1",
+        block_cache: Optional[BlockCache] = None
+    ):
         self.token = token
         self.headers = {
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json",
             "Notion-Version": "2022-06-28"
         }
-        self.base_url = "https://api.notion.com/v1"
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.timeout = timeout
+        
+        # Budget de parcours des blocs imbriqués (par page)
+        self.max_depth = max_depth
+        self.max_blocks = max_blocks
+        self.block_workers = block_workers
+        # Enfants déjà rendus des pages/blocs non modifiés (voir block_cache.BlockCache)
+        self.block_cache = block_cache
+        
+        # Session persistante (keep-alive) partagée par toutes les requêtes
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        # Notion tolère ~3 req/s en moyenne avec de courtes rafales
+        self.rate_limiter = rate_limiter or TokenBucket(rate=3.0, capacity=10)
+        self.stats = {"requests": 0, "retries": 0, "throttle_waits": 0, "throttle_seconds": 0.0, "query_errors": 0}
+        self._stats_lock = threading.Lock()
+        # Latences par endpoint et compteurs détaillés (registre partagé avec le reste du run)
+        self.metrics = metrics or RunMetrics()
+    
+    def _count(self, key: str, value: float = 1):
+        with self._stats_lock:
+            self.stats[key] += value
+        self.metrics.increment("notion", key, value)
+    
+    def _request(self, method: str, url: str, idempotent: bool = True, **kwargs) -> requests.Response:
+        """
+        Envoie une requête via la session en respectant le rate limit
+        Réessaie sur 429 / 5xx / erreurs réseau (Retry-After + backoff exponentiel avec jitter)
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        
+        while True:
+            waited = self.rate_limiter.acquire()
+            if waited > 0:
+                self._count("throttle_waits")
+                self._count("throttle_seconds", waited)
+            self._count("requests")
+            
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.metrics.observe_request("notion", method, url, None, time.perf_counter() - start)
+                # Une création non idempotente a pu être traitée côté serveur
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self._count("retries")
+                delay = backoff_delay(attempt)
+                print(f"⚠️ Erreur réseau ({e.__class__.__name__}), nouvel essai dans {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            
+            status = response.status_code
+            self.metrics.observe_request("notion", method, url, status, time.perf_counter() - start)
+            retryable = status == 429 or (idempotent and status in RETRY_STATUS)
+            if not retryable or attempt >= self.max_retries:
+                return response
+            
+            attempt += 1
+            self._count("retries")
+            delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+            if status == 429:
+                # Ralentir aussi les autres threads qui partagent le limiteur
+                self.rate_limiter.penalize(delay)
+            print(f"⚠️ HTTP {status}, nouvel essai {attempt}/{self.max_retries} dans {delay:.1f}s")
+            time.sleep(delay)
     
-    def query_database(self, database_id: str, filter_obj: Optional[Dict] = None) -> List[Dict]:
-        """Récupère toutes les pages d'une database"""
+    def _paginate(self, fetch_page: Callable[[Optional[str]], Optional[Dict]], prefetch: bool = True) -> Iterator[Dict]:
+        """
+        Parcourt une liste paginée Notion et produit les résultats page par page
+        fetch_page(cursor) -> JSON de la réponse, ou None si erreur (arrête le parcours)
+        prefetch: la page suivante est demandée en arrière-plan pendant que l'appelant traite la courante
+        """
+        data = fetch_page(None)
+        if data is None:
+            return
+        cursor = data.get("next_cursor") if data.get("has_more") else None
+        
+        if not cursor or not prefetch:
+            yield from data.get("results", [])
+            while cursor:
+                data = fetch_page(cursor)
+                if data is None:
+                    return
+                yield from data.get("results", [])
+                cursor = data.get("next_cursor") if data.get("has_more") else None
+            return
+        
+        pages = queue.Queue(maxsize=1)
+        stop = threading.Event()
+        
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+        
+        def producer(cursor):
+            try:
+                while cursor and not stop.is_set():
+                    data = fetch_page(cursor)
+                    if data is None:
+                        break
+                    put(("data", data))
+                    cursor = data.get("next_cursor") if data.get("has_more") else None
+            except Exception as e:
+                put(("error", e))
+            finally:
+                put(("end", None))
+        
+        threading.Thread(target=producer, args=(cursor,), daemon=True).start()
+        try:
+            yield from data.get("results", [])
+            while True:
+                kind, value = pages.get()
+                if kind == "end":
+                    return
+                if kind == "error":
+                    raise value
+                yield from value.get("results", [])
+        finally:
+            # L'appelant peut s'arrêter avant la fin : libérer le thread de préchargement
+            stop.set()
+    
+    def iter_query_database(
+        self,
+        database_id: str,
+        filter_obj: Optional[Dict] = None,
+        transform: Optional[Callable[[Dict], Any]] = None,
+        prefetch: bool = True,
+        filter_properties: Optional[List[str]] = None
+    ) -> Iterator[Any]:
+        """
+        Parcourt les pages d'une database au fil de la pagination (100 par requête)
+        transform: appliquée à chaque page dès réception (la page brute n'est pas conservée)
+        filter_properties: ids des seules propriétés à renvoyer (voir QueryBuilder)
+        """
         url = f"{self.base_url}/databases/{database_id}/query"
-        all_results = []
-        has_more = True
-        start_cursor = None
+        if filter_properties:
+            # Les ids du schéma sont déjà encodés pour l'URL : on normalise sans double encodage
+            url += "?" + "&".join(
+                f"filter_properties={quote(unquote(prop_id), safe='')}" for prop_id in filter_properties
+            )
         
-        while has_more:
+        def fetch_page(start_cursor: Optional[str]) -> Optional[Dict]:
             payload = {"page_size": 100}
             if filter_obj:
                 payload["filter"] = filter_obj
             if start_cursor:
                 payload["start_cursor"] = start_cursor
             
-            response = requests.post(url, headers=self.headers, json=payload)
+            response = self._request("POST", url, json=payload)
             
             if response.status_code != 200:
                 print(f"❌ Erreur query DB {database_id}: {response.text}")
-                break
-            
-            data = response.json()
-            all_results.extend(data.get("results", []))
-            has_more = data.get("has_more", False)
-            start_cursor = data.get("next_cursor")
+                # Parcours incomplet : visible par les appelants via stats["query_errors"]
+                self._count("query_errors")
+                return None
+            return response.json()
         
-        return all_results
+        for page in self._paginate(fetch_page, prefetch):
+            yield transform(page) if transform else page
+    
+    def query_database(
+        self,
+        database_id: str,
+        filter_obj: Optional[Dict] = None,
+        transform: Optional[Callable[[Dict], Any]] = None,
+        filter_properties: Optional[List[str]] = None
+    ) -> List[Any]:
+        """
+        Récupère toutes les pages d'une database
+        transform: appliquée à chaque page dès réception (la page brute n'est pas conservée)
+        """
+        return list(self.iter_query_database(
+            database_id, filter_obj, transform, filter_properties=filter_properties
+        ))
+    
+    def new_query(self, schema: Dict) -> QueryBuilder:
+        """Démarre une requête filtrée côté serveur pour une database de ce schéma"""
+        return QueryBuilder(schema)
     
     def get_property_value(self, page: Dict, prop_name: str) -> any:
         """Extrait la valeur d'une propriété Notion (gère tous les types)"""
         props = page.get("properties", {})
         prop = props.get(prop_name, {})
-        prop_type = prop.get("type")
+        extractor = PROPERTY_EXTRACTORS.get(prop.get("type"))
+        return extractor(prop) if extractor else None
+    
+    def get_page(self, page_id: str) -> Optional[Dict]:
+        """Récupère une page (propriétés comprises)"""
+        url = f"{self.base_url}/pages/{page_id}"
+        response = self._request("GET", url)
         
-        if not prop_type:
+        if response.status_code != 200:
+            print(f"❌ Erreur get page {page_id}: {response.text}")
             return None
         
-        # Title
-        if prop_type == "title":
-            titles = prop.get("title", [])
-            return titles[0].get("plain_text", "") if titles else ""
-        
-        # Rich text
-        if prop_type == "rich_text":
-            texts = prop.get("rich_text", [])
-            return texts[0].get("plain_text", "") if texts else ""
-        
-        # Number
-        if prop_type == "number":
-            return prop.get("number")
-        
-        # Select
-        if prop_type == "select":
-            select = prop.get("select")
-            return select.get("name") if select else None
-        
-        # Multi-select
-        if prop_type == "multi_select":
-            return [item.get("name") for item in prop.get("multi_select", [])]
-        
-        # Date
-        if prop_type == "date":
-            date_obj = prop.get("date")
-            return date_obj.get("start") if date_obj else None
-        
-        # Relation
-        if prop_type == "relation":
-            return [rel.get("id") for rel in prop.get("relation", [])]
-        
-        # Formula
-        if prop_type == "formula":
-            formula = prop.get("formula", {})
-            formula_type = formula.get("type")
-            return formula.get(formula_type) if formula_type else None
-        
-        # Rollup
-        if prop_type == "rollup":
-            rollup = prop.get("rollup", {})
-            rollup_type = rollup.get("type")
-            if rollup_type == "number":
-                return rollup.get("number")
-            elif rollup_type == "array":
-                return rollup.get("array", [])
-        
-        return None
+        return response.json()
     
     def update_page(self, page_id: str, properties: Dict) -> bool:
         """Met à jour les propriétés d'une page"""
         url = f"{self.base_url}/pages/{page_id}"
         payload = {"properties": properties}
         
-        response = requests.patch(url, headers=self.headers, json=payload)
+        response = self._request("PATCH", url, json=payload)
         
         if response.status_code != 200:
             print(f"❌ Erreur update page {page_id}: {response.text}")
@@ -123,7 +453,7 @@ class NotionClient:
             "properties": properties
         }
         
-        response = requests.post(url, headers=self.headers, json=payload)
+        response = self._request("POST", url, idempotent=False, json=payload)
         
         if response.status_code != 200:
             print(f"❌ Erreur create page: {response.text}")
@@ -141,7 +471,7 @@ class NotionClient:
             "properties": properties
         }
         
-        response = requests.post(url, headers=self.headers, json=payload)
+        response = self._request("POST", url, idempotent=False, json=payload)
         
         if response.status_code != 200:
             print(f"❌ Erreur create DB: {response.text}")
@@ -150,83 +480,258 @@ class NotionClient:
         print(f"✅ Database '{title}' créée !")
         return response.json().get("id")
 
-    def get_database_schema(self, database_id: str) -> Dict:
-        """Récupère le schéma d'une database (colonnes existantes)"""
+    def get_database(self, database_id: str) -> Optional[Dict]:
+        """Récupère l'objet database (schéma, last_edited_time...)"""
         url = f"{self.base_url}/databases/{database_id}"
-        response = requests.get(url, headers=self.headers)
+        response = self._request("GET", url)
         
         if response.status_code != 200:
             print(f"❌ Erreur get schema: {response.text}")
-            return {}
+            return None
         
-        return response.json().get("properties", {})
+        return response.json()
     
-    def add_property_to_database(self, database_id: str, prop_name: str, prop_config: Dict) -> bool:
-        """Ajoute une colonne à une database"""
+    def get_database_schema(self, database_id: str) -> Dict:
+        """Récupère le schéma d'une database (colonnes existantes)"""
+        database = self.get_database(database_id)
+        return database.get("properties", {}) if database else {}
+    
+    def add_properties_to_database(self, database_id: str, properties: Dict[str, Dict]) -> Optional[Dict]:
+        """
+        Ajoute plusieurs colonnes en un seul PATCH
+        Returns: l'objet database mis à jour (nouveau schéma compris), None si erreur
+        """
         url = f"{self.base_url}/databases/{database_id}"
-        payload = {
-            "properties": {
-                prop_name: prop_config
-            }
-        }
-        
-        response = requests.patch(url, headers=self.headers, json=payload)
+        response = self._request("PATCH", url, json={"properties": properties})
         
         if response.status_code != 200:
-            print(f"❌ Erreur add property '{prop_name}': {response.text}")
-            return False
+            print(f"❌ Erreur add properties {', '.join(properties)}: {response.text}")
+            return None
         
-        print(f"✅ Colonne '{prop_name}' ajoutée")
-        return True
+        for prop_name in properties:
+            print(f"✅ Colonne '{prop_name}' ajoutée")
+        return response.json()
+    
+    def add_property_to_database(self, database_id: str, prop_name: str, prop_config: Dict) -> bool:
+        """Ajoute une colonne à une database"""
+        return self.add_properties_to_database(database_id, {prop_name: prop_config}) is not None
 
-    def get_page_blocks(self, page_id: str) -> List[Dict]:
-        """Récupère les blocs (contenu) d'une page"""
+    def iter_page_blocks(
+        self,
+        page_id: str,
+        deadline: Optional[float] = None,
+        prefetch: bool = True
+    ) -> Iterator[Dict]:
+        """
+        Parcourt les blocs (contenu) d'une page au fil de la pagination
+        deadline: instant (time.monotonic) au-delà duquel on lève TimeoutError
+        """
         url = f"{self.base_url}/blocks/{page_id}/children"
-        all_blocks = []
-        has_more = True
-        start_cursor = None
         
-        while has_more:
+        def fetch_page(start_cursor: Optional[str]) -> Optional[Dict]:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Délai dépassé pour les blocs de {page_id}")
+            
             params = {"page_size": 100}
             if start_cursor:
                 params["start_cursor"] = start_cursor
             
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self._request("GET", url, params=params)
             
             if response.status_code != 200:
                 print(f"❌ Erreur get blocks {page_id}: {response.text}")
-                break
-            
-            data = response.json()
-            all_blocks.extend(data.get("results", []))
-            has_more = data.get("has_more", False)
-            start_cursor = data.get("next_cursor")
+                # Un contenu incomplet donnerait un hash faux (et serait mis en cache) : on abandonne la page
+                raise RuntimeError(f"Blocs de {page_id} non récupérés (HTTP {response.status_code})")
+            return response.json()
         
-        return all_blocks
+        return self._paginate(fetch_page, prefetch)
+    
+    def get_page_blocks(self, page_id: str, deadline: Optional[float] = None) -> List[Dict]:
+        """
+        Récupère les blocs (contenu) d'une page
+        deadline: instant (time.monotonic) au-delà duquel on lève TimeoutError
+        """
+        return list(self.iter_page_blocks(page_id, deadline))
 
-    def get_page_content(self, page_id: str) -> str:
-        """Récupère tout le texte lisible d'une page"""
-        blocks = self.get_page_blocks(page_id)
+    def get_children(
+        self,
+        parent_id: str,
+        last_edited_time: Optional[str] = None,
+        deadline: Optional[float] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Enfants d'une page ou d'un bloc
+        Avec un cache de blocs : réutilisés tant que last_edited_time (celui de la page, même pour
+        un bloc imbriqué) n'a pas changé, sous forme compacte (voir _compact_block)
+        limit: au plus ce nombre d'enfants, la pagination s'arrête au-delà (liste tronquée jamais mise en cache)
+        """
+        cached = self.block_cache is not None and last_edited_time
+        if cached:
+            children = self.block_cache.get(parent_id, last_edited_time)
+            if children is not None:
+                self.metrics.increment("notion", "block_cache_hits")
+                return children[:limit] if limit is not None else children
+        
+        read_at = time.time()
+        blocks = self.iter_page_blocks(parent_id, deadline=deadline)
+        try:
+            # Un bloc de plus que la limite : indique si la liste est tronquée
+            children = list(islice(blocks, limit + 1) if limit is not None else blocks)
+        finally:
+            blocks.close()
+        truncated = limit is not None and len(children) > limit
+        children = children[:limit] if truncated else children
+        if not cached:
+            return children
+        
+        children = [self._compact_block(b) for b in children]
+        if not truncated:
+            self.block_cache.put(parent_id, last_edited_time, children, read_at)
+        return children
+    
+    def get_block_tree(
+        self,
+        page_id: str,
+        deadline: Optional[float] = None,
+        last_edited_time: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Récupère l'arbre des blocs d'une page
+        Les enfants sont développés en largeur, niveau par niveau, en parallèle,
+        dans la limite de max_depth niveaux et max_blocks blocs.
+        Chaque bloc développé reçoit ses enfants dans la clé "_children".
+        last_edited_time: de la page, pour réutiliser ses blocs en cache si elle n'a pas changé
+        """
+        # Page de milliers de blocs : la racine aussi s'arrête à max_blocks
+        root = self.get_children(page_id, last_edited_time, deadline=deadline, limit=self.max_blocks)
+        count = len(root)
+        level = [b for b in root if self._is_expandable(b)]
+        depth = 1
+        
+        while level and depth < self.max_depth and count < self.max_blocks:
+            # Date de la page : celle d'un bloc ne change pas quand un de ses enfants est modifié
+            fetch = lambda block: self.get_children(block["id"], last_edited_time, deadline=deadline)
+            if len(level) == 1 or self.block_workers <= 1:
+                results = [fetch(block) for block in level]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.block_workers, len(level))) as pool:
+                    results = list(pool.map(fetch, level))
+            
+            next_level = []
+            for block, children in zip(level, results):
+                remaining = self.max_blocks - count
+                if remaining <= 0:
+                    break
+                children = children[:remaining]
+                block["_children"] = children
+                count += len(children)
+                next_level.extend(c for c in children if self._is_expandable(c))
+            
+            level = next_level
+            depth += 1
+        
+        return root
+    
+    @staticmethod
+    def _is_expandable(block: Dict) -> bool:
+        return bool(block.get("has_children")) and block.get("type") not in OPAQUE_BLOCKS
+    
+    @classmethod
+    def _compact_block(cls, block: Dict) -> Dict:
+        """Bloc réduit à ce qu'il faut pour le parcours et le rendu (texte canonique déjà calculé)"""
+        return {
+            "id": block.get("id"),
+            "type": block.get("type"),
+            "has_children": bool(block.get("has_children")),
+            "last_edited_time": block.get("last_edited_time"),
+            "_text": cls.render_block(block)
+        }
+    
+    @staticmethod
+    def render_block(block: Dict) -> str:
+        """Texte canonique d'un bloc seul (sans ses enfants), "" si rien à afficher"""
+        btype = block.get("type")
+        data = block.get(btype, {}) or {}
+        
+        if btype in TEXT_BLOCK_PREFIXES:
+            text_content = "".join([t.get("plain_text", "") for t in data.get("rich_text", [])])
+            return f"{TEXT_BLOCK_PREFIXES[btype]}{text_content}" if text_content else ""
+        
+        if btype == "code":
+            text_content = "".join([t.get("plain_text", "") for t in data.get("rich_text", [])])
+            return f"```{data.get('language', '')}\n{text_content}\n```" if text_content else ""
+        
+        if btype == "table_row":
+            cells = ["".join(t.get("plain_text", "") for t in cell) for cell in data.get("cells", [])]
+            return f"| {' | '.join(cells)} |" if any(cells) else ""
+        
+        return ""
+    
+    def render_blocks(self, blocks: List[Dict], depth: int = 0) -> List[str]:
+        """Lignes de texte d'une liste de blocs et de leurs enfants (indentés de 2 espaces par niveau)"""
         content_lines = []
+        indent = "  " * depth
         
         for block in blocks:
-            btype = block.get("type")
-            text_content = ""
-            
-            # Gérer les types de blocs courants avec texte
-            if btype in ["paragraph", "heading_1", "heading_2", "heading_3", "bulleted_list_item", "numbered_list_item", "to_do", "callout", "quote"]:
-                rich_text = block.get(btype, {}).get("rich_text", [])
-                text_content = "".join([t.get("plain_text", "") for t in rich_text])
+            text = block["_text"] if "_text" in block else self.render_block(block)
+            if text:
+                content_lines.extend(f"{indent}{line}" for line in text.split("\n"))
             
-            if text_content:
-                # Ajouter un préfixe selon le type pour la structure
-                prefix = ""
-                if btype == "heading_1": prefix = "# "
-                elif btype == "heading_2": prefix = "## "
-                elif btype == "heading_3": prefix = "### "
-                elif btype in ["bulleted_list_item", "numbered_list_item"]: prefix = "- "
-                elif btype == "to_do": prefix = "[ ] "
-                
-                content_lines.append(f"{prefix}{text_content}")
-        
-        return "\n".join(content_lines)
\ No newline at end of file
+            children = block.get("_children")
+            if children:
+                child_depth = depth if block.get("type") in TRANSPARENT_BLOCKS else depth + 1
+                content_lines.extend(self.render_blocks(children, child_depth))
+        
+        return content_lines
+    
+    def get_page_content(
+        self,
+        page_id: str,
+        timeout: Optional[float] = None,
+        last_edited_time: Optional[str] = None
+    ) -> str:
+        """Récupère tout le texte lisible d'une page (blocs imbriqués compris)"""
+        deadline = time.monotonic() + timeout if timeout else None
+        blocks = self.get_block_tree(page_id, deadline=deadline, last_edited_time=last_edited_time)
+        return "\n".join(self.render_blocks(blocks))
+
+    def iter_pages_content(
+        self,
+        page_ids: Iterable[Union[str, Tuple[str, Optional[str]]]],
+        max_workers: int = 4,
+        timeout: Optional[float] = None
+    ) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Récupère le contenu de plusieurs pages en parallèle (concurrence bornée)
+        page_ids: ids, ou (id, last_edited_time) pour réutiliser les blocs en cache des pages inchangées
+        Produit (page_id, contenu ou None si échec) dans l'ordre de page_ids, au fil de l'eau
+        """
+        def fetch(page: Union[str, Tuple[str, Optional[str]]]) -> Optional[str]:
+            page_id, last_edited_time = page if isinstance(page, tuple) else (page, None)
+            try:
+                return self.get_page_content(page_id, timeout=timeout, last_edited_time=last_edited_time)
+            except Exception as e:
+                print(f"⚠️ Contenu non récupéré pour {page_id}: {e}")
+                return None
+        
+        def page_id_of(page: Union[str, Tuple[str, Optional[str]]]) -> str:
+            return page[0] if isinstance(page, tuple) else page
+        
+        if max_workers <= 1:
+            for page in page_ids:
+                yield page_id_of(page), fetch(page)
+            return
+        
+        # Le rate limiter partagé garde le débit global sous la limite Notion ;
+        # la fenêtre bornée évite de lancer toutes les pages d'un coup
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            window = deque()
+            for page in page_ids:
+                window.append((page_id_of(page), pool.submit(fetch, page)))
+                if len(window) >= 2 * max_workers:
+                    first_id, future = window.popleft()
+                    yield first_id, future.result()
+            while window:
+                first_id, future = window.popleft()
+                yield first_id, future.result()
@@ -0,0 +1,172 @@
+"""
+Construction des prompts d'estimation dans un budget de tokens
+Comptage local, compaction du contenu des pages (doublons, séparateurs, titres et cases à cocher d'abord)
+et répartition du budget entre historique et contenu des tâches
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_BOILERPLATE = re.compile(r"^[\W_]*$", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+
+OMITTED_MARKER = "[… {count} lignes omises]"
+
+
+def count_tokens(text: str) -> int:
+    """Estimation locale du nombre de tokens : ponctuation = 1, mots découpés par tranches de 4 caractères"""
+    if not text:
+        return 0
+    return sum((len(token) + 3) // 4 for token in _TOKEN_PATTERN.findall(text)) + text.count("\n")
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Coupe `text` (sur une fin de mot) pour tenir dans `max_tokens`"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    used = 0
+    end = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        cost = (len(match.group()) + 3) // 4
+        # Un token réservé pour le "…"
+        if used + cost > max_tokens - 1:
+            break
+        used += cost
+        end = match.end()
+    return text[:end].rstrip() + "…"
+
+
+def _line_rank(line: str, in_code: bool) -> int:
+    """Priorité d'une ligne rendue par NotionClient (0 = gardée en premier)"""
+    if in_code:
+        return 4
+    stripped = line.lstrip()
+    if stripped.startswith("#"):
+        return 0
+    if stripped.startswith("[ ]") or stripped.startswith("[x]"):
+        return 1
+    if stripped.startswith("- ") or stripped.startswith("▸ "):
+        return 2
+    if stripped.startswith("|"):
+        return 4
+    return 3
+
+
+def compact_content(text: str, max_tokens: int) -> str:
+    """
+    Réduit le contenu d'une page à `max_tokens` :
+    - supprime lignes vides, séparateurs et doublons
+    - si le budget ne suffit pas, garde d'abord titres, cases à cocher et listes,
+      puis le texte, et en dernier les blocs de code et tableaux (logs, specs collées)
+    L'ordre d'origine des lignes gardées est conservé
+    """
+    if not text or max_tokens <= 0:
+        return ""
+
+    lines: List[Tuple[int, int, str]] = []  # (rang, position, ligne)
+    seen = set()
+    in_code = False
+    for line in text.split("\n"):
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+            continue
+        if _BOILERPLATE.match(line):
+            continue
+        key = _SPACES.sub(" ", line.strip().lower())
+        if key in seen:
+            continue
+        seen.add(key)
+        lines.append((_line_rank(line, in_code), len(lines), line.rstrip()))
+
+    compacted = "\n".join(line for _, _, line in lines)
+    if count_tokens(compacted) <= max_tokens:
+        return compacted
+
+    # Budget insuffisant : sélection par priorité, une ligne ne peut pas tout consommer
+    budget = max_tokens - count_tokens(OMITTED_MARKER.format(count=len(lines))) - 1
+    line_cap = max(32, max_tokens // 4)
+    kept: Dict[int, str] = {}
+    for rank, position, line in sorted(lines):
+        if budget <= 0:
+            break
+        line = truncate_to_tokens(line, min(line_cap, budget - 1))
+        cost = count_tokens(line) + 1
+        if line and cost <= budget:
+            kept[position] = line
+            budget -= cost
+
+    result = [kept[position] for position in sorted(kept)]
+    omitted = len(lines) - len(kept)
+    if omitted:
+        result.append(OMITTED_MARKER.format(count=omitted))
+    return "\n".join(result)
+
+
+def fair_shares(total: int, demands: List[int]) -> List[int]:
+    """Répartit `total` entre des demandes : parts égales, le surplus des petites revient aux grandes"""
+    shares = [0] * len(demands)
+    remaining = max(0, total)
+    order = sorted(range(len(demands)), key=lambda i: demands[i])
+    for done, i in enumerate(order):
+        share = remaining // (len(order) - done)
+        shares[i] = min(demands[i], share)
+        remaining -= shares[i]
+    return shares
+
+
+class PromptBudget:
+    """
+    Budget de tokens d'un prompt d'estimation
+    max_tokens: taille maximale du prompt (messages système + utilisateur)
+    history_share: part du budget variable réservée en priorité à l'historique
+    """
+
+    def __init__(self, max_tokens: int = 3000, history_share: float = 0.3, description_tokens: int = 200):
+        self.max_tokens = max_tokens
+        self.history_share = history_share
+        self.description_tokens = description_tokens
+
+    def description(self, text: Optional[str]) -> str:
+        return truncate_to_tokens(text or "", self.description_tokens)
+
+    def format_history(self, tasks: List[Dict], max_tokens: int, limit: int) -> str:
+        """Exemples historiques (les plus similaires d'abord) dans `max_tokens`, descriptions raccourcies à la part de chacun"""
+        if not tasks:
+            return "Aucune tâche similaire trouvée dans l'historique."
+
+        tasks = tasks[:limit]
+        lines = []
+        for done, task in enumerate(tasks):
+            remaining = max_tokens - sum(count_tokens(line) + 1 for line in lines)
+            allowance = remaining // (len(tasks) - done)
+            head = f"- {task.get('nom', 'Sans nom')}: {task.get('temps_reel', 0)} min"
+            head_cost = count_tokens(head) + 1
+            if head_cost > remaining:
+                break
+            desc = truncate_to_tokens(_SPACES.sub(" ", task.get("description") or ""), allowance - head_cost - 4)
+            lines.append(f"{head} ('{desc}')" if desc else head)
+        return "\n".join(lines) or "Aucune tâche similaire trouvée dans l'historique."
+
+    def history_demand(self, tasks: List[Dict], limit: int) -> int:
+        return sum(
+            count_tokens(f"- {t.get('nom', 'Sans nom')}: {t.get('temps_reel', 0)} min ('{t.get('description') or ''}')") + 1
+            for t in tasks[:limit]
+        )
+
+    def limit(self, task_count: int = 1) -> int:
+        """Taille maximale d'un prompt estimant `task_count` tâches (l'historique n'est compté qu'une fois)"""
+        return int(self.max_tokens + (task_count - 1) * self.max_tokens * (1 - self.history_share))
+
+    def allocate(self, fixed_tokens: int, history_demand: int, content_demands: List[int]) -> Tuple[int, List[int]]:
+        """
+        Répartit ce qui reste après la partie fixe du prompt
+        Returns: (budget historique, budget de contenu par tâche)
+        """
+        available = max(0, self.limit(len(content_demands)) - fixed_tokens)
+        history = min(history_demand, int(available * self.history_share))
+        contents = fair_shares(available - history, content_demands)
+        # Ce que le contenu n'utilise pas revient à l'historique
+        history = min(history_demand, available - sum(contents))
+        return history, contents
@@ -0,0 +1,70 @@
+"""
+Limiteur de débit et politique de retry partagés
+Token bucket thread-safe + backoff exponentiel avec jitter
+"""
+import random
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Token bucket thread-safe : `rate` jetons/s en moyenne, rafales jusqu'à `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self._last
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Consomme `amount` jetons en attendant si besoin. Retourne le temps attendu (s)"""
+        # Une demande plus grosse que le seau ne doit pas bloquer indéfiniment
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    if waited > 0:
+                        self.waits += 1
+                        self.wait_seconds += waited
+                    return waited
+                delay = (amount - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def penalize(self, seconds: float):
+        """Vide le seau pour `seconds` (ex: après un 429 avec Retry-After)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+def backoff_delay(
+    attempt: int,
+    retry_after: Optional[str] = None,
+    base: float = 1.0,
+    cap: float = 30.0
+) -> float:
+    """
+    Délai avant le retry n° `attempt` (à partir de 1)
+    Respecte Retry-After s'il est présent, sinon backoff exponentiel avec full jitter
+    """
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
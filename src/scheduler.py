@@ -0,0 +1,149 @@
+"""
+Ordonnancement des estimations d'un run
+Les tâches candidates sont triées par priorité (statut, échéance, nouvelles avant ré-estimations...)
+et distribuées tant que les budgets du run (temps, tokens GPT, requêtes Notion) ne sont pas épuisés ;
+les tâches restantes sont reportées au run suivant, en tête de leur rang de priorité.
+"""
+import json
+import os
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from atomic_file import write_atomic
+from metrics import RunMetrics
+from task_records import TaskRecord
+
+# Ordre par défaut des critères de priorité
+DEFAULT_ORDER = ("statut", "echeance", "nouvelle", "reportee")
+
+
+class RunBudget:
+    """
+    Budgets d'un run, mesurés depuis sa création (0 = pas de limite)
+    Les tokens sont ceux rapportés par les réponses GPT, les requêtes Notion celles comptées par NotionClient
+    """
+
+    def __init__(
+        self,
+        metrics: RunMetrics,
+        max_seconds: float = 0,
+        max_tokens: int = 0,
+        max_notion_requests: int = 0
+    ):
+        self.metrics = metrics
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.max_notion_requests = max_notion_requests
+        self._start = time.monotonic()
+        self._tokens = metrics.total_tokens()
+        self._requests = metrics.counter("notion", "requests")
+
+    def usage(self) -> Dict[str, float]:
+        return {
+            "seconds": time.monotonic() - self._start,
+            "tokens": self.metrics.total_tokens() - self._tokens,
+            "notion_requests": self.metrics.counter("notion", "requests") - self._requests
+        }
+
+    def exhausted(self) -> Optional[str]:
+        """Nom du premier budget épuisé, None s'il en reste"""
+        usage = self.usage()
+        if self.max_seconds and usage["seconds"] >= self.max_seconds:
+            return "temps"
+        if self.max_tokens and usage["tokens"] >= self.max_tokens:
+            return "tokens GPT"
+        if self.max_notion_requests and usage["notion_requests"] >= self.max_notion_requests:
+            return "requêtes Notion"
+        return None
+
+
+class EstimationScheduler:
+    """
+    order: critères de priorité, du plus fort au plus faible (voir CRITERIA)
+    status_priority: statuts traités en premier, dans cet ordre (les autres ensuite)
+    queue_path: file des tâches reportées par un run arrêté faute de budget
+    """
+
+    # Critère -> clé de tri d'une tâche (plus petit = plus prioritaire)
+    CRITERIA: Dict[str, Callable[["EstimationScheduler", TaskRecord], Tuple]] = {
+        "statut": lambda self, task: (self.status_rank.get(task.statut, len(self.status_rank)),),
+        # Dates ISO : l'ordre lexicographique est l'ordre chronologique ; sans échéance en dernier
+        "echeance": lambda self, task: (task.echeance is None, task.echeance or ""),
+        "nouvelle": lambda self, task: (bool(task.temps_estime),),
+        "reportee": lambda self, task: (task.id not in self.carried,)
+    }
+
+    def __init__(
+        self,
+        queue_path: str,
+        order: Sequence[str] = DEFAULT_ORDER,
+        status_priority: Sequence[str] = ("En cours", "À faire"),
+        budget: Optional[RunBudget] = None
+    ):
+        unknown = [name for name in order if name not in self.CRITERIA]
+        if unknown:
+            raise ValueError(f"❌ Critère de priorité inconnu : {', '.join(unknown)} "
+                             f"(possibles : {', '.join(self.CRITERIA)})")
+        self.queue_path = queue_path
+        self.order = list(order)
+        self.status_rank = {status: rank for rank, status in enumerate(status_priority)}
+        self.budget = budget
+        # Résultat du dernier passage : budget épuisé et tâches non distribuées
+        self.stopped: Optional[str] = None
+        self.leftover: List[str] = []
+
+        self.carried: set = set()
+        if os.path.exists(queue_path):
+            try:
+                with open(queue_path, encoding="utf-8") as f:
+                    self.carried = set(json.load(f).get("ids", []))
+            except (OSError, ValueError):
+                self.carried = set()
+
+    def priority(self, task: TaskRecord) -> Tuple:
+        return tuple(value for name in self.order for value in self.CRITERIA[name](self, task))
+
+    def schedule(
+        self,
+        candidates: Iterable[TaskRecord],
+        deferrable: Optional[Callable[[TaskRecord], bool]] = None
+    ) -> Iterator[TaskRecord]:
+        """
+        Candidates triées par priorité, distribuées une à une tant qu'aucun budget n'est épuisé
+        Les tâches déjà distribuées vont jusqu'au bout ; si un budget s'épuise, les autres sont
+        enregistrées pour le run suivant.
+        deferrable: tâches qui restent à estimer parmi celles non distribuées (défaut : toutes) ;
+        les autres (déjà estimées, déjà obtenues) ne sont pas comptées comme reportées
+        """
+        ordered = sorted(candidates, key=self.priority)
+        carried = sum(1 for task in ordered if task.id in self.carried)
+        if carried:
+            print(f"📋 {carried} tâches reportées du run précédent")
+
+        self.stopped, self.leftover = None, []
+        position = 0
+        try:
+            while position < len(ordered):
+                reason = self.budget.exhausted() if self.budget else None
+                if reason:
+                    self.stopped = reason
+                    break
+                yield ordered[position]
+                position += 1
+        finally:
+            # Budget épuisé : ce qui n'a pas été distribué et reste à estimer passe au run suivant
+            if self.stopped:
+                self.leftover = [
+                    task.id for task in ordered[position:] if deferrable is None or deferrable(task)
+                ]
+            else:
+                # Interruption : les tâches déjà reportées gardent leur priorité
+                self.leftover = [task.id for task in ordered[position:] if task.id in self.carried]
+            self._save()
+
+    def _save(self):
+        if not self.leftover:
+            if os.path.exists(self.queue_path):
+                os.remove(self.queue_path)
+            return
+        write_atomic(self.queue_path, json.dumps({"stopped": self.stopped, "ids": self.leftover}, ensure_ascii=False))
@@ -0,0 +1,70 @@
+"""
+Cache disque des schémas de databases Notion
+Un run court réutilise le schéma du run précédent sans appel réseau ; passé le délai de validité,
+le schéma est relu et son last_edited_time indique si la database a changé entre-temps
+"""
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from atomic_file import write_atomic
+
+
+class SchemaCache:
+    def __init__(self, path: str, ttl_seconds: float = 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # database_id -> {"properties", "last_edited_time", "checked_at"}
+        self.entries: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get(self, database_id: str, fetch: Callable[[str], Optional[Dict]]) -> Dict:
+        """
+        Schéma (propriétés) de la database
+        fetch: lecture de l'objet database (NotionClient.get_database) si le cache est absent ou expiré
+        """
+        with self._lock:
+            entry = self.entries.get(database_id)
+        if entry and time.time() - entry["checked_at"] < self.ttl_seconds:
+            return entry["properties"]
+
+        database = fetch(database_id)
+        if database is None:
+            # Notion indisponible : mieux vaut un schéma un peu ancien que pas de schéma
+            return entry["properties"] if entry else {}
+        if entry and entry["last_edited_time"] != database.get("last_edited_time"):
+            print("🔄 Schéma modifié dans Notion depuis le dernier run")
+        self.put(database_id, database)
+        return database.get("properties", {})
+
+    def put(self, database_id: str, database: Dict):
+        """Enregistre un objet database frais (lecture ou réponse d'un PATCH)"""
+        with self._lock:
+            self.entries[database_id] = {
+                "properties": database.get("properties", {}),
+                "last_edited_time": database.get("last_edited_time"),
+                "checked_at": time.time()
+            }
+        self.save()
+
+    def invalidate(self, database_id: Optional[str] = None):
+        """Force la relecture d'un schéma (ou de tous)"""
+        with self._lock:
+            if database_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(database_id, None)
+        self.save()
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.entries, ensure_ascii=False)
+        write_atomic(self.path, data)
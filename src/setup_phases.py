@@ -5,17 +5,19 @@ import os
 import sys
 from dotenv import load_dotenv
 
-# Charger .env
-env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
-load_dotenv(env_path, override=True)
-
 # Import client
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from notion_client import NotionClient
 
+def load_env():
+    """Charge le .env à la racine du projet (au lancement, pas à l'import du module)"""
+    env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
+    load_dotenv(env_path, override=True)
+
 def create_phases_db():
     print("🚀 Initialisation de la base PHASES...")
     
+    load_env()
     token = os.getenv("NOTION_TOKEN")
     client = NotionClient(token)
     
@@ -0,0 +1,157 @@
+"""
+Index de similarité des tâches historiques
+Vecteurs TF-IDF hachés (mots, bigrammes, trigrammes de caractères) + produit matriciel NumPy
+"""
+import math
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def task_text(task: Dict) -> str:
+    """
+    Texte servant à comparer les tâches : nom + description
+    Le contenu des pages n'est pas pris en compte : l'historique ne le porte pas, et un texte présent
+    d'un seul côté ferait chuter la similarité d'une tâche pourtant identique
+    """
+    return " ".join(filter(None, [task.get("nom"), task.get("description")]))
+
+
+class SimilarityIndex:
+    def __init__(self, dim: int = 2 ** 11, project_boost: float = 0.1, query_chunk: int = 256):
+        self.dim = dim
+        self.query_chunk = query_chunk
+        # Bonus de score pour une tâche du même projet
+        self.project_boost = project_boost
+        self.tasks: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self._features: List[Dict[int, float]] = []
+        self._tf = np.zeros((0, dim), dtype=np.float32)
+        self._df = np.zeros(dim, dtype=np.float64)
+        self._projects: Dict[tuple, int] = {}
+        self._task_projects = np.zeros(0, dtype=np.int64)
+        self._weighted: Optional[np.ndarray] = None
+    
+    def __len__(self):
+        return len(self.tasks)
+    
+    def _hash_features(self, text: str) -> Dict[int, float]:
+        """Comptes des features hachées (crc32 : stable d'un run à l'autre)"""
+        words = WORD_RE.findall(text.lower())
+        grams = list(words)
+        grams += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            grams += [padded[i:i + 3] for i in range(len(padded) - 2)]
+        
+        counts: Dict[int, float] = {}
+        for gram in grams:
+            h = zlib.crc32(gram.encode("utf-8")) % self.dim
+            counts[h] = counts.get(h, 0) + 1
+        # TF sous-linéaire : un mot répété 50 fois ne domine pas tout
+        return {h: 1 + math.log(c) for h, c in counts.items()}
+    
+    def _project_id(self, task: Dict) -> int:
+        key = tuple(task.get("projet") or [])
+        if not key:
+            return -1
+        return self._projects.setdefault(key, len(self._projects))
+    
+    def _vectors(self, features: List[Dict[int, float]]) -> np.ndarray:
+        matrix = np.zeros((len(features), self.dim), dtype=np.float32)
+        for row, feats in enumerate(features):
+            if feats:
+                matrix[row, list(feats.keys())] = list(feats.values())
+        return matrix
+    
+    def update(self, tasks: List[Dict]):
+        """Ajoute les nouvelles tâches historiques, remplace celles déjà indexées"""
+        new_tasks, new_features = [], []
+        for task in tasks:
+            features = self._hash_features(task_text(task))
+            row = self._rows.get(task["id"])
+            if row is None:
+                new_tasks.append(task)
+                new_features.append(features)
+                continue
+            # Tâche déjà connue : remplacer sa ligne et ajuster les fréquences de documents
+            self._df[list(self._features[row].keys())] -= 1
+            self._df[list(features.keys())] += 1
+            self._features[row] = features
+            self._tf[row] = self._vectors([features])[0]
+            self.tasks[row] = task
+            self._task_projects[row] = self._project_id(task)
+        
+        if new_tasks:
+            start = len(self.tasks)
+            for offset, (task, features) in enumerate(zip(new_tasks, new_features)):
+                self._rows[task["id"]] = start + offset
+                self._df[list(features.keys())] += 1
+            self.tasks.extend(new_tasks)
+            self._features.extend(new_features)
+            self._tf = np.vstack([self._tf, self._vectors(new_features)])
+            self._task_projects = np.concatenate([
+                self._task_projects,
+                np.array([self._project_id(t) for t in new_tasks], dtype=np.int64)
+            ])
+        
+        self._weighted = None
+    
+    def _idf(self) -> np.ndarray:
+        n = len(self.tasks)
+        return (np.log((1 + n) / (1 + self._df)) + 1).astype(np.float32)
+    
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+    
+    def top_k(self, queries: List[Dict], k: int = 10) -> List[List[Dict]]:
+        """
+        Les k tâches historiques les plus proches de chaque requête (meilleure d'abord)
+        Un seul produit matriciel pour toutes les requêtes ; une tâche n'est jamais sa propre voisine
+        """
+        return [[task for task, _ in scored] for scored in self.top_k_scored(queries, k)]
+    
+    def top_k_scored(self, queries: List[Dict], k: int = 10) -> List[List[Tuple[Dict, float]]]:
+        """Comme top_k, avec le score de chaque voisine (cosinus + bonus projet)"""
+        if not queries or not self.tasks:
+            return [[] for _ in queries]
+        
+        idf = self._idf()
+        if self._weighted is None:
+            self._weighted = self._normalize(self._tf * idf)
+        
+        k = min(k, len(self.tasks))
+        results = []
+        # Par blocs de requêtes pour borner la mémoire de la matrice de scores
+        for start in range(0, len(queries), self.query_chunk):
+            results.extend(self._top_k_chunk(queries[start:start + self.query_chunk], k, idf))
+        return results
+    
+    def _top_k_chunk(self, queries: List[Dict], k: int, idf: np.ndarray) -> List[List[Tuple[Dict, float]]]:
+        query_matrix = self._normalize(
+            self._vectors([self._hash_features(task_text(q)) for q in queries]) * idf
+        )
+        scores = query_matrix @ self._weighted.T
+        
+        query_projects = np.array([self._project_id(q) for q in queries], dtype=np.int64)
+        same_project = (query_projects[:, None] == self._task_projects[None, :]) & (query_projects[:, None] >= 0)
+        scores += self.project_boost * same_project
+        
+        for i, query in enumerate(queries):
+            row = self._rows.get(query.get("id"))
+            if row is not None:
+                scores[i, row] = -np.inf
+        
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for i in range(len(queries)):
+            order = top[i][np.argsort(-scores[i, top[i]])]
+            results.append([(self.tasks[j], float(scores[i, j])) for j in order if np.isfinite(scores[i, j])])
+        return results
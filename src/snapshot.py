@@ -0,0 +1,111 @@
+"""
+Snapshot des databases Notion pour la durée d'un run
+Chaque requête (database + filtre) n'est paginée qu'une fois ; seules les pages modifiées par nous sont relues.
+Les phases d'un run partagent une même requête et filtrent le résultat localement.
+"""
+import json
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from notion_client import NotionClient
+
+
+def _item_id(item: Any) -> str:
+    """Id d'une page brute (dict) ou d'un enregistrement projeté"""
+    return item["id"] if isinstance(item, dict) else item.id
+
+
+class NotionSnapshot:
+    def __init__(self, client: NotionClient):
+        self.client = client
+        self._queries: Dict[Tuple[str, str], List[Any]] = {}
+        self._projections: Dict[str, Callable[[Dict], Any]] = {}
+        self._stale = set()
+        self._lock = threading.Lock()
+    
+    def clear(self):
+        """Oublie tout (début d'un nouveau run)"""
+        with self._lock:
+            self._queries.clear()
+            self._stale.clear()
+    
+    def set_projection(self, database_id: str, projection: Callable[[Dict], Any]):
+        """Les pages de cette database seront gardées sous forme projetée (ex: TaskRecord)"""
+        with self._lock:
+            self._projections[database_id] = projection
+            self._queries = {k: v for k, v in self._queries.items() if k[0] != database_id}
+    
+    def iter_database(
+        self,
+        database_id: str,
+        filter_obj: Optional[Dict] = None,
+        filter_properties: Optional[List[str]] = None
+    ) -> Iterator[Any]:
+        """
+        Parcourt une database : depuis le snapshot s'il existe, sinon au fil de la pagination
+        Le résultat n'est mémorisé que si le parcours va jusqu'au bout
+        """
+        key = (database_id, json.dumps([filter_obj, filter_properties], sort_keys=True))
+        
+        with self._lock:
+            pages = self._queries.get(key)
+            stale = set(self._stale)
+            projection = self._projections.get(database_id)
+        
+        if pages is not None:
+            if stale:
+                self._refresh(pages, stale, projection)
+            yield from list(pages)
+            return
+        
+        pages = []
+        errors_before = self.client.stats["query_errors"]
+        for item in self.client.iter_query_database(
+            database_id, filter_obj, transform=projection, filter_properties=filter_properties
+        ):
+            pages.append(item)
+            yield item
+        # Pagination interrompue par une erreur : résultat partiel, relu à la prochaine demande
+        if self.client.stats["query_errors"] == errors_before:
+            with self._lock:
+                self._queries[key] = pages
+    
+    def query_database(
+        self,
+        database_id: str,
+        filter_obj: Optional[Dict] = None,
+        filter_properties: Optional[List[str]] = None
+    ) -> List[Any]:
+        """Comme NotionClient.query_database, mais une seule pagination par requête et par run"""
+        return list(self.iter_database(database_id, filter_obj, filter_properties))
+    
+    def _refresh(self, pages: List[Any], stale: set, projection: Optional[Callable[[Dict], Any]]):
+        """Relit uniquement les pages invalidées présentes dans ce résultat"""
+        for page in pages:
+            page_id = _item_id(page)
+            if page_id not in stale:
+                continue
+            fresh = self.client.get_page(page_id)
+            if fresh is None:
+                continue
+            if projection:
+                fresh = projection(fresh)
+            # La version relue sert aussi aux autres requêtes qui la contiennent
+            with self._lock:
+                for other in self._queries.values():
+                    for j, p in enumerate(other):
+                        if _item_id(p) == page_id:
+                            other[j] = fresh
+                self._stale.discard(page_id)
+    
+    def invalidate(self, page_id: str):
+        """Marque une page comme modifiée par nous"""
+        with self._lock:
+            self._stale.add(page_id)
+    
+    def update_page(self, page_id: str, properties: Dict) -> bool:
+        """Met à jour une page via le client et l'invalide dans le snapshot"""
+        success = self.client.update_page(page_id, properties)
+        if success:
+            self.invalidate(page_id)
+        return success
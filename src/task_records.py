@@ -0,0 +1,94 @@
+"""
+Projection des pages Notion en enregistrements compacts
+Le schéma de la database est lu une fois ; chaque propriété reçoit un extracteur compilé
+"""
+from typing import Any, Callable, Dict, Optional
+
+from notion_client import PROPERTY_EXTRACTORS
+
+# Attribut de TaskRecord -> (nom de la propriété Notion, valeur par défaut si vide)
+TASK_PROPERTIES = {
+    "nom": ("Nom", None),
+    "description": ("Description", ""),
+    "statut": ("Statut", None),
+    "projet": ("Projet/Tlt", []),
+    "temps_estime": ("⏱️ Temps estimé IA (min)", None),
+    "temps_reel": ("⏱️ Temps réel agrégé (min)", None),
+    "hash_stocke": ("🔄 Hash contenu", ""),
+    "ecart": ("📊 Écart (%)", None),
+    "echeance": ("Échéance", None)
+}
+# Mots indiquant une date d'échéance dans le nom d'une propriété date
+DUE_DATE_HINTS = ("échéance", "echeance", "deadline", "date limite", "due", "rendu")
+
+
+class TaskRecord:
+    """Tâche réduite aux champs utilisés par Martine (la page JSON brute n'est pas conservée)"""
+    __slots__ = ("id", "last_edited_time", "content_hash") + tuple(TASK_PROPERTIES)
+    
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+    
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TaskRecord":
+        return cls(**data)
+    
+    def __repr__(self):
+        return f"TaskRecord({self.id!r}, {self.nom!r})"
+
+
+def compile_property(prop_name: str, prop_type: Optional[str], default: Any) -> Callable[[Dict], Any]:
+    """Extracteur dédié à une propriété, spécialisé selon son type dans le schéma"""
+    extractor = PROPERTY_EXTRACTORS.get(prop_type)
+    # Une liste par défaut neuve à chaque fois (jamais partagée entre enregistrements)
+    make_default = (lambda: list(default)) if isinstance(default, list) else (lambda: default)
+    if extractor is None:
+        # Propriété absente du schéma (ou type non géré) : toujours la valeur par défaut
+        return lambda props: make_default()
+    
+    def extract(props: Dict) -> Any:
+        prop = props.get(prop_name)
+        if not prop:
+            return make_default()
+        if prop.get("type") != prop_type:
+            # Schéma modifié pendant le run : repli sur l'extraction générique
+            generic = PROPERTY_EXTRACTORS.get(prop.get("type"))
+            value = generic(prop) if generic else None
+        else:
+            value = extractor(prop)
+        return make_default() if value is None else value
+    
+    return extract
+
+
+def find_due_date(schema: Dict) -> Optional[str]:
+    """Première propriété date dont le nom évoque une échéance"""
+    for prop_name, prop in schema.items():
+        if prop.get("type") == "date" and any(hint in prop_name.lower() for hint in DUE_DATE_HINTS):
+            return prop_name
+    return None
+
+
+class TaskProjector:
+    """
+    Transforme une page brute de la base Tâches en TaskRecord
+    names: attribut -> nom de propriété, pour les propriétés nommées autrement dans la base
+    """
+    
+    def __init__(self, schema: Dict, names: Optional[Dict[str, str]] = None):
+        self.names = {attr: (names or {}).get(attr) or prop_name for attr, (prop_name, _) in TASK_PROPERTIES.items()}
+        self.extractors = [
+            (attr, compile_property(self.names[attr], schema.get(self.names[attr], {}).get("type"), default))
+            for attr, (_, default) in TASK_PROPERTIES.items()
+        ]
+    
+    def __call__(self, page: Dict) -> TaskRecord:
+        record = TaskRecord(id=page["id"], last_edited_time=page.get("last_edited_time"))
+        props = page.get("properties", {})
+        for attr, extract in self.extractors:
+            setattr(record, attr, extract(props))
+        return record
@@ -0,0 +1,106 @@
+"""
+Projection des saisies de temps (DATABASE_SAISIES_TEMPS)
+Chaque saisie est réduite à ses tâches liées et à sa durée en minutes dès réception ;
+les propriétés utiles sont détectées dans le schéma si elles ne sont pas configurées
+"""
+from typing import Dict, List, Optional
+
+from task_records import compile_property
+
+# Types de propriété pouvant porter une durée (nombre saisi, formule ou rollup numérique)
+DURATION_TYPES = ("number", "formula", "rollup")
+# Mots indiquant une durée dans le nom d'une propriété
+DURATION_HINTS = ("durée", "duree", "temps", "minutes", "(min)", "heures", "(h)")
+# Unité indiquée par le nom : mots -> minutes par unité saisie
+UNIT_HINTS = {1.0: ("minutes", "(min)"), 60.0: ("heures", "heure", "(h)")}
+
+
+def _normalize_id(notion_id: Optional[str]) -> str:
+    return (notion_id or "").replace("-", "").lower()
+
+
+def find_task_relation(schema: Dict, tasks_database_id: str) -> Optional[str]:
+    """Propriété relation des saisies qui pointe vers la base Tâches"""
+    target = _normalize_id(tasks_database_id)
+    for prop_name, prop in schema.items():
+        if prop.get("type") == "relation" and _normalize_id(prop.get("relation", {}).get("database_id")) == target:
+            return prop_name
+    return None
+
+
+def duration_unit(prop_name: str) -> Optional[float]:
+    """Minutes par unité d'après le nom de la propriété (60 pour « Durée (h) »), None si le nom ne le dit pas"""
+    name = prop_name.lower()
+    units = [unit for unit, hints in UNIT_HINTS.items() if any(hint in name for hint in hints)]
+    return units[0] if len(units) == 1 else None
+
+
+def find_duration(schema: Dict, with_unit: bool = False) -> Optional[str]:
+    """
+    Première propriété numérique dont le nom évoque une durée (les nombres saisis d'abord)
+    with_unit: seulement celles dont le nom indique aussi l'unité (minutes ou heures)
+    """
+    candidates = [
+        prop_name for prop_name, prop in schema.items()
+        if prop.get("type") in DURATION_TYPES and any(hint in prop_name.lower() for hint in DURATION_HINTS)
+        and (not with_unit or duration_unit(prop_name) is not None)
+    ]
+    candidates.sort(key=lambda prop_name: DURATION_TYPES.index(schema[prop_name]["type"]))
+    return candidates[0] if candidates else None
+
+
+class TimeEntry:
+    """Saisie de temps réduite aux champs agrégés"""
+    __slots__ = ("id", "last_edited_time", "task_ids", "minutes")
+
+    def __init__(self, id: str, last_edited_time: Optional[str], task_ids: List[str], minutes: float):
+        self.id = id
+        self.last_edited_time = last_edited_time
+        self.task_ids = task_ids
+        self.minutes = minutes
+
+    def __repr__(self):
+        return f"TimeEntry({self.id!r}, {self.minutes!r} min -> {self.task_ids!r})"
+
+
+class TimeEntryProjector:
+    """
+    Transforme une page brute de saisie en TimeEntry
+    minutes_per_unit: 60 si la durée est saisie en heures ; par défaut déduit du nom de la propriété.
+    Sans unité configurée, seule une propriété dont le nom indique l'unité est détectée ;
+    une propriété configurée sans unité dans son nom est lue en minutes.
+    Lève ValueError si la relation vers les tâches ou la durée est introuvable
+    """
+
+    def __init__(
+        self,
+        schema: Dict,
+        tasks_database_id: str,
+        task_property: Optional[str] = None,
+        duration_property: Optional[str] = None,
+        minutes_per_unit: Optional[float] = None
+    ):
+        self.task_property = task_property or find_task_relation(schema, tasks_database_id)
+        self.duration_property = duration_property or find_duration(schema, with_unit=minutes_per_unit is None)
+        if self.task_property not in schema:
+            raise ValueError("Saisies de temps : aucune relation vers la base Tâches (SAISIES_TACHE_PROPERTY)")
+        if self.duration_property not in schema:
+            raise ValueError("Saisies de temps : aucune propriété de durée en minutes ou en heures trouvée "
+                             "(SAISIES_DUREE_PROPERTY, SAISIES_DUREE_MINUTES)")
+
+        if minutes_per_unit is None:
+            minutes_per_unit = duration_unit(self.duration_property) or 1.0
+        self.minutes_per_unit = minutes_per_unit
+        self._tasks = compile_property(self.task_property, schema[self.task_property]["type"], [])
+        self._duration = compile_property(self.duration_property, schema[self.duration_property]["type"], None)
+
+    @property
+    def property_names(self) -> List[str]:
+        return [self.task_property, self.duration_property]
+
+    def __call__(self, page: Dict) -> TimeEntry:
+        props = page.get("properties", {})
+        duration = self._duration(props)
+        numeric = isinstance(duration, (int, float)) and not isinstance(duration, bool)
+        minutes = float(duration) * self.minutes_per_unit if numeric else 0.0
+        return TimeEntry(page["id"], page.get("last_edited_time"), self._tasks(props), minutes)
@@ -0,0 +1,38 @@
+"""
+Environnement commun des tests qui lancent main contre les serveurs simulés
+main lit sa configuration à l'import : serveurs et environnement ne sont préparés qu'une fois par processus
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "bench")]
+
+import mock_servers
+
+_started = None
+
+
+def start_main(tasks: int = 40):
+    """Returns: (module main configuré sur les serveurs simulés, base Tâches servie)"""
+    global _started
+    if _started is None:
+        urls, workspace = mock_servers.start_servers(tasks)
+        workdir = tempfile.mkdtemp()
+        atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+        os.environ.update(
+            NOTION_TOKEN="test", GPT_API_KEY="test",
+            DATABASE_TACHES=urls["database_id"], DATABASE_SAISIES_TEMPS="",
+            NOTION_BASE_URL=urls["notion"], GPT_BASE_URL=urls["openai"],
+            NOTION_RPS="1000", LOCAL_CONFIDENCE="2",
+            MARTINE_CACHE_DIR=os.path.join(workdir, "cache"),
+            MARTINE_LOGS_DIR=os.path.join(workdir, "logs"),
+            # Pas de .env du poste : l'environnement du test prime
+            MARTINE_MANIFEST_ENTRY="test"
+        )
+        import main
+        _started = main, workspace
+    return _started
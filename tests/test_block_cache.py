@@ -0,0 +1,81 @@
+"""
+Cache de blocs : une entrée n'est réutilisée que si la page n'a pas changé depuis une lecture
+faite après la minute de sa dernière modification (last_edited_time de Notion arrondi à la minute)
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from block_cache import BlockCache
+from notion_client import NotionClient
+
+
+def minute(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+
+class FakePages:
+    """Enfants par bloc, modifiables ; compte les lectures"""
+
+    def __init__(self, children):
+        self.children = children
+        self.reads = []
+
+    def __call__(self, parent_id, deadline=None):
+        self.reads.append(parent_id)
+        yield from self.children[parent_id]
+
+
+class BlockCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.cache = BlockCache(os.path.join(self.workdir, "blocks.db"))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_hit_when_read_after_the_edit_minute(self):
+        edited = minute(time.time() - 3600)
+        self.cache.put("page", edited, [{"_text": "a"}], read_at=time.time() - 60)
+        self.assertEqual(self.cache.get("page", edited), [{"_text": "a"}])
+
+    def test_miss_when_page_changed(self):
+        self.cache.put("page", minute(time.time() - 3600), [{"_text": "a"}])
+        self.assertIsNone(self.cache.get("page", minute(time.time())))
+
+    def test_miss_when_read_in_the_edit_minute(self):
+        # Lu dans la minute de la modification : une autre modification a pu suivre sans changer la date
+        now = time.time()
+        self.cache.put("page", minute(now), [{"_text": "a"}], read_at=now)
+        self.assertIsNone(self.cache.get("page", minute(now)))
+
+    def test_nested_blocks_follow_the_page_date(self):
+        client = NotionClient("test", block_cache=self.cache)
+        pages = FakePages({
+            "page": [{"id": "toggle", "type": "toggle", "has_children": True,
+                      "last_edited_time": minute(0), "toggle": {"rich_text": [{"plain_text": "T"}]}}],
+            "toggle": [{"id": "p1", "type": "paragraph", "has_children": False,
+                        "last_edited_time": minute(0), "paragraph": {"rich_text": [{"plain_text": "avant"}]}}]
+        })
+        client.iter_page_blocks = pages
+        edited = minute(time.time() - 3600)
+        client.get_block_tree("page", last_edited_time=edited)
+        client.get_block_tree("page", last_edited_time=edited)
+        self.assertEqual(pages.reads, ["page", "toggle"])
+
+        # Petit-enfant modifié : la date du toggle ne bouge pas, celle de la page si
+        pages.children["toggle"][0]["paragraph"]["rich_text"][0]["plain_text"] = "après"
+        tree = client.get_block_tree("page", last_edited_time=minute(time.time() - 120))
+        self.assertEqual(tree[0]["_children"][0]["_text"], "après")
+
+
+if __name__ == "__main__":
+    unittest.main()
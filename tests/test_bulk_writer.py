@@ -0,0 +1,90 @@
+"""
+Écritures groupées : valeurs inchangées ignorées, mises à jour d'une page en attente fusionnées,
+close() attend la fin des écritures
+"""
+import os
+import sys
+import threading
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from bulk_writer import BulkWriter
+
+SCHEMA = {"Temps": {"type": "number"}, "Hash": {"type": "rich_text"}}
+
+
+class RecordingPages:
+    """update_page simulé : garde les PATCH reçus, peut être bloqué pour laisser des pages en attente"""
+
+    def __init__(self, fail=()):
+        self.patches = []
+        self.fail = set(fail)
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+
+    def __call__(self, page_id, properties):
+        self.started.set()
+        self.release.wait(5)
+        self.patches.append((page_id, properties))
+        return page_id not in self.fail
+
+
+class BulkWriterTest(unittest.TestCase):
+    def test_unchanged_values_are_skipped(self):
+        pages = RecordingPages()
+        done = []
+        with BulkWriter(pages, SCHEMA) as writer:
+            writer.put("p1", {"Temps": 30}, current={"Temps": 30.0}, on_done=lambda page_id, ok: done.append(ok))
+            writer.put("p2", {"Temps": 45, "Hash": "h"}, current={"Temps": 45})
+        self.assertEqual(pages.patches, [("p2", {"Hash": {"rich_text": [{"text": {"content": "h"}}]}})])
+        self.assertEqual(done, [True])
+        self.assertEqual(writer.stats["skipped"], 1)
+
+    def test_pending_updates_are_coalesced(self):
+        pages = RecordingPages()
+        pages.release.clear()
+        done = []
+        writer = BulkWriter(pages, SCHEMA, max_workers=1, queue_size=10)
+        # Le worker est occupé par p1 : les deux mises à jour de p2 attendent ensemble
+        writer.put("p1", {"Temps": 10})
+        self.assertTrue(pages.started.wait(5))
+        writer.put("p2", {"Temps": 20}, on_done=lambda page_id, ok: done.append("temps"))
+        writer.put("p2", {"Hash": "h2"}, on_done=lambda page_id, ok: done.append("hash"))
+        pages.release.set()
+        stats = writer.close()
+
+        self.assertEqual([page_id for page_id, _ in pages.patches], ["p1", "p2"])
+        self.assertEqual(set(pages.patches[1][1]), {"Temps", "Hash"})
+        self.assertEqual(done, ["temps", "hash"])
+        self.assertEqual(stats["coalesced"], 1)
+        self.assertEqual(stats["written"], 2)
+
+    def test_written_value_not_rewritten_in_the_same_run(self):
+        pages = RecordingPages()
+        with BulkWriter(pages, SCHEMA, max_workers=1) as writer:
+            writer.put("p1", {"Temps": 30})
+            writer.close()
+            writer.put("p1", {"Temps": 30})
+        self.assertEqual(len(pages.patches), 1)
+
+    def test_close_waits_and_reports_failures(self):
+        pages = RecordingPages(fail={"p2"})
+        results = {}
+        writer = BulkWriter(pages, SCHEMA)
+        for page_id in ("p1", "p2", "p3"):
+            writer.put(page_id, {"Temps": 5}, on_done=lambda page_id, ok: results.update({page_id: ok}))
+        stats = writer.close()
+        self.assertEqual(results, {"p1": True, "p2": False, "p3": True})
+        self.assertEqual((stats["written"], stats["failed"]), (2, 1))
+
+    def test_unknown_property_is_rejected(self):
+        with BulkWriter(RecordingPages(), SCHEMA) as writer:
+            with self.assertRaises(ValueError):
+                writer.put("p1", {"Inconnue": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
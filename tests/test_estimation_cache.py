@@ -0,0 +1,50 @@
+"""
+Cache des réponses GPT : expiration, purge à l'ouverture et éviction LRU
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from estimation_cache import EstimationCache
+
+
+class EstimationCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, "estimations.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def count(self, cache):
+        return cache._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def test_purge_removes_only_expired_responses(self):
+        cache = EstimationCache(self.path, ttl_seconds=60)
+        cache.put("ancienne", "30")
+        cache.put("recente", "45")
+        cache._conn.execute("UPDATE responses SET created_at = ? WHERE key = 'ancienne'", (time.time() - 120,))
+        cache.purge_expired()
+        self.assertEqual(self.count(cache), 1)
+        self.assertEqual(cache.get("recente"), "45")
+        cache.close()
+
+    def test_lru_eviction(self):
+        cache = EstimationCache(self.path, max_entries=2)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        cache._conn.execute("UPDATE responses SET last_access = last_access - 10 WHERE key = 'a'")
+        cache.put("c", "3")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual((cache.get("b"), cache.get("c")), ("2", "3"))
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Mode batch : soumission, relève des résultats et abandon des résultats périmés
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "bench")]
+
+import mock_servers
+from estimation_cache import EstimationCache
+from gpt_batch import BatchEstimator, BatchJobStore, OpenAIBatchTransport
+from gpt_estimator import GPTEstimator
+from metrics import RunMetrics
+from similarity import SimilarityIndex
+
+
+def task(task_id, content_hash, nom=None):
+    return {"id": task_id, "nom": nom or f"Tâche {task_id}", "description": "", "hash": content_hash, "hash_stocke": ""}
+
+
+class BatchEstimatorTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.urls, _ = mock_servers.start_servers(0)
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.metrics = RunMetrics()
+        self.cache = EstimationCache(os.path.join(self.workdir, "cache.db"))
+        gpt = GPTEstimator("test", base_url=self.urls["openai"], cache=self.cache, metrics=self.metrics)
+        self.estimator = BatchEstimator(
+            gpt,
+            OpenAIBatchTransport("test", base_url=self.urls["openai"], metrics=self.metrics),
+            BatchJobStore(os.path.join(self.workdir, "jobs.json")),
+            poll_interval=0
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def poll_all(self, **kwargs):
+        """Le job simulé se termine à son deuxième suivi"""
+        return list(self.estimator.poll(**kwargs)) + list(self.estimator.poll(**kwargs))
+
+    def test_submit_then_poll(self):
+        batch_id, cached = self.estimator.submit([task("t1", "h1"), task("t2", "h2")], "Projet", SimilarityIndex())
+        self.assertIsNotNone(batch_id)
+        self.assertEqual(cached, [])
+        self.assertTrue(self.estimator.store.is_pending("t1", "h1"))
+        self.assertEqual(self.cache.misses, 0)
+
+        results = self.poll_all()
+        self.assertEqual(sorted((task_id, content_hash) for task_id, content_hash, _ in results),
+                         [("t1", "h1"), ("t2", "h2")])
+        self.assertEqual(len(self.estimator.store), 0)
+
+        # Mêmes prompts : répondus par le cache, sans nouveau job
+        batch_id, cached = self.estimator.submit([task("t1", "h1")], "Projet", SimilarityIndex())
+        self.assertIsNone(batch_id)
+        self.assertEqual([t["id"] for t, _ in cached], ["t1"])
+
+    def test_resubmitted_task_keeps_only_latest_job(self):
+        self.estimator.submit([task("t1", "h1")], "Projet", SimilarityIndex())
+        # Contenu modifié avant la fin du premier job : nouvelle soumission
+        self.estimator.submit([task("t1", "h2", nom="Tâche t1 modifiée")], "Projet", SimilarityIndex())
+        results = self.poll_all()
+        self.assertEqual([(task_id, content_hash) for task_id, content_hash, _ in results], [("t1", "h2")])
+
+    def test_stale_results_are_dropped(self):
+        self.estimator.submit([task("t1", "h1"), task("t2", "h2")], "Projet", SimilarityIndex())
+        # t2 estimée entre-temps pour un contenu plus récent
+        results = self.poll_all(is_current=lambda task_id, content_hash, stored_hash: task_id != "t2")
+        self.assertEqual([task_id for task_id, _, _ in results], ["t1"])
+        self.assertEqual(self.metrics.counter("openai_batch", "stale_results"), 1)
+        self.assertEqual(len(self.estimator.store), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
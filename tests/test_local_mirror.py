@@ -0,0 +1,61 @@
+"""
+Miroir local : le hash de contenu d'une page n'est gardé que si la page n'a pas changé depuis
+une lecture faite après la minute de sa dernière modification
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from local_mirror import LocalMirror
+from task_records import TaskRecord
+
+
+def minute(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+
+class LocalMirrorTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.mirror = LocalMirror(os.path.join(self.workdir, "mirror.db"))
+
+    def tearDown(self):
+        self.mirror.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def sync(self, last_edited_time, description):
+        task = TaskRecord(id="t1", nom="Tâche", description=description, last_edited_time=last_edited_time)
+        self.mirror.upsert_tasks("db", [task])
+        return self.mirror.load_tasks("db")[0]
+
+    def test_two_edits_in_the_same_minute(self):
+        now = time.time()
+        edited = minute(now)
+        self.sync(edited, "première version")
+        self.mirror.set_content_hash("t1", "hash-v1", read_at=now)
+
+        # Deuxième modification dans la même minute : même last_edited_time, contenu à relire
+        task = self.sync(edited, "deuxième version")
+        self.assertIsNone(task.content_hash)
+
+    def test_hash_kept_when_read_after_the_edit_minute(self):
+        edited = minute(time.time() - 3600)
+        self.sync(edited, "version")
+        self.mirror.set_content_hash("t1", "hash-v1", read_at=time.time() - 60)
+        self.assertEqual(self.sync(edited, "version").content_hash, "hash-v1")
+
+    def test_hash_reset_when_page_changed(self):
+        self.sync(minute(time.time() - 3600), "version")
+        self.mirror.set_content_hash("t1", "hash-v1")
+        self.assertIsNone(self.sync(minute(time.time()), "modifiée").content_hash)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Plusieurs bases : lecture du manifeste et environnement du processus de chaque entrée
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from multi_run import entry_environment, load_manifest
+
+SETTINGS = {
+    "cache_dir": "cache", "logs_dir": "logs",
+    "notion_rps": {"secret-a": 1.5}, "gpt_rpm": 250, "gpt_tpm": 15000
+}
+
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, "databases.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def write(self, entries):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+
+    def test_variables_read_from_environment(self):
+        self.write([{"name": "eisf", "notion_token": "$TEST_TOKEN_EISF", "database_taches": "db1"}])
+        with mock.patch.dict(os.environ, {"TEST_TOKEN_EISF": "secret-a"}):
+            entries = load_manifest(self.path)
+        self.assertEqual(entries[0]["notion_token"], "secret-a")
+
+    def test_invalid_manifests_rejected(self):
+        for entries in (
+            [],
+            [{"name": "a", "notion_token": "t", "database_taches": "db"},
+             {"name": "a", "notion_token": "t", "database_taches": "db2"}],
+            [{"name": "a", "notion_token": "$TEST_TOKEN_ABSENT", "database_taches": "db"}]
+        ):
+            self.write(entries)
+            with self.assertRaises(ValueError):
+                load_manifest(self.path)
+
+    def test_entry_environment(self):
+        entry = {"name": "eisf", "notion_token": "secret-a", "database_taches": "db1"}
+        env = entry_environment(entry, SETTINGS)
+        self.assertEqual(env["MARTINE_MANIFEST_ENTRY"], "eisf")
+        self.assertEqual(env["DATABASE_TACHES"], "db1")
+        self.assertEqual(env["DATABASE_SAISIES_TEMPS"], "")
+        self.assertNotIn("PROJECT_NAME", env)
+        self.assertEqual(env["MARTINE_CACHE_DIR"], os.path.join("cache", "eisf"))
+        self.assertEqual(env["METRICS_PROM_PATH"], os.path.join("logs", "eisf", "martine.prom"))
+        self.assertEqual((env["NOTION_RPS"], env["GPT_RPM"]), ("1.5", "250"))
+
+        # Débit propre à l'entrée prioritaire sur la part du token
+        self.assertEqual(entry_environment({**entry, "notion_rps": 2}, SETTINGS)["NOTION_RPS"], "2")
+
+
+if __name__ == "__main__":
+    unittest.main()
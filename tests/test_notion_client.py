@@ -0,0 +1,97 @@
+"""
+Client Notion : retries (429, 5xx), écritures non idempotentes, parcours borné de l'arbre des blocs
+"""
+import os
+import sys
+import unittest
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from notion_client import NotionClient
+from rate_limiter import TokenBucket
+
+
+def response(status, retry_after=None):
+    result = requests.Response()
+    result.status_code = status
+    if retry_after is not None:
+        result.headers["Retry-After"] = retry_after
+    return result
+
+
+class FakeSession:
+    """Renvoie les réponses prévues dans l'ordre (les exceptions prévues sont levées)"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        result = self.responses.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class RequestRetryTest(unittest.TestCase):
+    def client(self, *responses):
+        client = NotionClient("test", rate_limiter=TokenBucket(rate=1000, capacity=1000))
+        client.session = FakeSession(*responses)
+        return client
+
+    def test_retries_throttled_request(self):
+        client = self.client(response(429, "0.01"), response(502, "0.01"), response(200))
+        self.assertEqual(client._request("GET", "https://notion.test/v1/pages/p1").status_code, 200)
+        self.assertEqual(client.session.calls, 3)
+        self.assertEqual(client.stats["retries"], 2)
+
+    def test_gives_up_after_max_retries(self):
+        client = self.client(*(response(503, "0") for _ in range(3)))
+        client.max_retries = 2
+        self.assertEqual(client._request("GET", "https://notion.test/v1/pages/p1").status_code, 503)
+        self.assertEqual(client.session.calls, 3)
+
+    def test_non_idempotent_request_not_retried_on_server_error(self):
+        client = self.client(response(500), response(200))
+        self.assertEqual(client._request("POST", "https://notion.test/v1/pages", idempotent=False).status_code, 500)
+        self.assertEqual(client.session.calls, 1)
+
+    def test_non_idempotent_request_retried_on_throttling(self):
+        # 429 : la requête n'a pas été traitée, la renvoyer est sans risque
+        client = self.client(response(429, "0"), response(200))
+        self.assertEqual(client._request("POST", "https://notion.test/v1/pages", idempotent=False).status_code, 200)
+
+    def test_network_error_not_retried_for_non_idempotent_request(self):
+        client = self.client(requests.ConnectionError("coupure"), response(200))
+        with self.assertRaises(requests.ConnectionError):
+            client._request("POST", "https://notion.test/v1/pages", idempotent=False)
+
+
+def paragraph(n):
+    return {"id": f"b{n}", "type": "paragraph", "has_children": False,
+            "paragraph": {"rich_text": [{"plain_text": f"bloc {n}"}]}}
+
+
+class BlockTreeTest(unittest.TestCase):
+    def test_root_level_stops_at_max_blocks(self):
+        client = NotionClient("test", max_blocks=5)
+        read = []
+
+        def iter_page_blocks(parent_id, deadline=None):
+            for n in range(5000):
+                read.append(n)
+                yield paragraph(n)
+
+        client.iter_page_blocks = iter_page_blocks
+        tree = client.get_block_tree("page")
+        self.assertEqual([block["id"] for block in tree], [f"b{n}" for n in range(5)])
+        # Un bloc de plus que la limite, pas les 5000
+        self.assertLessEqual(len(read), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
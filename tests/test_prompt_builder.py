@@ -0,0 +1,61 @@
+"""
+Prompts d'estimation : compaction du contenu des pages et respect du budget de tokens
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from gpt_estimator import GPTEstimator
+from prompt_builder import PromptBudget, compact_content, count_tokens, fair_shares, truncate_to_tokens
+
+
+def history(count):
+    return [{"nom": f"Tâche passée {n}", "temps_reel": 30 + n, "description": "détails " * 200} for n in range(count)]
+
+
+class CompactContentTest(unittest.TestCase):
+    def test_short_content_only_loses_noise(self):
+        text = "# Titre\n\n---\n- point\n- point\nTexte"
+        self.assertEqual(compact_content(text, 1000), "# Titre\n- point\nTexte")
+
+    def test_headings_and_checkboxes_kept_before_code(self):
+        text = "\n".join(["# Objectif", "```", *(f"log ligne {n} " * 10 for n in range(50)), "```", "[ ] livrer"])
+        compacted = compact_content(text, 60)
+        self.assertLessEqual(count_tokens(compacted), 60)
+        lines = compacted.split("\n")
+        # Ordre d'origine conservé, les logs ne prennent que ce qui reste
+        self.assertEqual(lines[0], "# Objectif")
+        self.assertIn("[ ] livrer", lines)
+        self.assertEqual(lines[-1], "[… 48 lignes omises]")
+
+    def test_truncate_stays_within_budget(self):
+        text = "mot " * 500
+        self.assertLessEqual(count_tokens(truncate_to_tokens(text, 40)), 40)
+        self.assertEqual(truncate_to_tokens("court", 40), "court")
+
+
+class PromptBudgetTest(unittest.TestCase):
+    def test_fair_shares_give_small_demands_what_they_need(self):
+        self.assertEqual(fair_shares(100, [10, 500, 500]), [10, 45, 45])
+
+    def test_unused_content_budget_goes_to_history(self):
+        budget = PromptBudget(max_tokens=1000, history_share=0.3)
+        history_tokens, (content_tokens,) = budget.allocate(100, 5000, [50])
+        self.assertEqual((history_tokens, content_tokens), (850, 50))
+
+    def test_task_prompt_stays_within_budget(self):
+        for max_tokens in (800, 3000):
+            gpt = GPTEstimator("test", max_prompt_tokens=max_tokens)
+            messages = gpt.task_messages(
+                "Refonte", "description " * 500, "Projet", history(10), "contenu de la page " * 2000
+            )
+            total = sum(count_tokens(message["content"]) for message in messages)
+            self.assertLessEqual(total, max_tokens)
+            self.assertIn("Tâche passée 0", messages[1]["content"])
+
+
+if __name__ == "__main__":
+    unittest.main()
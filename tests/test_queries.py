@@ -0,0 +1,68 @@
+"""
+Requête des tâches d'un run : un seul filtre envoyé à Notion, couvrant toutes les phases
+"""
+import unittest
+
+from mock_env import start_main
+
+from notion_client import QueryBuilder
+
+
+class QueryBuilderTest(unittest.TestCase):
+    schema = {
+        "Statut": {"id": "stat", "type": "select"},
+        "Temps": {"id": "temps", "type": "number"}
+    }
+
+    def test_any_of_combines_branches_with_or(self):
+        query = QueryBuilder(self.schema)
+        query.any_of(query.branch().where("Statut", "not_in", ["A", "B"]), query.branch().where("Temps", ">", 0))
+        self.assertEqual(query.filter, {"or": [
+            {"and": [
+                {"property": "Statut", "select": {"does_not_equal": "A"}},
+                {"property": "Statut", "select": {"does_not_equal": "B"}}
+            ]},
+            {"property": "Temps", "number": {"greater_than": 0}}
+        ]})
+
+    def test_any_of_with_an_open_branch_filters_nothing(self):
+        query = QueryBuilder(self.schema)
+        query.any_of(query.branch(), query.branch().where("Temps", ">", 0))
+        self.assertIsNone(query.filter)
+
+
+class RunTasksQueryTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.main, cls.workspace = start_main()
+
+    def test_filter_reaches_request_body(self):
+        main = self.main
+        session = main.get_notion().session
+        bodies = []
+        request = session.request
+
+        def recording(method, url, **kwargs):
+            if "/query" in url:
+                bodies.append(kwargs.get("json"))
+            return request(method, url, **kwargs)
+
+        session.request = recording
+        main.get_snapshot().clear()
+        try:
+            tasks = list(main.iter_run_tasks())
+        finally:
+            session.request = request
+
+        self.assertTrue(bodies)
+        self.assertIn("or", bodies[0]["filter"])
+        expected = {
+            pid for pid, values in self.workspace.values.items()
+            if values["Statut"] not in main.EXCLUDED_STATUS or values["⏱️ Temps réel agrégé (min)"] is not None
+        }
+        self.assertEqual({t.id for t in tasks}, expected)
+        self.assertLess(len(expected), len(self.workspace.values))
+
+
+if __name__ == "__main__":
+    unittest.main()
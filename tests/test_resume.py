@@ -0,0 +1,60 @@
+"""
+Reprise d'un run interrompu : les estimations du point de reprise sont réécrites sans être réestimées,
+même quand leurs écritures sont encore en cours pendant la recherche des tâches à estimer
+"""
+import json
+import os
+import time
+import unittest
+
+from mock_env import start_main
+
+
+class ResumeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.main, cls.workspace = start_main()
+
+    def estimated(self):
+        return {
+            pid: values for pid, values in self.workspace.values.items()
+            if values["⏱️ Temps estimé IA (min)"]
+        }
+
+    def test_resume_with_writes_in_flight(self):
+        main = self.main
+        main.run_estimations()
+        written = self.estimated()
+        self.assertTrue(written)
+
+        # Crash simulé : estimations obtenues (hash réel du contenu) mais jamais écrites dans Notion
+        checkpoint_path = os.path.join(main.CACHE_DIR, "checkpoint.jsonl")
+        with open(checkpoint_path, "w", encoding="utf-8") as f:
+            for pid, values in written.items():
+                f.write(json.dumps({
+                    "op": "pending", "id": pid,
+                    "minutes": values["⏱️ Temps estimé IA (min)"], "hash": values["🔄 Hash contenu"]
+                }) + "\n")
+                values["⏱️ Temps estimé IA (min)"] = None
+                values["🔄 Hash contenu"] = ""
+
+        # Écritures lentes : la recherche des tâches voit encore les anciennes valeurs
+        update_page = main.get_snapshot().update_page
+        main.get_snapshot().update_page = lambda page_id, properties: (time.sleep(0.3), update_page(page_id, properties))[1]
+        main.get_snapshot().clear()
+        estimated_before = {
+            tier: main.metrics.counter("estimator", tier) for tier in ("local", "gpt")
+        }
+        try:
+            main.run_estimations()
+        finally:
+            main.get_snapshot().update_page = update_page
+
+        for tier, count in estimated_before.items():
+            self.assertEqual(main.metrics.counter("estimator", tier), count, f"réestimation ({tier})")
+        self.assertEqual(set(self.estimated()), set(written))
+        self.assertFalse(os.path.exists(checkpoint_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Ordonnancement : ordre de priorité, arrêt sur budget épuisé et report des seules tâches à estimer
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from metrics import RunMetrics
+from scheduler import EstimationScheduler, RunBudget
+from task_records import TaskRecord
+
+
+def task(task_id, statut="À faire", echeance=None, temps_estime=None):
+    return TaskRecord(id=task_id, nom=task_id, statut=statut, echeance=echeance, temps_estime=temps_estime)
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.queue_path = os.path.join(self.workdir, "queue.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_priority_order(self):
+        scheduler = EstimationScheduler(self.queue_path)
+        tasks = [
+            task("sans-statut", statut="Terminé"),
+            task("a-faire-tard", echeance="2026-03-01"),
+            task("a-faire-sans-date"),
+            task("en-cours-estimee", statut="En cours", temps_estime=30),
+            task("en-cours-nouvelle", statut="En cours"),
+            task("a-faire-tot", echeance="2026-02-01")
+        ]
+        self.assertEqual([t.id for t in scheduler.schedule(tasks)], [
+            "en-cours-nouvelle", "en-cours-estimee", "a-faire-tot", "a-faire-tard", "a-faire-sans-date", "sans-statut"
+        ])
+        self.assertIsNone(scheduler.stopped)
+        self.assertFalse(os.path.exists(self.queue_path))
+
+    def test_budget_stop_defers_only_tasks_to_estimate(self):
+        metrics = RunMetrics()
+        scheduler = EstimationScheduler(self.queue_path, budget=RunBudget(metrics, max_notion_requests=2))
+        tasks = [task(f"t{i}", temps_estime=30 if i % 2 else None) for i in range(6)]
+
+        dispatched = []
+        for scheduled in scheduler.schedule(tasks, deferrable=lambda t: not t.temps_estime):
+            dispatched.append(scheduled.id)
+            metrics.increment("notion", "requests")
+
+        self.assertEqual(dispatched, ["t0", "t2"])
+        self.assertEqual(scheduler.stopped, "requêtes Notion")
+        self.assertEqual(scheduler.leftover, ["t4"])
+        with open(self.queue_path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["ids"], ["t4"])
+
+        # Run suivant : la tâche reportée passe en tête de son rang de priorité
+        following = EstimationScheduler(self.queue_path)
+        self.assertEqual([t.id for t in following.schedule([task("t6"), task("t4")])], ["t4", "t6"])
+        self.assertFalse(os.path.exists(self.queue_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Démarrage : schéma des databases en cache disque (délai de validité) et colonnes manquantes
+ajoutées en un seul PATCH dont la réponse met le cache à jour
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from mock_env import start_main
+from schema_cache import SchemaCache
+
+PROPERTIES = {"Nom": {"id": "title", "type": "title"}}
+
+
+class FakeDatabases:
+    """get_database simulé : compte les lectures, None = Notion indisponible"""
+
+    def __init__(self, database):
+        self.database = database
+        self.reads = 0
+
+    def __call__(self, database_id):
+        self.reads += 1
+        return self.database
+
+
+class SchemaCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, "schemas.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_reused_across_runs_within_ttl(self):
+        fetch = FakeDatabases({"properties": PROPERTIES, "last_edited_time": "2026-01-01T00:00:00.000Z"})
+        self.assertEqual(SchemaCache(self.path).get("db", fetch), PROPERTIES)
+        # Run suivant : nouveau cache relu depuis le disque, pas d'appel réseau
+        self.assertEqual(SchemaCache(self.path).get("db", fetch), PROPERTIES)
+        self.assertEqual(fetch.reads, 1)
+
+    def test_reread_after_ttl(self):
+        fetch = FakeDatabases({"properties": PROPERTIES, "last_edited_time": "2026-01-01T00:00:00.000Z"})
+        cache = SchemaCache(self.path, ttl_seconds=60)
+        cache.get("db", fetch)
+        cache.entries["db"]["checked_at"] = time.time() - 61
+        changed = {**PROPERTIES, "Statut": {"id": "st", "type": "status"}}
+        fetch.database = {"properties": changed, "last_edited_time": "2026-01-02T00:00:00.000Z"}
+        self.assertEqual(cache.get("db", fetch), changed)
+        self.assertEqual(fetch.reads, 2)
+
+    def test_expired_schema_kept_when_notion_unavailable(self):
+        cache = SchemaCache(self.path, ttl_seconds=0)
+        cache.put("db", {"properties": PROPERTIES})
+        self.assertEqual(cache.get("db", FakeDatabases(None)), PROPERTIES)
+
+    def test_invalidate_forces_a_read(self):
+        fetch = FakeDatabases({"properties": PROPERTIES})
+        cache = SchemaCache(self.path)
+        cache.get("db", fetch)
+        cache.invalidate("db")
+        cache.get("db", fetch)
+        self.assertEqual(fetch.reads, 2)
+
+
+class FakeNotion:
+    """Schéma Tâches sans les colonnes de Martine ; la réponse du PATCH contient le nouveau schéma"""
+
+    def __init__(self):
+        self.properties = dict(PROPERTIES)
+        self.reads = 0
+        self.patches = []
+
+    def get_database(self, database_id):
+        self.reads += 1
+        return {"properties": dict(self.properties)}
+
+    def add_properties_to_database(self, database_id, properties):
+        self.patches.append(set(properties))
+        self.properties.update(properties)
+        return {"properties": dict(self.properties)}
+
+
+class SetupColumnsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.main, _ = start_main()
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_missing_columns_added_in_one_patch(self):
+        main = self.main
+        notion = FakeNotion()
+        cache = SchemaCache(os.path.join(self.workdir, "schemas.json"))
+        with mock.patch.object(main, "get_notion", lambda: notion), \
+                mock.patch.object(main, "schemas", {}), \
+                mock.patch.object(main, "schema_cache", cache), \
+                mock.patch.object(main, "task_projector", None):
+            main.setup_columns()
+            self.assertEqual(notion.patches, [set(main.TASK_COLUMNS)])
+            self.assertEqual(set(main.get_schema(main.DB_TACHES)), set(PROPERTIES) | set(main.TASK_COLUMNS))
+
+            # Run suivant : schéma en cache, ni lecture ni PATCH
+            main.schemas.clear()
+            main.setup_columns()
+        self.assertEqual((notion.reads, len(notion.patches)), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
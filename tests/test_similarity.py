@@ -0,0 +1,34 @@
+"""
+Index de similarité : une tâche identique à une tâche historique en est la plus proche
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from similarity import SimilarityIndex
+
+
+class SimilarityIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SimilarityIndex()
+        # L'historique ne porte que le nom et la description (pas le contenu des pages)
+        self.index.update([
+            {"id": "h1", "nom": "Maquette page d'accueil", "description": "design responsive", "temps_reel": 120},
+            {"id": "h2", "nom": "Export comptable", "description": "csv mensuel", "temps_reel": 60},
+            {"id": "h3", "nom": "Réunion client", "description": "revue du planning", "temps_reel": 45}
+        ])
+
+    def test_same_task_with_page_content_scores_one(self):
+        query = {
+            "id": "q1", "nom": "Maquette page d'accueil", "description": "design responsive",
+            "content": "Titre\n- bandeau\n- formulaire de contact\n- pied de page avec mentions légales"
+        }
+        (best, score), = self.index.top_k_scored([query], k=1)[0]
+        self.assertEqual(best["id"], "h1")
+        self.assertAlmostEqual(score, 1.0, places=3)
+
+
+if __name__ == "__main__":
+    unittest.main()
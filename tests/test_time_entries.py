@@ -0,0 +1,53 @@
+"""
+Saisies de temps : l'unité de la durée détectée est déduite du nom de la propriété
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from time_entries import TimeEntryProjector
+
+TASKS_DB = "b0000000-0000-4000-8000-00000000bec4"
+
+
+def schema(**durations):
+    properties = {"Tâche": {"id": "tach", "type": "relation", "relation": {"database_id": TASKS_DB}}}
+    properties.update({name: {"id": name, "type": "number"} for name in durations})
+    return properties
+
+
+def entry(name, value):
+    return {"id": "e1", "properties": {
+        "Tâche": {"type": "relation", "relation": [{"id": "t1"}]},
+        name: {"type": "number", "number": value}
+    }}
+
+
+class TimeEntryProjectorTest(unittest.TestCase):
+    def test_hours_detected_from_name(self):
+        projector = TimeEntryProjector(schema(**{"Durée (h)": None}), TASKS_DB)
+        self.assertEqual(projector.duration_property, "Durée (h)")
+        self.assertEqual(projector(entry("Durée (h)", 1.5)).minutes, 90)
+
+    def test_minutes_detected_from_name(self):
+        projector = TimeEntryProjector(schema(**{"Temps passé (min)": None}), TASKS_DB)
+        self.assertEqual(projector(entry("Temps passé (min)", 45)).minutes, 45)
+
+    def test_unit_unclear_is_not_detected(self):
+        with self.assertRaises(ValueError):
+            TimeEntryProjector(schema(**{"Durée": None}), TASKS_DB)
+
+    def test_configured_unit_allows_unclear_name(self):
+        projector = TimeEntryProjector(schema(**{"Durée": None}), TASKS_DB, minutes_per_unit=60)
+        self.assertEqual(projector(entry("Durée", 2)).minutes, 120)
+
+    def test_configured_unit_wins_over_name(self):
+        projector = TimeEntryProjector(schema(**{"Durée (h)": None}), TASKS_DB, minutes_per_unit=1)
+        self.assertEqual(projector(entry("Durée (h)", 30)).minutes, 30)
+
+
+if __name__ == "__main__":
+    unittest.main()